@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from scipy.sparse import csr_matrix
+
+
+class ComponentBags:
+    """
+    This is the input of ComponentEncoder, the components of every node in the flat form of nn.EmbeddingBag
+    Args:
+            indices (tensor): The components of all the nodes one after another, ex. [1, 5, 2, 3, 9].
+            offsets (tensor): Where the components of every node start, ex. [0, 2, 2] for the nodes [1, 5], [] and [2, 3, 9].
+            per_sample_weights (tensor): How many times the node has the component, None when every component is listed once.
+            num_of_features (int): The number of components, the width of the multi-hot features.
+    Return:
+            self.to(device) (ComponentBags): The bags on the device, as a tensor is moved.
+
+    The memory scales with the number of (node, component) pairs instead of num of nodes * num of features.
+    """
+
+    def __init__(
+        self,
+        indices: torch.Tensor,
+        offsets: torch.Tensor,
+        per_sample_weights: torch.Tensor,
+        num_of_features: int,
+    ):
+        self.indices = indices
+        self.offsets = offsets
+        self.per_sample_weights = per_sample_weights
+        self.num_of_features = num_of_features
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.offsets), self.num_of_features
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def to(self, device):
+        return ComponentBags(
+            self.indices.to(device),
+            self.offsets.to(device),
+            (
+                None
+                if self.per_sample_weights is None
+                else self.per_sample_weights.to(device)
+            ),
+            self.num_of_features,
+        )
+
+
+def get_component_bags(features: csr_matrix) -> ComponentBags:
+    """
+    Take the components of every node from the CSR arrays of the multi-hot features, without building the dense features
+    :param features: the multi-hot features, ex. data_loader["train_nodes_features_sparse"]
+    :return: the bags of the components of the nodes
+    """
+    features = csr_matrix(features, dtype=np.float32)
+    features.sum_duplicates()
+    # a component listed twice counts twice, as in the multi-hot features
+    per_sample_weights = (
+        None
+        if bool((features.data == 1).all())
+        else torch.from_numpy(features.data.copy())
+    )
+    return ComponentBags(
+        torch.from_numpy(features.indices.astype(np.int64)),
+        torch.from_numpy(features.indptr[:-1].astype(np.int64)),
+        per_sample_weights,
+        features.shape[1],
+    )
+
+
+class ComponentEncoder(nn.Module):
+    """
+    This is the first linear layer of the models run as an embedding bag lookup over the components of the nodes
+    Args:
+            in_channels (int): The number of components.
+            out_channels (int): The number of output channels.
+            bias (bool): Whether to learn the bias.
+    Return:
+            self.forward(X) (tensor): The same as nn.Linear on the multi-hot features, of shape (num of nodes, out_channels).
+
+    The cost is one row of the weight per (node, component) pair instead of a product with the multi-hot features.
+    """
+
+    def __init__(self, in_channels: int, out_channels: int, bias: bool = True):
+        super().__init__()
+        self.embedding_bag = nn.EmbeddingBag(in_channels, out_channels, mode="sum")
+        self.bias = nn.Parameter(torch.empty(out_channels)) if bias else None
+        # the same initialisation as nn.Linear
+        bound = 1 / math.sqrt(in_channels) if in_channels > 0 else 0
+        nn.init.uniform_(self.embedding_bag.weight, -bound, bound)
+        if self.bias is not None:
+            nn.init.uniform_(self.bias, -bound, bound)
+
+    @classmethod
+    def from_linear(cls, linear: nn.Linear):
+        """
+        Build the encoder with the weights of a linear layer, so a model keeps its initialisation
+        """
+        encoder = cls(linear.in_features, linear.out_features, linear.bias is not None)
+        with torch.no_grad():
+            encoder.embedding_bag.weight.copy_(linear.weight.t())
+            if linear.bias is not None:
+                encoder.bias.copy_(linear.bias)
+        return encoder.to(linear.weight.device)
+
+    def forward(self, X) -> torch.Tensor:
+        """
+        :param X: the ComponentBags of the nodes, or the multi-hot features in a dense or sparse tensor
+        """
+        if isinstance(X, ComponentBags):
+            X = F.embedding_bag(
+                X.indices,
+                self.embedding_bag.weight,
+                X.offsets,
+                mode="sum",
+                per_sample_weights=X.per_sample_weights,
+            )
+        else:
+            X = torch.matmul(X, self.embedding_bag.weight)
+        if self.bias is not None:
+            X = X + self.bias
+        return X
+
+
+def use_component_encoder(net_model: nn.Module) -> nn.Module:
+    """
+    Replace the first linear layer of a model by a ComponentEncoder with the same weights, the model then takes ComponentBags
+    :param net_model: dhg.models.GCN, HGNN, HGNNP, propagation.OperatorGNN or propagation.SIGN
+    :return: the model
+    """
+    if hasattr(net_model, "hop_layers"):
+        # the hop 0 of SIGN is the features themselves, the propagated hops stay dense
+        net_model.hop_layers[0] = ComponentEncoder.from_linear(net_model.hop_layers[0])
+    elif hasattr(net_model, "layers") and hasattr(net_model.layers[0], "theta"):
+        net_model.layers[0].theta = ComponentEncoder.from_linear(
+            net_model.layers[0].theta
+        )
+    else:
+        raise Exception(
+            "Sorry, the first linear layer of the model has not been recognized."
+        )
+    return net_model
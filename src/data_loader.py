@@ -1,10 +1,20 @@
 import copy
+import hashlib
 import os
+import numpy as np
 import pandas as pd
 import sys
 import torch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scipy.sparse import csr_matrix
 
 import utils
+from dataset_cache import (
+    DatasetCache,
+    compute_content_hash,
+    get_split_manifest,
+    save_bundle,
+)
 
 sys.path.append("../src/")
 
@@ -66,7 +76,15 @@ class Database:
 
 
 class DataLoaderBase:
-    def __init__(self, sub_dataset_name, task_name):
+    def __init__(
+        self,
+        sub_dataset_name,
+        task_name,
+        use_cache: bool = True,
+        write_manifest: bool = True,
+        num_workers: int = 1,
+        bundle_path: str = None,
+    ):
         self.sub_dataset_name = sub_dataset_name
         self.task_name = task_name
 
@@ -75,106 +93,354 @@ class DataLoaderBase:
         self.raw_data_file_path = os.path.join("..", "data", sub_dataset_name)
         self.task_file_path = os.path.join(self.raw_data_file_path, task_name)
 
-    def get_num_of_nodes_based_on_type_name(self, type_name: str = "raw") -> int:
-        if "raw" == type_name:
-            path: str = self.raw_data_file_path
-        else:
-            path: str = os.path.join(self.task_file_path, type_name)
-        node_line_message_list: list[str] = utils.read_file_via_lines(path, "nodes.txt")
-        num_of_nodes = len(node_line_message_list)
-        return num_of_nodes
+        # an exported bundle is used in place of the text files, it carries their manifests
+        bundle = None if bundle_path is None else DatasetCache.open_bundle(bundle_path)
 
-    def get_num_of_features_based_on_type_name(self, type_name: str = "raw") -> int:
-        if "raw" == type_name:
-            path: str = self.raw_data_file_path
-        else:
-            path: str = os.path.join(self.task_file_path, type_name)
-        feature_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "components-all.txt"
+        cache_file_dir: str = os.path.join("..", "cache")
+        cache_name: str = (sub_dataset_name + "-" + task_name).replace(" ", "_")
+
+        # the counts, sizes and hashes of the files, each file is read at most once for them,
+        # the files unchanged since the cache was saved are not read at all
+        cached_manifest_dict: dict[str, dict[str, dict]] = (
+            DatasetCache.load_manifests(cache_file_dir, cache_name)
+            if use_cache and bundle is None
+            else dict()
+        )
+        self.__manifest_dict: dict[str, dict[str, dict]] = (
+            bundle.metadata["manifests"]
+            if bundle is not None
+            else {
+                type_name: get_split_manifest(
+                    self.get_path_based_on_type_name(type_name),
+                    write_manifest,
+                    cached_manifest_dict.get(type_name),
+                )
+                for type_name in ["raw", "train", "validation", "test"]
+            }
         )
-        num_of_features = len(feature_line_message_list)
-        return num_of_features
 
-    def get_num_of_edges_based_on_type_name(self, type_name: str = "raw") -> int:
-        if "raw" == type_name:
-            path: str = self.raw_data_file_path
+        # the CSR incidence of the hyper edges, the key is (type name, file name)
+        self.__incidence_dict: dict[tuple[str, str], tuple] = dict()
+
+        # the values of the keys of data_loader[key] which have been computed
+        self.__value_dict: dict[str, object] = dict()
+
+        # the parsed arrays when the binary cache is not used
+        self.__array_dict: dict[str, np.ndarray] = dict()
+
+        # the parsed arrays are kept in a binary cache keyed by the content of the text files
+        if bundle is not None:
+            self.cache = bundle
+        elif use_cache:
+            self.cache = DatasetCache(
+                compute_content_hash(list(self.__manifest_dict.values())),
+                cache_file_dir,
+                cache_name,
+                {"manifests": self.__manifest_dict},
+            )
         else:
-            path: str = os.path.join(self.task_file_path, type_name)
-        edge_line_message_list: list[str] = utils.read_file_via_lines(path, "edges.txt")
-        num_of_edges = len(edge_line_message_list)
-        return num_of_edges
+            self.cache = None
 
-    def get_nodes_components_assist(self, type_name):
+        # parse the four splits concurrently up front, otherwise every file is parsed on its first use
+        if num_workers > 1:
+            self.preload(num_workers)
+
+    def get_manifest(self, type_name: str = "raw") -> dict[str, dict]:
+        """
+        :param type_name: "raw", "train", "validation" or "test"
+        :return: {file name: {"size", "mtime_ns", "sha1", "num_of_lines"}}
+        """
+        return self.__manifest_dict[type_name]
+
+    def save_cache(self):
+        """
+        Write the arrays parsed so far into the cache in one go, ex. at the end of preload,
+        or once a script has read the keys it uses, so the next runs only load them
+        """
+        if self.cache is not None:
+            self.cache.save()
+
+    def get_value_lazily_assist(self, function_dict: dict, key: str):
+        """
+        Compute the value of data_loader[key] on its first access and memoize it,
+        so a script only pays for the keys it uses
+        :param function_dict: {key: the method without arguments to compute the value}
+        :param key: ex. "train_edge_list", or "train_nodes_features" which is built from "train_nodes_features_sparse"
+        :return: the value of the key, the same object on every access
+        """
+        return self.get_memoized_value_assist(function_dict, self.__value_dict, key)
+
+    @staticmethod
+    def get_memoized_value_assist(function_dict: dict, value_dict: dict, key: str):
+        """
+        The lazy getter shared by the data loaders, DataLoaderCombined included
+        :param function_dict: {key: the method without arguments to compute the value}
+        :param value_dict: {key: the value computed on the first access}
+        :param key: the key, or the key of the dense value of key + "_sparse"
+        :return: the value of the key
+        """
+        if key not in value_dict:
+            if key not in function_dict and key + "_sparse" in function_dict:
+                value_dict[key] = DataLoaderBase.get_dense_assist(
+                    DataLoaderBase.get_memoized_value_assist(
+                        function_dict, value_dict, key + "_sparse"
+                    )
+                )
+            else:
+                value_dict[key] = function_dict[key]()
+        return value_dict[key]
+
+    def get_cached_arrays(
+        self, names: tuple[str, ...], parse_method
+    ) -> tuple[np.ndarray, ...]:
+        if self.cache is None:
+            if not self.has_cached_arrays(names):
+                self.__array_dict.update(zip(names, parse_method()))
+            return tuple(self.__array_dict[name] for name in names)
+        return self.cache.get_arrays(names, parse_method)
+
+    def has_cached_arrays(self, names: tuple[str, ...]) -> bool:
+        array_dict = self.__array_dict if self.cache is None else self.cache.arrays
+        return all(name in array_dict for name in names)
+
+    def get_path_based_on_type_name(self, type_name: str) -> str:
         if "raw" == type_name:
-            path: str = self.raw_data_file_path
-        else:
-            path: str = os.path.join(self.task_file_path, type_name)
+            return self.raw_data_file_path
+        return os.path.join(self.task_file_path, type_name)
+
+    def get_num_of_lines_assist(self, type_name: str, file_name: str) -> int:
+        file_manifest = self.get_manifest(type_name).get(file_name)
+        if file_manifest is None:
+            return 0
+        return file_manifest["num_of_lines"]
 
-        components_mapping_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "components-mapping.txt"
+    def get_parse_task_assist(self, type_name: str, file_name: str) -> tuple:
+        """
+        :return: (the names of the arrays in the cache, the module level parse function, its arguments),
+        the parse function can run in another thread or process
+        """
+        path: str = self.get_path_based_on_type_name(type_name)
+        if file_name.startswith("relationship"):
+            return (
+                (f"{type_name}/{file_name}",),
+                utils.read_relationship_array,
+                (path, file_name),
+            )
+        if file_name.startswith("components-mapping"):
+            return (
+                (f"{type_name}/{file_name}/indptr", f"{type_name}/{file_name}/indices"),
+                utils.read_components_arrays,
+                (path, file_name),
+            )
+        return (
+            (f"{type_name}/{file_name}/first_column",),
+            utils.read_first_column_array,
+            (path, file_name),
+        )
+
+    def get_parsed_arrays_assist(
+        self, type_name: str, file_name: str
+    ) -> tuple[np.ndarray, ...]:
+        names, parse_function, parse_args = self.get_parse_task_assist(
+            type_name, file_name
+        )
+        return self.get_cached_arrays(
+            names, lambda: self.get_tuple_of_arrays_assist(parse_function(*parse_args))
         )
-        components_mapping_list_with_str_style = [
-            components_mapping_line_message.split(",")
-            for components_mapping_line_message in components_mapping_line_message_list
-        ]
 
-        components_mapping_list = []
+    def get_tuple_of_arrays_assist(self, arrays) -> tuple[np.ndarray, ...]:
+        """
+        :return: the arrays of a parse function in tuple, a single array is returned by some of them
+        """
+        return arrays if isinstance(arrays, tuple) else (arrays,)
 
-        for components_mapping_str in components_mapping_list_with_str_style:
-            components_mapping_line_int_style = [
-                int(component) for component in components_mapping_str
+    def preload(self, num_workers: int = 4, use_processes: bool = False):
+        """
+        Parse the files of the raw, train, validation and test splits concurrently, the results are the same as the serial path
+        :param num_workers: the number of the workers
+        :param use_processes: parse in a process pool instead of a thread pool,
+        the components mapping files are parsed in pure python which holds the GIL in threads
+        """
+        parse_task_list: list[tuple] = list()
+        for type_name in ["raw", "train", "validation", "test"]:
+            for file_name in self.get_manifest(type_name):
+                # the nodes.txt and edges.txt of the raw dataset are the stable ids without index
+                if file_name not in [
+                    "relationship.txt",
+                    "relationship-mask.txt",
+                    "components-mapping.txt",
+                    "components-mapping-mask.txt",
+                ] and (
+                    "raw" == type_name
+                    or file_name not in ["nodes.txt", "nodes-mask.txt", "edges.txt"]
+                ):
+                    continue
+                names, parse_function, parse_args = self.get_parse_task_assist(
+                    type_name, file_name
+                )
+                if not self.has_cached_arrays(names):
+                    parse_task_list.append((names, parse_function, parse_args))
+
+        if 0 == len(parse_task_list):
+            return
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=num_workers) as executor:
+            future_list = [
+                executor.submit(parse_function, *parse_args)
+                for _, parse_function, parse_args in parse_task_list
             ]
-            components_mapping_list.append(components_mapping_line_int_style)
+            # the arrays are stored from this thread, in the order of the tasks
+            for (names, _, _), future in zip(parse_task_list, future_list):
+                arrays = self.get_tuple_of_arrays_assist(future.result())
+                self.get_cached_arrays(names, lambda: arrays)
+
+        self.save_cache()
+
+    def export_bundle(self, bundle_path: str, num_workers: int = 4):
+        """
+        Parse every file of the four splits and write the arrays with the manifests into a single bundle,
+        the loaders open it with bundle_path=... in place of the text files
+        :param bundle_path: ex. ../bundle/Disease-input_link_prediction_dataset.bundle
+        """
+        self.preload(num_workers)
+        for type_name in ["raw", "train", "validation", "test"]:
+            for file_name in ["relationship.txt", "relationship-mask.txt"]:
+                if file_name in self.get_manifest(type_name):
+                    self.get_incidence_based_on_relationship(type_name, file_name)
+
+        bundle_file_dir = os.path.dirname(bundle_path)
+        if bundle_file_dir and not os.path.exists(bundle_file_dir):
+            os.makedirs(bundle_file_dir)
+        save_bundle(
+            bundle_path,
+            self.__array_dict if self.cache is None else self.cache.arrays,
+            {
+                "manifests": self.__manifest_dict,
+                "cache_name": (self.sub_dataset_name + "-" + self.task_name).replace(
+                    " ", "_"
+                ),
+            },
+        )
+
+    def get_relationship_array_assist(
+        self, type_name: str, file_name: str = "relationship.txt"
+    ) -> np.ndarray:
+        """
+        :return: an array of shape (number of lines, 3), the columns are node index, edge index and direction
+        """
+        (relationship_array,) = self.get_parsed_arrays_assist(type_name, file_name)
+        return relationship_array
+
+    def get_incidence_based_on_relationship(
+        self, type_name: str, file_name: str = "relationship.txt"
+    ) -> tuple[
+        utils.HyperEdgeIncidence, utils.HyperEdgeIncidence, utils.HyperEdgeIncidence
+    ]:
+        """
+        :param type_name: "raw", "train", "validation" or "test"
+        :param file_name: "relationship.txt" or "relationship-mask.txt"
+        :return: the CSR incidence of all the nodes, the input nodes and the output nodes of the hyper edges
+        """
+        if (type_name, file_name) not in self.__incidence_dict:
+            # the arrays of the incidences are cached too, so they are memory mapped from the bundle
+            field_name_list = ["edges", "indptr", "indices", "direction"]
+            incidence_arrays = self.get_cached_arrays(
+                tuple(
+                    f"{type_name}/{file_name}/incidence/{direction_name}/{field_name}"
+                    for direction_name in ["all", "input", "output"]
+                    for field_name in field_name_list
+                ),
+                lambda: tuple(
+                    getattr(incidence, field_name)
+                    for incidence in utils.HyperEdgeIncidence.from_relationship_array_by_direction(
+                        self.get_relationship_array_assist(type_name, file_name)
+                    )
+                    for field_name in field_name_list
+                ),
+            )
+            self.__incidence_dict[(type_name, file_name)] = tuple(
+                utils.HyperEdgeIncidence(*incidence_arrays[i : i + 4])
+                for i in range(0, 12, 4)
+            )
+        return self.__incidence_dict[(type_name, file_name)]
+
+    def get_components_arrays_assist(
+        self, type_name: str, file_name: str = "components-mapping.txt"
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the CSR style (indptr, indices) of the components of every line.
+        The lines of components-mapping-mask.txt start with "node index:", which is skipped.
+        """
+        return self.get_parsed_arrays_assist(type_name, file_name)
+
+    def get_first_column_array_assist(
+        self, type_name: str, file_name: str
+    ) -> np.ndarray:
+        """
+        :return: the leading index of every line, ex. 7 for the line "7,R-HSA-8951548"
+        """
+        (first_column_array,) = self.get_parsed_arrays_assist(type_name, file_name)
+        return first_column_array
+
+    def get_max_id_assist(self, type_name: str, file_name: str):
+        """
+        :param file_name: ex. "nodes.txt", "edges.txt" or "components-all.txt"
+        :return: the largest leading index of the file from its parsed array, ex. 1852,
+        None when the file is empty or is the stable ids of the raw dataset without index
+        """
+        if "raw" == type_name or 0 == self.get_num_of_lines_assist(
+            type_name, file_name
+        ):
+            return None
+        return int(self.get_first_column_array_assist(type_name, file_name).max())
+
+    def get_num_of_nodes_based_on_type_name(self, type_name: str = "raw") -> int:
+        return self.get_num_of_lines_assist(type_name, "nodes.txt")
+
+    def get_num_of_features_based_on_type_name(self, type_name: str = "raw") -> int:
+        return self.get_num_of_lines_assist(type_name, "components-all.txt")
+
+    def get_num_of_edges_based_on_type_name(self, type_name: str = "raw") -> int:
+        return self.get_num_of_lines_assist(type_name, "edges.txt")
+
+    def get_nodes_components_assist(self, type_name):
+        indptr, indices = self.get_components_arrays_assist(type_name)
+        components_mapping_list = utils.decode_arrays_to_list_of_lists(indptr, indices)
 
         return components_mapping_list
 
     def get_nodes_features_assist(self, type_name: str):
-        if "raw" == type_name:
-            path: str = self.raw_data_file_path
-        else:
-            path: str = os.path.join(self.task_file_path, type_name)
+        nodes_features: list[list[int]] = self.get_dense_assist(
+            self.get_nodes_features_sparse_assist(type_name)
+        )
 
+        return nodes_features
+
+    def get_nodes_features_sparse_assist(self, type_name: str) -> csr_matrix:
+        """
+        :param type_name: "raw", "train", "validation" or "test"
+        :return: the multi-hot components of the nodes as a float32 csr_matrix of shape (num of nodes, num of features)
+        """
         num_of_nodes = self.get_num_of_nodes_based_on_type_name(type_name)
         num_of_edges = self.get_num_of_edges_based_on_type_name(type_name)
         num_of_feature_dimension = self.get_num_of_features_based_on_type_name()
 
-        relationship_path = os.path.join(path, "relationship.txt")
-        # mat = pd.read_csv(os.path.join(self.__project_root_path, relationship_path), names=['entity', 'reaction', 'type'], header=None)
-        mat = pd.read_csv(
-            relationship_path, names=["entity", "reaction", "type"], header=None
-        )
-
-        components_mapping_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "components-mapping.txt"
-        )
-        components_mapping_list_with_str_style = [
-            components_mapping_line_message.split(",")
-            for components_mapping_line_message in components_mapping_line_message_list
-        ]
-
-        components_mapping_list = []
+        relationship_array = self.get_relationship_array_assist(type_name)
 
-        for components_mapping_str in components_mapping_list_with_str_style:
-            components_mapping_line_int_style = [
-                int(component) for component in components_mapping_str
-            ]
-            components_mapping_list.append(components_mapping_line_int_style)
+        indptr, indices = self.get_components_arrays_assist(type_name)
 
-        num_of_pair_of_entity_and_component: int = 0
-        for components_of_single_entity in components_mapping_list:
-            num_of_pair_of_entity_and_component = (
-                num_of_pair_of_entity_and_component + len(components_of_single_entity)
-            )
+        num_of_pair_of_entity_and_component: int = len(indices)
 
-        nodes_features = utils.encode_node_features(
-            components_mapping_list, num_of_nodes, num_of_feature_dimension
+        nodes_features = utils.encode_node_features_to_sparse_from_arrays(
+            indptr, indices, num_of_nodes, num_of_feature_dimension
         )
 
         print(
             type_name + " dataset\n",
             "Number of interactions: %2d.\n Number of nodes: %2d.\n Number of features: %2d.\n Number of pair of node and feature: %2d.\n Number of edges: %2d."
             % (
-                len(mat),
+                len(relationship_array),
                 num_of_nodes,
                 num_of_feature_dimension,
                 num_of_pair_of_entity_and_component,
@@ -184,6 +450,16 @@ class DataLoaderBase:
 
         return nodes_features
 
+    @staticmethod
+    def get_dense_assist(sparse_value):
+        """
+        :param sparse_value: the sparse features in csr_matrix or the sparse labels in torch.sparse_csr_tensor
+        :return: the dense list of lists features or the dense labels tensor, as they were before they are kept sparse
+        """
+        if isinstance(sparse_value, torch.Tensor):
+            return sparse_value.to_dense()
+        return sparse_value.astype(np.int64).toarray().tolist()
+
     def get_edge_of_nodes_list_regardless_direction(self, param) -> list[list[int]]:
         """
         Get the nodes of all the hyper edges
@@ -196,216 +472,157 @@ class DataLoaderBase:
         :param type_name: "raw" for raw dataset, "test" for test dataset, "train" for train dataset, "validation" for validation dataset
         :return:
         """
-        if "raw" == type_name:
-            path: str = self.raw_data_file_path
-        else:
-            path: str = os.path.join(self.task_file_path, type_name)
-
-        relationship_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "relationship.txt"
-        )
-
         (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
-        ) = self.get_edge_to_list_of_nodes_dict_assist(relationship_line_message_list)
+            incidence,
+            input_incidence,
+            output_incidence,
+        ) = self.get_incidence_based_on_relationship(type_name)
 
         return (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
+            incidence.to_dict(),
+            input_incidence.to_dict(),
+            output_incidence.to_dict(),
         )
 
     def get_edge_to_list_of_masked_nodes_dict(self, type_name: str):
-        path: str = os.path.join(self.task_file_path, type_name)
-        relationship_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "relationship-mask.txt"
-        )
         (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
-        ) = self.get_edge_to_list_of_nodes_dict_assist(relationship_line_message_list)
+            incidence,
+            input_incidence,
+            output_incidence,
+        ) = self.get_incidence_based_on_relationship(type_name, "relationship-mask.txt")
 
         return (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
+            incidence.to_dict(),
+            input_incidence.to_dict(),
+            output_incidence.to_dict(),
         )
 
-    def get_edge_to_list_of_nodes_dict_assist(
-        self, relationship_line_message_list: list[str]
-    ):
-        edge_to_list_of_nodes_dict: dict[int, list[int]] = dict()
-        edge_to_list_of_input_nodes_dict: dict[int, list[int]] = dict()
-        edge_to_list_of_output_nodes_dict: dict[int, list[int]] = dict()
-
-        for relationship_line_message in relationship_line_message_list:
-            elements: list[str] = relationship_line_message.split(",")
-            node_index: int = int(elements[0])
-            edge_index: int = int(elements[1])
-            direction: int = int(elements[2])
-
-            if edge_index not in edge_to_list_of_nodes_dict.keys():
-                edge_to_list_of_nodes_dict[edge_index] = list()
-            edge_to_list_of_nodes_dict[edge_index].append(node_index)
-
-            if direction < 0:
-                if edge_index not in edge_to_list_of_input_nodes_dict.keys():
-                    edge_to_list_of_input_nodes_dict[edge_index] = list()
-                edge_to_list_of_input_nodes_dict[edge_index].append(node_index)
-
-            elif direction > 0:
-                if edge_index not in edge_to_list_of_output_nodes_dict.keys():
-                    edge_to_list_of_output_nodes_dict[edge_index] = list()
-                edge_to_list_of_output_nodes_dict[edge_index].append(node_index)
+    def get_edge_to_list_of_nodes_dict_assist(self, relationship_array: np.ndarray):
+        (
+            incidence,
+            input_incidence,
+            output_incidence,
+        ) = utils.HyperEdgeIncidence.from_relationship_array_by_direction(
+            relationship_array
+        )
 
         return (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
+            incidence.to_dict(),
+            input_incidence.to_dict(),
+            output_incidence.to_dict(),
         )
 
     def get_labels(self):
         pass
 
     def get_nodes_mask_assist(self, type_name: str) -> list[int]:
-        nodes_mask: list[int] = list()
-
-        path: str = os.path.join(self.task_file_path, type_name)
         if "train" != type_name:
             file_name = "nodes.txt"
         else:
             file_name = "nodes-mask.txt"
 
-        node_line_message_list: list[str] = utils.read_file_via_lines(path, file_name)
-
-        for node_line_message in node_line_message_list:
-            elements = node_line_message.split(",")
-            node_index = int(elements[0])
-            nodes_mask.append(node_index)
+        nodes_mask: list[int] = self.get_first_column_array_assist(
+            type_name, file_name
+        ).tolist()
 
         return nodes_mask
 
     def get_edges_mask_assist(self, type_name: str) -> list[int]:
-        edges_mask: list[int] = list()
-
-        path: str = os.path.join(self.task_file_path, type_name)
-        edges_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "edges.txt"
-        )
-
-        for node_line_message in edges_line_message_list:
-            elements = node_line_message.split(",")
-            edge_index = int(elements[0])
-            edges_mask.append(edge_index)
+        edges_mask: list[int] = self.get_first_column_array_assist(
+            type_name, "edges.txt"
+        ).tolist()
 
         return edges_mask
 
 
 class DataLoaderAttribute(DataLoaderBase):
-    def __init__(self, sub_dataset_name, task_name):
-        super().__init__(sub_dataset_name, task_name)
-
-        # node mask
-        (
-            self.__train_nodes_mask,
-            self.__validation_nodes_mask,
-            self.__test_nodes_mask,
-        ) = self.__get_nodes_mask()
-
-        # node components
-        self.__train_nodes_components = super().get_nodes_components_assist("train")
-        self.__validation_nodes_components = super().get_nodes_components_assist(
-            "validation"
+    def __init__(
+        self,
+        sub_dataset_name,
+        task_name,
+        use_cache: bool = True,
+        write_manifest: bool = True,
+        num_workers: int = 1,
+        bundle_path: str = None,
+    ):
+        super().__init__(
+            sub_dataset_name,
+            task_name,
+            use_cache,
+            write_manifest,
+            num_workers,
+            bundle_path,
         )
-        self.__test_nodes_components = super().get_nodes_components_assist("test")
-
-        # node features
-        self.__raw_nodes_features = super().get_nodes_features_assist("raw")
-        self.__train_nodes_features = super().get_nodes_features_assist("train")
-
-        # print the information
-        super().get_nodes_features_assist("validation")
-        super().get_nodes_features_assist("test")
-
-        # get labels
-        self.train_labels, self.validation_labels, self.test_labels = self.get_labels()
 
+        # every value is computed on its first access, see get_value_lazily_assist
         self.__function_dict = {
-            "num_nodes": self.get_num_of_nodes_based_on_type_name(),
-            "num_features": self.get_num_of_features_based_on_type_name(),
-            "num_edges": self.get_num_of_edges_based_on_type_name(),
-            "edge_list": self.get_edge_of_nodes_list_regardless_direction("train"),
-            "train_nodes_components": self.__train_nodes_components,
-            "validation_nodes_components": self.__validation_nodes_components,
-            "test_nodes_components": self.__test_nodes_components,
-            "raw_nodes_features": self.__raw_nodes_features,
+            "num_nodes": lambda: self.get_num_of_nodes_based_on_type_name(),
+            "num_features": lambda: self.get_num_of_features_based_on_type_name(),
+            "num_edges": lambda: self.get_num_of_edges_based_on_type_name(),
+            "edge_list": lambda: self.get_edge_of_nodes_list_regardless_direction(
+                "train"
+            ),
+            "train_nodes_components": lambda: self.get_nodes_components_assist("train"),
+            "validation_nodes_components": lambda: self.get_nodes_components_assist(
+                "validation"
+            ),
+            "test_nodes_components": lambda: self.get_nodes_components_assist("test"),
+            # the dense list of lists "*_nodes_features" are built from these on demand
+            "raw_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
+                "raw"
+            ),
             # train, validation, and test dataset just use train dataset
-            "train_nodes_features": self.__train_nodes_features,
-            "validation_nodes_features": self.__train_nodes_features,
-            "test_nodes_features": self.__train_nodes_features,
-            "train_labels": self.train_labels,
-            "validation_labels": self.validation_labels,
-            "test_labels": self.test_labels,
-            "train_node_mask": self.__train_nodes_mask,
-            "val_node_mask": self.__validation_nodes_mask,
-            "test_node_mask": self.__test_nodes_mask,
+            "train_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
+                "train"
+            ),
+            "validation_nodes_features_sparse": lambda: self[
+                "train_nodes_features_sparse"
+            ],
+            "test_nodes_features_sparse": lambda: self["train_nodes_features_sparse"],
+            # the dense "*_labels" are built from these on demand
+            "train_labels_sparse": lambda: self.get_labels_based_on_type_name("train"),
+            "validation_labels_sparse": lambda: self.get_labels_based_on_type_name(
+                "validation"
+            ),
+            "test_labels_sparse": lambda: self.get_labels_based_on_type_name("test"),
+            "train_node_mask": lambda: self.get_nodes_mask_assist("train"),
+            "val_node_mask": lambda: self.get_nodes_mask_assist("validation"),
+            "test_node_mask": lambda: self.get_nodes_mask_assist("test"),
         }
 
     def __getitem__(self, key):
-        return self.__function_dict[key]
+        return super().get_value_lazily_assist(self.__function_dict, key)
 
     def get_labels(self):
-        train_all_nodes_features = self.__train_nodes_features
-        num_of_nodes_validation: int = self.get_num_of_nodes_based_on_type_name(
-            "validation"
-        )
-        num_of_nodes_test: int = self.get_num_of_nodes_based_on_type_name("test")
-        num_of_features: int = self.get_num_of_features_based_on_type_name("train")
-        train_labels = torch.FloatTensor(train_all_nodes_features)[
-            self.__train_nodes_mask
-        ]
-
-        validation_masked_nodes_features = (
-            self.__get_nodes_to_list_of_masked_components_assist("validation")
+        return (
+            self["train_labels"],
+            self["validation_labels"],
+            self["test_labels"],
         )
 
-        validation_labels = torch.FloatTensor(
-            utils.encode_node_features(
-                validation_masked_nodes_features,
-                num_of_nodes_validation,
-                num_of_features,
+    def get_labels_based_on_type_name(self, type_name: str) -> torch.Tensor:
+        """
+        :param type_name: "train", "validation" or "test"
+        :return: the components of the masked nodes as torch.sparse_csr_tensor
+        """
+        if "train" == type_name:
+            return utils.sparse_features_to_tensor(
+                self["train_nodes_features_sparse"][self["train_node_mask"]],
+                sparse=True,
             )
-        )
 
-        test_masked_nodes_features = (
-            self.__get_nodes_to_list_of_masked_components_assist("test")
-        )
+        if type_name not in ["validation", "test"]:
+            raise Exception('Please input "train", "validation" or "test" ')
 
-        test_labels = torch.FloatTensor(
-            utils.encode_node_features(
-                test_masked_nodes_features, num_of_nodes_test, num_of_features
-            )
+        masked_nodes_features = utils.encode_node_features_to_sparse_from_arrays(
+            *super().get_components_arrays_assist(
+                type_name, "components-mapping-mask.txt"
+            ),
+            self.get_num_of_nodes_based_on_type_name(type_name),
+            self.get_num_of_features_based_on_type_name("train"),
         )
 
-        return train_labels, validation_labels, test_labels
-
-    def __get_nodes_to_list_of_masked_components_assist(self, type_name: str):
-        path: str = os.path.join(self.task_file_path, type_name)
-        file_name: str = "components-mapping-mask.txt"
-        node_line_message_list: list[str] = utils.read_file_via_lines(path, file_name)
-
-        nodes_to_list_of_masked_components: list[list[int]] = list()
-        for node_line_message in node_line_message_list:
-            masked_components_list = [
-                int(component_str)
-                for component_str in node_line_message.split(":")[1].split(",")
-            ]
-            nodes_to_list_of_masked_components.append(masked_components_list)
-
-        return nodes_to_list_of_masked_components
+        return utils.sparse_features_to_tensor(masked_nodes_features, sparse=True)
 
     def __get_complete_nodes_features_mix_negative_for_attribute_prediction(
         self, node_mask: list[int], type_name: str
@@ -414,22 +631,7 @@ class DataLoaderAttribute(DataLoaderBase):
             list[int]
         ] = self.__get_nodes_features_mix_negative_assist(type_name)
 
-        path: str = self.raw_data_file_path
-        components_mapping_line_message_list: list[str] = utils.read_file_via_lines(
-            path, "components-mapping.txt"
-        )
-        components_mapping_list_with_str_style = [
-            components_mapping_line_message.split(",")
-            for components_mapping_line_message in components_mapping_line_message_list
-        ]
-
-        raw_nodes_components_mapping_list = []
-
-        for components_mapping_str in components_mapping_list_with_str_style:
-            components_mapping_line_int_style = [
-                int(component) for component in components_mapping_str
-            ]
-            raw_nodes_components_mapping_list.append(components_mapping_line_int_style)
+        raw_nodes_components_mapping_list = super().get_nodes_components_assist("raw")
 
         for i, node_mask_index in enumerate(node_mask):
             raw_nodes_components_mapping_list[
@@ -491,307 +693,427 @@ class DataLoaderAttribute(DataLoaderBase):
 
         return nodes_features_mix_negative
 
-    def __get_nodes_mask(self) -> tuple[list[int], list[int], list[int]]:
-        train_nodes_mask = super().get_nodes_mask_assist("train")
-        validation_nodes_mask = super().get_nodes_mask_assist("validation")
-        test_nodes_mask = super().get_nodes_mask_assist("test")
-
-        return train_nodes_mask, validation_nodes_mask, test_nodes_mask
-
     def get_edge_of_nodes_list_regardless_direction(
         self, type_name: str
     ) -> list[list[int]]:
         """
         :return: [[1,2,3], [3,7,9], [4,6,7,8,10,11]...] while [1,2,3], [3,7,9], .. represent the hyper edges
         """
-        (
-            edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = self.get_edge_to_list_of_nodes_dict_based_on_relationship(type_name)
-
-        edge_of_nodes_list_without_direction: list[list[int]] = [
-            list_of_nodes
-            for edge_index, list_of_nodes in edge_to_list_of_nodes_dict.items()
-        ]
+        incidence, _, _ = self.get_incidence_based_on_relationship(type_name)
+
+        edge_of_nodes_list_without_direction: list[list[int]] = incidence.to_list()
 
         return edge_of_nodes_list_without_direction
 
 
 class DataLoaderLink(DataLoaderBase):
-    def __init__(self, sub_dataset_name, task_name):
-        super().__init__(sub_dataset_name, task_name)
-
-        (
-            self.__raw_edge_to_nodes_dict,
-            self.__train_edge_to_nodes_dict,
-            self.__validation_edge_to_nodes_dict,
-            self.__test_edge_to_nodes_dict,
-        ) = self.__get_edge_to_list_of_nodes_dict()
-        (
-            self.__train_edge_mask,
-            self.__validation_edge_mask,
-            self.__test_edge_mask,
-        ) = self.get_edges_mask()
-
-        (
-            self.__raw_nodes_features,
-            self.__train_nodes_features,
-            self.__validation_nodes_features,
-            self.__test_nodes_features,
-        ) = (
-            super().get_nodes_features_assist("raw"),
-            super().get_nodes_features_assist("train"),
-            super().get_nodes_features_assist("validation"),
-            super().get_nodes_features_assist("test"),
+    def __init__(
+        self,
+        sub_dataset_name,
+        task_name,
+        use_cache: bool = True,
+        write_manifest: bool = True,
+        num_workers: int = 1,
+        bundle_path: str = None,
+    ):
+        super().__init__(
+            sub_dataset_name,
+            task_name,
+            use_cache,
+            write_manifest,
+            num_workers,
+            bundle_path,
         )
 
-        (
-            self.__list_of_edge_of_nodes_train,
-            self.__list_of_edge_of_input_nodes_train,
-            self.__list_of_edge_of_output_nodes_train,
-        ) = self.__get_list_of_edges_of_nodes_based_on_train_dataset()
-        (
-            self.__train_labels,
-            self.__test_labels,
-            self.__validation_labels,
-        ) = self.get_labels()
-
+        # every value is computed on its first access, see get_value_lazily_assist
         self.__function_dict = {
-            "num_nodes": self.get_num_of_nodes_based_on_type_name(),
-            "num_features": self.get_num_of_features_based_on_type_name(),
-            "num_edges": self.get_num_of_edges_based_on_type_name(),
-            "raw_edge_list": self.get_edge_of_nodes_list_regardless_direction("raw"),
-            "train_edge_list": self.get_edge_of_nodes_list_regardless_direction(
+            "num_nodes": lambda: self.get_num_of_nodes_based_on_type_name(),
+            "num_features": lambda: self.get_num_of_features_based_on_type_name(),
+            "num_edges": lambda: self.get_num_of_edges_based_on_type_name(),
+            "raw_edge_list": lambda: self.get_edge_of_nodes_list_regardless_direction(
+                "raw"
+            ),
+            "train_edge_list": lambda: self.get_edge_of_nodes_list_regardless_direction(
                 "train"
             ),
-            "train_masked_edge_list": self.get_masked_train_edge_of_nodes_list_regardless_direction(
-                self.__train_edge_mask
+            "train_masked_edge_list": lambda: self.get_masked_train_edge_of_nodes_list_regardless_direction(
+                self["train_edge_mask"]
+            ),
+            "train_edge_list_with_input_nodes": lambda: self.__get_list_of_edges_of_nodes_based_on_train_dataset(
+                1
+            ),
+            "train_edge_list_with_output_nodes": lambda: self.__get_list_of_edges_of_nodes_based_on_train_dataset(
+                2
+            ),
+            "validation_edge_list": lambda: self.get_edge_of_nodes_list_regardless_direction(
+                "validation"
+            ),
+            "test_edge_list": lambda: self.get_edge_of_nodes_list_regardless_direction(
+                "test"
+            ),
+            # the dense list of lists "*_nodes_features" are built from these on demand
+            "raw_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
+                "raw"
             ),
-            "train_edge_list_with_input_nodes": self.__list_of_edge_of_input_nodes_train,
-            "train_edge_list_with_output_nodes": self.__list_of_edge_of_output_nodes_train,
-            "validation_edge_list": self.get_edge_of_nodes_list_regardless_direction(
+            "train_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
+                "train"
+            ),
+            "validation_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
                 "validation"
             ),
-            "test_edge_list": self.get_edge_of_nodes_list_regardless_direction("test"),
-            "raw_nodes_features": self.__raw_nodes_features,
-            "train_nodes_features": self.__train_nodes_features,
-            "validation_nodes_features": self.__validation_nodes_features,
-            "test_nodes_features": self.__test_nodes_features,
-            "train_labels": self.__train_labels,
-            "test_labels": self.__test_labels,
-            "validation_labels": self.__validation_labels,
-            "train_edge_mask": self.__train_edge_mask,
-            "val_edge_mask": self.__validation_edge_mask,
-            "test_edge_mask": self.__test_edge_mask,
+            "test_nodes_features_sparse": lambda: self.get_nodes_features_sparse_assist(
+                "test"
+            ),
+            # the dense "*_labels" are built from these on demand
+            "train_labels_sparse": lambda: self.get_labels_based_on_type_name("train"),
+            "test_labels_sparse": lambda: self.get_labels_based_on_type_name("test"),
+            "validation_labels_sparse": lambda: self.get_labels_based_on_type_name(
+                "validation"
+            ),
+            "train_edge_mask": lambda: self.get_edges_mask_based_on_type_name("train"),
+            "val_edge_mask": lambda: self.get_edges_mask_based_on_type_name(
+                "validation"
+            ),
+            "test_edge_mask": lambda: self.get_edges_mask_based_on_type_name("test"),
         }
 
     def __getitem__(self, key):
-        return self.__function_dict[key]
-
-    def __get_edge_to_list_of_nodes_dict(
-        self,
-    ) -> tuple[
-        dict[int, list[int]],
-        dict[int, list[int]],
-        dict[int, list[int]],
-        dict[int, list[int]],
-    ]:
-        (
-            raw_edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = self.get_edge_to_list_of_nodes_dict_based_on_relationship("raw")
-        (
-            train_edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = super().get_edge_to_list_of_nodes_dict_based_on_relationship("train")
-        (
-            validation_edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = super().get_edge_to_list_of_nodes_dict_based_on_relationship("validation")
-        (
-            test_edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = super().get_edge_to_list_of_nodes_dict_based_on_relationship("test")
-
-        return (
-            raw_edge_to_list_of_nodes_dict,
-            train_edge_to_list_of_nodes_dict,
-            validation_edge_to_list_of_nodes_dict,
-            test_edge_to_list_of_nodes_dict,
-        )
+        return super().get_value_lazily_assist(self.__function_dict, key)
 
     def get_edge_of_nodes_list_regardless_direction(self, type_name) -> list[list[int]]:
         """
         :return: [[1,2,3], [3,7,9], [4,6,7,8,10,11]...] while [1,2,3], [3,7,9], .. represent the hyper edges
         """
-
-        type_dict = {
-            "raw": self.__raw_edge_to_nodes_dict,
-            "train": self.__train_edge_to_nodes_dict,
-            "validation": self.__validation_edge_to_nodes_dict,
-            "test": self.__test_edge_to_nodes_dict,
-        }
-
-        if type_name not in type_dict.keys():
+        if type_name not in ["raw", "train", "validation", "test"]:
             raise Exception('Please input "train", "validation" or "test" ')
 
-        edge_of_nodes_list_without_direction: list[list[int]] = [
-            list_of_nodes for edge_index, list_of_nodes in type_dict[type_name].items()
-        ]
+        incidence, _, _ = super().get_incidence_based_on_relationship(type_name)
+
+        edge_of_nodes_list_without_direction: list[list[int]] = incidence.to_list()
 
         return edge_of_nodes_list_without_direction
 
     def __get_list_of_edges_of_nodes_based_on_train_dataset(
-        self,
-    ) -> tuple[list[list[int]], list[list[int]], list[list[int]]]:
+        self, direction_index: int
+    ) -> list[list[int]]:
+        """
+        :param direction_index: 0 regardless direction, 1 for the input nodes and 2 for the output nodes
+        :return: the i-th element is the nodes of train edge i
+        """
         num_of_edges = self.get_num_of_edges_based_on_type_name("train")
-        (
-            edge_to_list_of_nodes_dict,
-            edge_to_list_of_input_nodes_dict,
-            edge_to_list_of_output_nodes_dict,
-        ) = super().get_edge_to_list_of_nodes_dict_based_on_relationship("train")
-
-        # edges_all = edge_to_list_of_nodes_dict.keys()
-        # edges_input = edge_to_list_of_input_nodes_dict.keys()
-        #
-        # print(set(edges_all) - set(edges_input))
-
-        list_of_edge_of_nodes: list[list[int]] = list()
-        list_of_edge_of_input_nodes: list[list[int]] = list()
-        list_of_edge_of_output_nodes: list[list[int]] = list()
-        for i in range(num_of_edges):
-            if i in edge_to_list_of_nodes_dict.keys():
-                list_of_edge_of_nodes.append(edge_to_list_of_nodes_dict.get(i))
-            else:
-                list_of_edge_of_nodes.append(list())
-            if i in edge_to_list_of_input_nodes_dict.keys():
-                list_of_edge_of_input_nodes.append(
-                    edge_to_list_of_input_nodes_dict.get(i)
-                )
-            else:
-                list_of_edge_of_input_nodes.append(list())
-            if i in edge_to_list_of_output_nodes_dict.keys():
-                list_of_edge_of_output_nodes.append(
-                    edge_to_list_of_output_nodes_dict.get(i)
-                )
-            else:
-                list_of_edge_of_output_nodes.append(list())
+        incidence = super().get_incidence_based_on_relationship("train")[
+            direction_index
+        ]
 
+        return incidence.to_list_by_edge_index(num_of_edges)
+
+    def get_labels(self):
         return (
-            list_of_edge_of_nodes,
-            list_of_edge_of_input_nodes,
-            list_of_edge_of_output_nodes,
+            self["train_labels_sparse"],
+            self["test_labels_sparse"],
+            self["validation_labels_sparse"],
         )
 
-    def __get_list_of_edges_of_masked_nodes(self, type_name: str):
-        type_dict = {
-            "raw": self.__raw_edge_to_nodes_dict,
-            "train": self.__train_edge_to_nodes_dict,
-            "validation": self.__validation_edge_to_nodes_dict,
-            "test": self.__test_edge_to_nodes_dict,
-        }
-        if type_name not in type_dict.keys():
-            raise Exception('Please input "train", "validation" or "test" ')
-        (
-            edge_to_list_of_nodes_dict,
-            _,
-            _,
-        ) = super().get_edge_to_list_of_masked_nodes_dict(type_name)
-        list_of_edges_of_masked_nodes: list[list[int]] = list()
-        for edge, list_of_nodes in edge_to_list_of_nodes_dict.items():
-            list_of_edges_of_masked_nodes.append(list_of_nodes)
+    def get_labels_based_on_type_name(self, type_name: str) -> torch.Tensor:
+        """
+        :param type_name: "train", "validation" or "test"
+        :return: the labels as torch.sparse_csr_tensor of shape (num of masked edges, num of nodes),
+        only the masked rows are materialised
+        """
+        if "train" == type_name:
+            if "input link prediction dataset" == self.task_name:
+                _, incidence, _ = super().get_incidence_based_on_relationship("train")
 
-        return list_of_edges_of_masked_nodes
+            elif "output link prediction dataset" == self.task_name:
+                _, _, incidence = super().get_incidence_based_on_relationship("train")
 
-    def get_labels(self):
-        if "input link prediction dataset" == self.task_name:
-            list_of_edge_of_nodes_train = self.__list_of_edge_of_input_nodes_train
+            else:
+                raise Exception(
+                    'The task name should be "input link prediction dataset" or "output link prediction dataset"'
+                )
+            edge_indexes = self["train_edge_mask"]
 
-        elif "output link prediction dataset" == self.task_name:
-            list_of_edge_of_nodes_train = self.__list_of_edge_of_output_nodes_train
+        elif type_name in ["validation", "test"]:
+            incidence, _, _ = super().get_incidence_based_on_relationship(
+                type_name, "relationship-mask.txt"
+            )
+            edge_indexes = None
 
         else:
-            raise Exception(
-                'The task name should be "input link prediction dataset" or "output link prediction dataset"'
-            )
+            raise Exception('Please input "train", "validation" or "test" ')
 
-        list_of_edge_of_masked_nodes_test = self.__get_list_of_edges_of_masked_nodes(
-            "test"
+        num_of_nodes_of_raw_dataset = self.get_num_of_nodes_based_on_type_name("train")
+
+        return utils.sparse_features_to_tensor(
+            incidence.to_csr_matrix(num_of_nodes_of_raw_dataset, edge_indexes),
+            sparse=True,
         )
 
-        list_of_edge_of_masked_nodes_validation = (
-            self.__get_list_of_edges_of_masked_nodes("validation")
+    def get_edges_mask(self):
+        return (
+            self["train_edge_mask"],
+            self["val_edge_mask"],
+            self["test_edge_mask"],
         )
 
-        num_of_nodes_of_raw_dataset = self.get_num_of_nodes_based_on_type_name("train")
+    def get_edges_mask_based_on_type_name(self, type_name: str) -> list[int]:
+        if "train" == type_name:
+            # the train edges are the edges masked in validation or test
+            return sorted(set(self["val_edge_mask"]).union(self["test_edge_mask"]))
+        return super().get_edges_mask_assist(type_name)
+
+    def get_masked_train_edge_of_nodes_list_regardless_direction(
+        self, train_edge_mask: list[int]
+    ):
+        train_edge_of_nodes_list_regardless_direction: list[
+            list[int]
+        ] = self.get_edge_of_nodes_list_regardless_direction("train")
+
+        train_edge_of_nodes_list_regardless_direction: list[list[int]] = [
+            train_edge_of_nodes_list_regardless_direction[train_edge_mask_index]
+            for train_edge_mask_index in train_edge_mask
+        ]
+
+        return copy.deepcopy(train_edge_of_nodes_list_regardless_direction)
+
 
-        train_labels_for_link_prediction = torch.FloatTensor(
-            utils.encode_edges_features(
-                list_of_edge_of_nodes_train,
-                len(list_of_edge_of_nodes_train),
-                num_of_nodes_of_raw_dataset,
+class DataLoaderCombined:
+    """
+    This is a dataloader which unions the raw datasets of several pathways into one hyper graph
+    Args:
+            sub_dataset_names (list): Names of the pathways e.g. ["Disease", "Immune System"],
+            ["All_data_in_Reactome"] for the full dump, None for every pathway under ../data.
+            use_cache (bool): Whether to keep the combined arrays in the binary cache under ../cache.
+    Return:
+            self[key]: The same style of keys as DataLoaderLink, ex. "num_nodes", "edge_list", "nodes_features_sparse".
+
+    The entities, reactions and components are interned by their stable ids (R-HSA-...) into global indexes,
+    the pathways are read one at a time and only their integer arrays are kept,
+    the relationships and components shared by several pathways are kept once.
+    """
+
+    def __init__(
+        self,
+        sub_dataset_names: list[str] = None,
+        use_cache: bool = True,
+    ):
+        data_file_path = os.path.join("..", "data")
+        if sub_dataset_names is None:
+            sub_dataset_names = sorted(
+                sub_dataset_name
+                for sub_dataset_name in os.listdir(data_file_path)
+                if os.path.isdir(os.path.join(data_file_path, sub_dataset_name))
             )
-        )
-        train_labels_for_link_prediction = train_labels_for_link_prediction[
-            self.__train_edge_mask
+        self.sub_dataset_names = list(sub_dataset_names)
+        self.raw_data_file_paths = [
+            os.path.join(data_file_path, sub_dataset_name)
+            for sub_dataset_name in self.sub_dataset_names
         ]
 
-        test_labels_for_link_prediction = torch.FloatTensor(
-            utils.encode_edges_features(
-                list_of_edge_of_masked_nodes_test,
-                len(list_of_edge_of_masked_nodes_test),
-                num_of_nodes_of_raw_dataset,
+        # the cache name carries the pathways, the key carries the content of their files
+        self.cache = (
+            DatasetCache(
+                compute_content_hash(
+                    [
+                        get_split_manifest(raw_data_file_path)
+                        for raw_data_file_path in self.raw_data_file_paths
+                    ]
+                ),
+                os.path.join("..", "cache"),
+                "combined-"
+                + hashlib.sha1(
+                    "||".join(self.sub_dataset_names).encode("utf-8")
+                ).hexdigest()[:8],
             )
+            if use_cache
+            else None
+        )
+
+        (
+            self.__node_index,
+            self.__edge_index,
+            self.__component_index,
+            self.__relationship_array,
+            self.__components_indptr,
+            self.__components_indices,
+        ) = self.__get_combined_arrays()
+
+        self.__incidence = None
+        self.__value_dict: dict[str, object] = dict()
+
+        # every value is computed on its first access
+        self.__function_dict = {
+            "num_nodes": lambda: len(self.__node_index),
+            "num_features": lambda: len(self.__component_index),
+            "num_edges": lambda: len(self.__edge_index),
+            "relationship_array": lambda: self.__relationship_array,
+            "node_stable_ids": lambda: self.__node_index.stable_ids,
+            "edge_stable_ids": lambda: self.__edge_index.stable_ids,
+            "component_stable_ids": lambda: self.__component_index.stable_ids,
+            "edge_list": lambda: self.get_incidence()[0].to_list(),
+            "edge_list_with_input_nodes": lambda: self.get_incidence()[
+                1
+            ].to_list_by_edge_index(len(self.__edge_index)),
+            "edge_list_with_output_nodes": lambda: self.get_incidence()[
+                2
+            ].to_list_by_edge_index(len(self.__edge_index)),
+            "nodes_components": lambda: utils.decode_arrays_to_list_of_lists(
+                self.__components_indptr, self.__components_indices
+            ),
+            "nodes_features_sparse": lambda: utils.encode_node_features_to_sparse_from_arrays(
+                self.__components_indptr,
+                self.__components_indices,
+                len(self.__node_index),
+                len(self.__component_index),
+            ),
+        }
+
+    def __getitem__(self, key):
+        return DataLoaderBase.get_memoized_value_assist(
+            self.__function_dict, self.__value_dict, key
         )
 
-        validation_labels_for_link_prediction = torch.FloatTensor(
-            utils.encode_edges_features(
-                list_of_edge_of_masked_nodes_validation,
-                len(list_of_edge_of_masked_nodes_validation),
-                num_of_nodes_of_raw_dataset,
+    def get_incidence(
+        self,
+    ) -> tuple[
+        utils.HyperEdgeIncidence, utils.HyperEdgeIncidence, utils.HyperEdgeIncidence
+    ]:
+        """
+        :return: the CSR incidence of all the nodes, the input nodes and the output nodes of the combined hyper edges
+        """
+        if self.__incidence is None:
+            self.__incidence = (
+                utils.HyperEdgeIncidence.from_relationship_array_by_direction(
+                    self.__relationship_array
+                )
             )
+        return self.__incidence
+
+    def get_indexes_of_stable_ids(self, type_name: str, stable_ids) -> np.ndarray:
+        """
+        :param type_name: "node", "edge" or "component"
+        :param stable_ids: ex. ["R-HSA-8936661", "R-HIV-175558"]
+        :return: the global indexes, -1 for the stable ids which are not in the combined dataset
+        """
+        if "node" == type_name:
+            return self.__node_index.lookup(stable_ids)
+        elif "edge" == type_name:
+            return self.__edge_index.lookup(stable_ids)
+        elif "component" == type_name:
+            return self.__component_index.lookup(stable_ids)
+        raise Exception('Please input "node", "edge" or "component"')
+
+    def __get_combined_arrays(self):
+        names = (
+            "node_stable_ids",
+            "edge_stable_ids",
+            "component_stable_ids",
+            "relationship",
+            "components/indptr",
+            "components/indices",
         )
+        if self.cache is None:
+            arrays = self.__combine_pathways()
+        else:
+            arrays = self.cache.get_arrays(names, self.__combine_pathways)
+            self.cache.save()
+
+        (
+            node_stable_ids,
+            edge_stable_ids,
+            component_stable_ids,
+            relationship_array,
+            components_indptr,
+            components_indices,
+        ) = arrays
 
         return (
-            train_labels_for_link_prediction,
-            test_labels_for_link_prediction,
-            validation_labels_for_link_prediction,
+            utils.StableIdIndex(node_stable_ids),
+            utils.StableIdIndex(edge_stable_ids),
+            utils.StableIdIndex(component_stable_ids),
+            relationship_array,
+            components_indptr,
+            components_indices,
         )
 
-    def get_edges_mask(self):
-        validation_edges_mask = super().get_edges_mask_assist("validation")
-        test_edges_mask = super().get_edges_mask_assist("test")
+    def __combine_pathways(self):
+        node_index = utils.StableIdIndex()
+        edge_index = utils.StableIdIndex()
+        component_index = utils.StableIdIndex()
 
-        train_edges_set = set()
-        for validation_edges_idx in validation_edges_mask:
-            train_edges_set.add(validation_edges_idx)
-        for test_edges_idx in test_edges_mask:
-            train_edges_set.add(test_edges_idx)
+        relationship_array_list: list[np.ndarray] = list()
+        node_column_list: list[np.ndarray] = list()
+        component_column_list: list[np.ndarray] = list()
 
-        train_edges_mask = list(train_edges_set)
+        # one pathway at a time, only the global integer arrays are kept
+        for raw_data_file_path in self.raw_data_file_paths:
+            node_global_indexes = node_index.intern(
+                utils.read_stable_id_array(raw_data_file_path, "nodes.txt")
+            )
+            edge_global_indexes = edge_index.intern(
+                utils.read_stable_id_array(raw_data_file_path, "edges.txt")
+            )
+            component_global_indexes = component_index.intern(
+                utils.read_stable_id_array(raw_data_file_path, "components-all.txt")
+            )
 
-        train_edges_mask.sort()
+            relationship_array = utils.read_relationship_array(raw_data_file_path)
+            relationship_array_list.append(
+                np.stack(
+                    [
+                        node_global_indexes[relationship_array[:, 0]],
+                        edge_global_indexes[relationship_array[:, 1]],
+                        relationship_array[:, 2],
+                    ],
+                    axis=1,
+                )
+            )
 
-        return train_edges_mask, validation_edges_mask, test_edges_mask
+            indptr, indices = utils.read_components_arrays(raw_data_file_path)
+            node_column_list.append(
+                np.repeat(node_global_indexes[: len(indptr) - 1], np.diff(indptr))
+            )
+            component_column_list.append(component_global_indexes[indices])
 
-    def get_masked_train_edge_of_nodes_list_regardless_direction(
-        self, train_edge_mask: list[int]
-    ):
-        train_edge_of_nodes_list_regardless_direction: list[
-            list[int]
-        ] = self.get_edge_of_nodes_list_regardless_direction("train")
+            print(
+                raw_data_file_path
+                + " is combined, number of nodes: %2d, number of edges: %2d, number of features: %2d"
+                % (len(node_index), len(edge_index), len(component_index))
+            )
 
-        train_edge_of_nodes_list_regardless_direction: list[list[int]] = [
-            train_edge_of_nodes_list_regardless_direction[train_edge_mask_index]
-            for train_edge_mask_index in train_edge_mask
-        ]
+        # keep the first appearance of the relationships shared by several pathways
+        relationship_array = np.concatenate(
+            relationship_array_list + [np.zeros((0, 3), dtype=np.int64)]
+        )
+        _, first_appearance = np.unique(relationship_array, axis=0, return_index=True)
+        relationship_array = relationship_array[np.sort(first_appearance)]
+
+        # the components of a node are the union of its components in every pathway
+        node_component_pairs = np.unique(
+            np.stack(
+                [
+                    np.concatenate(node_column_list + [np.zeros(0, dtype=np.int64)]),
+                    np.concatenate(
+                        component_column_list + [np.zeros(0, dtype=np.int64)]
+                    ),
+                ],
+                axis=1,
+            ),
+            axis=0,
+        )
+        components_indptr: np.ndarray = np.zeros(len(node_index) + 1, dtype=np.int64)
+        components_indptr[1:] = np.cumsum(
+            np.bincount(node_component_pairs[:, 0], minlength=len(node_index))
+        )
 
-        return copy.deepcopy(train_edge_of_nodes_list_regardless_direction)
+        return (
+            node_index.stable_ids,
+            edge_index.stable_ids,
+            component_index.stable_ids,
+            relationship_array,
+            components_indptr,
+            node_component_pairs[:, 1],
+        )
 
 
 if __name__ == "__main__":
@@ -1937,16 +1937,13 @@ class FileProcessor:
         res_list = []
 
         try:
-            file_handler = open(url, "r")
-            while True:
-                # Get next line from file
-                line = file_handler.readline()
-                line = line.replace('\r', '').replace('\n', '').replace('\t', '')
-
-                # If the line is empty then the end of file reached
-                if not line:
-                    break
-                res_list.append(line)
+            # read the whole file in one call and normalise the line endings once
+            with open(url, "rb") as file_handler:
+                content = file_handler.read().decode("utf-8")
+            content = content.replace('\r\n', '\n').replace('\r', '\n').replace('\t', '')
+
+            # the blank lines are skipped, not taken as the end of the file
+            res_list = [line for line in content.split('\n') if line]
         except Exception as e:
             print(e)
             print("we can't find the " + url + ", please make sure that the file exists")
@@ -0,0 +1,359 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable
+
+import numpy as np
+
+# the bundle starts with the magic and the length of its json header, the arrays follow the header
+BUNDLE_MAGIC = b"PWGNNBDL"
+BUNDLE_ALIGNMENT = 64
+
+# the files are hashed and counted in chunks of 1 MiB
+MANIFEST_CHUNK_SIZE = 1 << 20
+
+# the manifests built in this process, the key is the absolute path of the split directory
+split_manifest_dict: dict[str, dict[str, dict]] = dict()
+
+
+def build_file_manifest(file_path: str) -> dict:
+    """
+    Read a file once in chunks and summarise it
+    :param file_path: ex. "../data/Disease/relationship.txt"
+    :return: the size, modification time and sha1 of the file, and the number of non-empty lines
+    """
+    file_stat = os.stat(file_path)
+    hasher = hashlib.sha1()
+    num_of_lines = 0
+    # a line is empty when it only holds carriage returns and tabs, as in utils.read_file_via_lines
+    is_line_empty = True
+    with open(file_path, "rb") as file_handler:
+        while chunk := file_handler.read(MANIFEST_CHUNK_SIZE):
+            hasher.update(chunk)
+            chunk = chunk.translate(None, b"\r\t")
+            if 0 == len(chunk):
+                continue
+            is_new_line = np.frombuffer(chunk, dtype=np.uint8) == ord("\n")
+            # every line break closes a line, which is empty when the byte before is a line break too
+            num_of_lines += chunk.count(b"\n")
+            num_of_lines -= int(is_line_empty and is_new_line[0])
+            num_of_lines -= int(np.count_nonzero(is_new_line[1:] & is_new_line[:-1]))
+            is_line_empty = bool(is_new_line[-1])
+    # the last line has no line break
+    num_of_lines += int(not is_line_empty)
+
+    return {
+        "size": file_stat.st_size,
+        "mtime_ns": file_stat.st_mtime_ns,
+        "sha1": hasher.hexdigest(),
+        "num_of_lines": num_of_lines,
+    }
+
+
+def get_split_manifest(
+    path: str, write_to_disk: bool = True, known_manifest: dict[str, dict] = None
+) -> dict[str, dict]:
+    """
+    Get the manifest of all the .txt files of a split directory, ex. ../data/Disease or ../data/Disease/attribute prediction dataset/train.
+    The manifest is built once and kept in memory for the process. It is written to disk as manifest.json,
+    so later processes only read the files whose size or modification time changed.
+    :param path: the split directory
+    :param write_to_disk: whether to write the manifest next to the data
+    :param known_manifest: a manifest of the split kept elsewhere, ex. in the dataset cache,
+    its files are checked by size and modification time as the ones of manifest.json
+    :return: {file name: file manifest}
+    """
+    split_key: str = os.path.abspath(path)
+    if split_key in split_manifest_dict:
+        return split_manifest_dict[split_key]
+
+    manifest_file_path: str = os.path.join(path, "manifest.json")
+    manifest_on_disk: dict[str, dict] = dict()
+    if os.path.exists(manifest_file_path):
+        try:
+            with open(manifest_file_path, "r") as file_handler:
+                manifest_on_disk = json.load(file_handler)
+        except Exception as e:
+            print(e)
+            print("we can't read the " + manifest_file_path + ", it will be rebuilt")
+
+    # the entries of manifest.json take precedence over the ones of the known manifest
+    checked_manifest: dict[str, dict] = dict(
+        known_manifest or dict(), **manifest_on_disk
+    )
+    manifest: dict[str, dict] = dict()
+    for file_path in sorted(glob.glob(os.path.join(glob.escape(path), "*.txt"))):
+        file_name: str = os.path.basename(file_path)
+        file_stat = os.stat(file_path)
+        file_manifest = checked_manifest.get(file_name)
+        if (
+            file_manifest is None
+            or file_manifest["size"] != file_stat.st_size
+            or file_manifest["mtime_ns"] != file_stat.st_mtime_ns
+        ):
+            file_manifest = build_file_manifest(file_path)
+        manifest[file_name] = file_manifest
+
+    if write_to_disk and manifest != manifest_on_disk:
+        tmp_file_path = None
+        try:
+            # the loaders started at the same time never read a half written manifest
+            file_descriptor, tmp_file_path = tempfile.mkstemp(
+                dir=path, prefix="manifest.json-", suffix=".tmp"
+            )
+            with os.fdopen(file_descriptor, "w") as file_handler:
+                json.dump(manifest, file_handler, indent=2)
+            os.chmod(tmp_file_path, 0o644)
+            os.replace(tmp_file_path, manifest_file_path)
+        except OSError as e:
+            if tmp_file_path is not None and os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            print(e)
+            print(
+                "we can't write the "
+                + manifest_file_path
+                + ", it will be rebuilt next time"
+            )
+
+    split_manifest_dict[split_key] = manifest
+    return manifest
+
+
+def compute_content_hash(split_manifests: list[dict[str, dict]]) -> str:
+    """
+    Compute a hash of the names and the contents of the files of several splits
+    :param split_manifests: the manifests of the split directories
+    :return: a hex digest which changes as soon as any of the files is edited, added or removed
+    """
+    hasher = hashlib.sha1()
+    for split_manifest in split_manifests:
+        for file_name, file_manifest in sorted(split_manifest.items()):
+            hasher.update(file_name.encode("utf-8"))
+            hasher.update(file_manifest["sha1"].encode("utf-8"))
+    return hasher.hexdigest()[:16]
+
+
+def save_bundle(file_path: str, arrays: dict[str, np.ndarray], metadata: dict = None):
+    """
+    Write the arrays into a single bundle file which is opened with load_bundle without any deserialisation
+    :param file_path: ex. ../cache/Disease-input_link_prediction_dataset-0123456789abcdef.bundle
+    :param arrays: {name: array}, every array is written in C order at an aligned offset
+    :param metadata: anything json serialisable kept in the header, ex. the manifests of the splits
+    """
+    array_header: dict[str, dict] = dict()
+    offset = 0
+    for name, array in arrays.items():
+        array_header[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += -(-array.nbytes // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+    header: bytes = json.dumps(
+        {"arrays": array_header, "metadata": metadata or dict()}
+    ).encode("utf-8")
+    data_offset = -(-(16 + len(header)) // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+    # write to a temporary file of this process first, so a crashed run never leaves a truncated bundle behind,
+    # the processes saving the same bundle at the same time never write into each other's file,
+    # and the processes which still map the old bundle keep reading it
+    file_descriptor, tmp_file_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path) or ".",
+        prefix=os.path.basename(file_path) + "-",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as file_handler:
+            file_handler.write(BUNDLE_MAGIC)
+            file_handler.write(np.uint64(len(header)).tobytes())
+            file_handler.write(header)
+            for name, array in arrays.items():
+                file_handler.seek(data_offset + array_header[name]["offset"])
+                file_handler.write(np.ascontiguousarray(array).tobytes())
+            file_handler.truncate(data_offset + offset)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_file_path, 0o644)
+        os.replace(tmp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_file_path):
+            os.remove(tmp_file_path)
+        raise
+
+
+def load_bundle_header(file_path: str) -> tuple[dict, int]:
+    """
+    Read the json header of a bundle written by save_bundle without mapping its arrays
+    :return: ({"arrays": ..., "metadata": ...}, the offset of the arrays in the file)
+    """
+    with open(file_path, "rb") as file_handler:
+        if file_handler.read(8) != BUNDLE_MAGIC:
+            raise Exception(file_path + " is not a dataset bundle")
+        header_length = int(np.frombuffer(file_handler.read(8), dtype=np.uint64)[0])
+        header: dict = json.loads(file_handler.read(header_length).decode("utf-8"))
+    return header, -(-(16 + header_length) // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+
+def load_bundle(file_path: str) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Open a bundle written by save_bundle. The file is mapped once with np.memmap and every array is a read-only view of it,
+    so the processes opening the same bundle share one physical copy through the page cache.
+    :return: ({name: read-only array}, metadata)
+    """
+    header, data_offset = load_bundle_header(file_path)
+
+    bundle = (
+        np.memmap(file_path, dtype=np.uint8, mode="r")
+        if os.path.getsize(file_path) > data_offset
+        else None
+    )
+    arrays: dict[str, np.ndarray] = dict()
+    for name, array_header in header["arrays"].items():
+        dtype = np.dtype(array_header["dtype"])
+        shape = tuple(array_header["shape"])
+        if 0 == int(np.prod(shape)) * dtype.itemsize:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+            continue
+        arrays[name] = np.ndarray(
+            shape,
+            dtype=dtype,
+            buffer=bundle,
+            offset=data_offset + array_header["offset"],
+        )
+    return arrays, header["metadata"]
+
+
+class DatasetCache:
+    """
+    This is a binary cache for the parsed arrays of one (pathway, task) dataset
+    Args:
+            key (string): The content hash of the text files the arrays are parsed from.
+            cache_file_dir (string): The directory to keep the cache file e.g. ../cache
+            cache_name (string): Name of the cache e.g. Disease-input_link_prediction_dataset
+            metadata (dict): Kept in the header of the cache file, e.g. the manifests of the splits.
+    Return:
+            self.get(name, parse_method) (ndarray): The cached array, parsed and stored on the first miss.
+            self.get_arrays(names, parse_method) (tuple): Several arrays which are parsed together.
+
+    All the arrays live in a single bundle file whose name carries the key,
+    so editing the data invalidates the cache automatically.
+    The bundle is memory mapped, the sweep workers loading the same dataset share it through the page cache.
+    """
+
+    def __init__(
+        self, key: str, cache_file_dir: str, cache_name: str, metadata: dict = None
+    ):
+        self.cache_file_dir = cache_file_dir
+        self.cache_name = cache_name
+        self.key = key
+        self.metadata = metadata or dict()
+        self.cache_file_path = os.path.join(
+            cache_file_dir, f"{cache_name}-{self.key}.bundle"
+        )
+        self.arrays: dict[str, np.ndarray] = self.load()
+        self.is_dirty = False
+        self.is_read_only = False
+
+    def load(self) -> dict[str, np.ndarray]:
+        if not os.path.exists(self.cache_file_path):
+            return dict()
+        try:
+            arrays, _ = load_bundle(self.cache_file_path)
+            return arrays
+        except Exception as e:
+            print(e)
+            print(
+                "we can't read the cache "
+                + self.cache_file_path
+                + ", it will be rebuilt"
+            )
+            return dict()
+
+    def get(self, name: str, parse_method: Callable[[], np.ndarray]) -> np.ndarray:
+        (array,) = self.get_arrays((name,), lambda: (parse_method(),))
+        return array
+
+    def get_arrays(
+        self, names: tuple[str, ...], parse_method: Callable[[], tuple[np.ndarray, ...]]
+    ) -> tuple[np.ndarray, ...]:
+        """
+        Get several arrays which are parsed together, ex. the indptr and the indices of a CSR structure
+        """
+        if not all(name in self.arrays for name in names):
+            for name, array in zip(names, parse_method()):
+                self.arrays[name] = np.asarray(array)
+            self.is_dirty = True
+        return tuple(self.arrays[name] for name in names)
+
+    def save(self):
+        if not self.is_dirty or self.is_read_only:
+            return
+        if not os.path.exists(self.cache_file_dir):
+            os.makedirs(self.cache_file_dir)
+
+        # drop the caches built from older versions of the data
+        for stale_cache_file_path in glob.glob(
+            os.path.join(
+                glob.escape(self.cache_file_dir),
+                glob.escape(self.cache_name) + "-*.bundle",
+            )
+        ) + glob.glob(
+            os.path.join(
+                glob.escape(self.cache_file_dir),
+                glob.escape(self.cache_name) + "-*.npz",
+            )
+        ):
+            if stale_cache_file_path != self.cache_file_path:
+                try:
+                    os.remove(stale_cache_file_path)
+                except FileNotFoundError:
+                    # another worker saving the same cache has removed it already
+                    pass
+
+        save_bundle(
+            self.cache_file_path,
+            self.arrays,
+            dict(self.metadata, key=self.key, cache_name=self.cache_name),
+        )
+        self.is_dirty = False
+
+    @staticmethod
+    def load_manifests(cache_file_dir: str, cache_name: str) -> dict[str, dict]:
+        """
+        Read the manifests of the splits kept in the header of the cache, so the cache key is computed
+        from the hashes of the files whose size and modification time are unchanged, without reading them
+        :return: {type name: split manifest}, empty when there is no readable cache
+        """
+        for cache_file_path in glob.glob(
+            os.path.join(
+                glob.escape(cache_file_dir), glob.escape(cache_name) + "-*.bundle"
+            )
+        ):
+            try:
+                header, _ = load_bundle_header(cache_file_path)
+                return header["metadata"].get("manifests", dict())
+            except Exception:
+                # the cache is rebuilt, or removed by another worker
+                continue
+        return dict()
+
+    @classmethod
+    def open_bundle(cls, bundle_path: str):
+        """
+        Open a bundle exported by DataLoaderBase.export_bundle, the arrays are read from it in place of the text files
+        :param bundle_path: ex. ../bundle/Disease-input_link_prediction_dataset.bundle
+        """
+        arrays, metadata = load_bundle(bundle_path)
+        cache = cls.__new__(cls)
+        cache.cache_file_dir = os.path.dirname(bundle_path)
+        cache.cache_name = metadata.get("cache_name", "")
+        cache.key = metadata.get("key", "")
+        cache.metadata = metadata
+        cache.cache_file_path = bundle_path
+        cache.arrays = arrays
+        cache.is_dirty = False
+        # the arrays missing from an exported bundle are kept in memory only
+        cache.is_read_only = True
+        return cache
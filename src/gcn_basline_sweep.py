@@ -9,6 +9,7 @@ from dhg import Graph, Hypergraph
 from dhg.models import GCN
 from sklearn.metrics import accuracy_score, ndcg_score
 
+import utils
 from data_loader import DataLoaderAttribute
 
 model_name = "GCN"
@@ -94,11 +95,15 @@ def main():
         test_labels = data_loader["test_labels"]
 
         # get the train,val,test nodes features
-        train_nodes_features = torch.FloatTensor(data_loader["train_nodes_features"])
-        validation_nodes_features = torch.FloatTensor(
-            data_loader["validation_nodes_features"]
+        train_nodes_features = utils.sparse_features_to_tensor(
+            data_loader["train_nodes_features_sparse"]
+        )
+        validation_nodes_features = utils.sparse_features_to_tensor(
+            data_loader["validation_nodes_features_sparse"]
+        )
+        test_nodes_features = utils.sparse_features_to_tensor(
+            data_loader["test_nodes_features_sparse"]
         )
-        test_nodes_features = torch.FloatTensor(data_loader["test_nodes_features"])
 
         # get train, validation, test mask to track the nodes
         train_mask = data_loader["train_node_mask"]
@@ -145,6 +150,9 @@ def main():
 
         print("GCN Baseline")
 
+        # write the arrays parsed for the keys read above into the cache once, for the next runs
+        data_loader.save_cache()
+
         # start to train
         for epoch in range(200):
             # train
@@ -26,26 +26,23 @@ def train(
     train_idx: list[bool],
     optimizer: optim.Adam,
     epoch: int,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
 ):
     net_model.train()
 
     st = time.time()
     optimizer.zero_grad()
 
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            train_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "train", train_hyper_edge_list, nodes_features
     )
-
-    edges_embeddings = edges_embeddings.to(device)
     # edges_embeddings = edges_embeddings[train_idx]
 
     nodes_embeddings = net_model(nodes_features, graph)
 
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
-    loss = F.cross_entropy(outs, labels)
+    loss = utils.cross_entropy_with_sparse_labels(outs, labels)
     loss.backward()
     optimizer.step()
     print(f"Epoch: {epoch}, Time: {time.time() - st:.5f}s, Loss: {loss.item():.5f}")
@@ -60,31 +57,29 @@ def validation(
     graph,
     labels,
     validation_idx,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
+    filter_indexes: tuple[torch.Tensor, torch.Tensor],
 ):
     net_model.eval()
 
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            validation_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "validation", validation_hyper_edge_list, nodes_features
     )
-
-    edges_embeddings = edges_embeddings.to(device)
     nodes_embeddings = net_model(nodes_features, graph)
 
     # torch.backends.cudnn.enabled = False
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
     # filter the existing node prediction result
-    utils.filter_prediction_(outs, validation_hyper_edge_list)
+    utils.filter_prediction_(outs, filter_indexes)
 
     # outs = [[0.1, 0.9, 0.3, 0.9],[0.1, 0.2, 0.3, 0.9]]
     # labels = [[0, 1, 0, 1], [0, 0, 0, 1]]
     # outs, labels = outs[validation_idx], labels[validation_idx]
-    cat_labels = labels.cpu().numpy().argmax(axis=1)
+    cat_labels = labels.to_dense().cpu().numpy().argmax(axis=1)
     cat_outs = outs.cpu().numpy().argmax(axis=1)
 
-    ndcg_res = ndcg_score(labels.cpu().numpy(), outs.cpu().numpy())
+    ndcg_res = ndcg_score(labels.to_dense().cpu().numpy(), outs.cpu().numpy())
     acc_res = accuracy_score(cat_labels, cat_outs)
 
     print(
@@ -107,27 +102,25 @@ def test(
     graph,
     labels,
     test_idx,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
+    filter_indexes: tuple[torch.Tensor, torch.Tensor],
 ):
     net_model.eval()
 
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            test_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "test", test_hyper_edge_list, nodes_features
     )
-
-    edges_embeddings = edges_embeddings.to(device)
     nodes_embeddings = net_model(nodes_features, graph)
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
     # filter the existing node prediction result
-    utils.filter_prediction_(outs, test_hyper_edge_list)
+    utils.filter_prediction_(outs, filter_indexes)
 
     # outs, labels = outs[test_idx], labels[test_idx]
-    cat_labels = labels.cpu().numpy().argmax(axis=1)
+    cat_labels = labels.to_dense().cpu().numpy().argmax(axis=1)
     cat_outs = outs.cpu().numpy().argmax(axis=1)
 
-    ndcg_res = ndcg_score(labels.cpu().numpy(), outs.cpu().numpy())
+    ndcg_res = ndcg_score(labels.to_dense().cpu().numpy(), outs.cpu().numpy())
     acc_res = accuracy_score(cat_labels, cat_outs)
 
     print(
@@ -162,7 +155,9 @@ def main(dataset: str, task: str):
     num_of_nodes: int = data_loader["num_nodes"]
 
     # get the raw, train,val,test nodes features
-    train_nodes_features = torch.FloatTensor(data_loader["train_nodes_features"])
+    train_nodes_features = utils.sparse_features_to_tensor(
+        data_loader["train_nodes_features_sparse"]
+    )
 
     # generate the relationship between hyper edge and nodes
     # ex. [[1,2,3,4], [3,4], [9,7,4]...] where [1,2,3,4] represent a hyper edge
@@ -176,9 +171,9 @@ def main(dataset: str, task: str):
     val_edge_mask = data_loader["val_edge_mask"]
     test_edge_mask = data_loader["test_edge_mask"]
 
-    train_labels = data_loader["train_labels"]
-    test_labels = data_loader["test_labels"]
-    validation_labels = data_loader["validation_labels"]
+    train_labels = data_loader["train_labels_sparse"]
+    test_labels = data_loader["test_labels_sparse"]
+    validation_labels = data_loader["validation_labels_sparse"]
 
     # the train hyper graph
     hyper_graph = Hypergraph(num_of_nodes, copy.deepcopy(train_all_hyper_edge_list))
@@ -208,6 +203,18 @@ def main(dataset: str, task: str):
 
     print("GCN Baseline")
 
+    # the edges embeddings of the splits are read out once for the run
+    edges_embeddings_cache = utils.EdgesEmbeddingsCache(device)
+
+    # the known nodes of the validation and test edges to filter, built once for the run
+    validation_filter_indexes = utils.get_filter_indexes(
+        validation_hyper_edge_list, device
+    )
+    test_filter_indexes = utils.get_filter_indexes(test_hyper_edge_list, device)
+
+    # write the arrays parsed for the keys read above into the cache once, for the next runs
+    data_loader.save_cache()
+
     # start to train
     for epoch in range(200):
         # train
@@ -221,6 +228,7 @@ def main(dataset: str, task: str):
             train_edge_mask,
             optimizer,
             epoch,
+            edges_embeddings_cache,
         )
 
         if epoch % 1 == 0:
@@ -233,6 +241,8 @@ def main(dataset: str, task: str):
                     graph,
                     validation_labels,
                     val_edge_mask,
+                    edges_embeddings_cache,
+                    validation_filter_indexes,
                 )
 
     test(
@@ -242,6 +252,8 @@ def main(dataset: str, task: str):
         graph,
         test_labels,
         test_edge_mask,
+        edges_embeddings_cache,
+        test_filter_indexes,
     )
 
     # torch.save(net_model.state_dict(), "gcn_link.pkl")
@@ -1,4 +1,3 @@
-import copy
 import pprint
 import time
 
@@ -6,12 +5,16 @@ import torch
 import torch.nn.functional as F
 import torch.optim as optim
 import wandb
-from dhg import Graph, Hypergraph
+from dhg import Graph
 from dhg.models import GCN, HGNNP, HGNN
-from sklearn.metrics import accuracy_score, ndcg_score, top_k_accuracy_score
 
 from data_loader import DataLoaderAttribute
 
+import component_encoder
+import graph_factory
+import metrics
+import propagation
+import sampled_softmax
 import utils
 
 
@@ -28,15 +31,29 @@ def train(
     train_idx: list[bool],
     optimizer: optim.Adam,
     epoch: int,
+    negative_sampler: sampled_softmax.NegativeSampler = None,
 ):
     net_model.train()
 
     st = time.time()
     optimizer.zero_grad()
-    outs = net_model(nodes_features, graph)
-
-    outs = outs[train_idx]
-    loss = F.cross_entropy(outs, labels)
+    if negative_sampler is None:
+        outs = net_model(nodes_features, graph)
+
+        outs = outs[train_idx]
+        loss = F.cross_entropy(outs, labels)
+    else:
+        # score the positive and the sampled negative components only, the full vocabulary is scored for the evaluation
+        hidden, bias_scale = sampled_softmax.get_hidden_and_bias_scale(
+            net_model, nodes_features, graph
+        )
+        loss = sampled_softmax.sampled_softmax_loss(
+            hidden[train_idx],
+            bias_scale[train_idx],
+            sampled_softmax.get_output_layer(net_model),
+            labels,
+            *negative_sampler.sample(),
+        )
     loss.backward()
     optimizer.step()
     print(f"Epoch: {epoch}, Time: {time.time() - st:.5f}s, Loss: {loss.item():.5f}")
@@ -54,28 +71,10 @@ def validation(
 
     utils.filter_prediction_(outs, nodes_attributes)
 
-    outs = outs.cpu().numpy()
-
-    labels = labels.cpu().numpy()
-
-    cat_labels = labels.argmax(axis=1)
-    cat_outs = outs.argmax(axis=1)
-
-    ndcg_res = ndcg_score(labels, outs)
-    ndcg_res_3 = ndcg_score(labels, outs, k=3)
-    ndcg_res_5 = ndcg_score(labels, outs, k=5)
-    ndcg_res_10 = ndcg_score(labels, outs, k=10)
-    ndcg_res_15 = ndcg_score(labels, outs, k=15)
-
-    acc_res = accuracy_score(cat_labels, cat_outs)
-    acc_res_3 = top_k_accuracy_score(cat_labels, outs, k=3, labels=range(outs.shape[1]))
-    acc_res_5 = top_k_accuracy_score(cat_labels, outs, k=5, labels=range(outs.shape[1]))
-    acc_res_10 = top_k_accuracy_score(
-        cat_labels, outs, k=10, labels=range(outs.shape[1])
-    )
-    acc_res_15 = top_k_accuracy_score(
-        cat_labels, outs, k=15, labels=range(outs.shape[1])
-    )
+    # rank the outs once and derive all the ndcg and accuracy from that ranking
+    ranking_metrics = metrics.get_ranking_metrics(outs, labels)
+    ndcg_res = ranking_metrics["ndcg"]
+    acc_res = ranking_metrics["acc"]
 
     print(
         "\033[1;32m"
@@ -89,18 +88,7 @@ def validation(
         + "{:.5f}".format(acc_res)
         + "\033[0m"
     )
-    return {
-        "valid_ndcg": ndcg_res,
-        "valid_ndcg_3": ndcg_res_3,
-        "valid_ndcg_5": ndcg_res_5,
-        "valid_ndcg_10": ndcg_res_10,
-        "valid_ndcg_15": ndcg_res_15,
-        "valid_acc": acc_res,
-        "valid_acc_3": acc_res_3,
-        "valid_acc_5": acc_res_5,
-        "valid_acc_10": acc_res_10,
-        "valid_acc_15": acc_res_15,
-    }
+    return {"valid_" + name: value for name, value in ranking_metrics.items()}
 
 
 @torch.no_grad()
@@ -112,44 +100,16 @@ def test(net_model, nodes_attributes, nodes_features, graph, labels, test_idx):
 
     utils.filter_prediction_(outs, nodes_attributes)
 
-    outs = outs.cpu().numpy()
-
-    labels = labels.cpu().numpy()
-
-    cat_labels = labels.argmax(axis=1)
-    cat_outs = outs.argmax(axis=1)
-    ndcg_res = ndcg_score(labels, outs)
-    ndcg_res_3 = ndcg_score(labels, outs, k=3)
-    ndcg_res_5 = ndcg_score(labels, outs, k=5)
-    ndcg_res_10 = ndcg_score(labels, outs, k=10)
-    ndcg_res_15 = ndcg_score(labels, outs, k=15)
-
-    acc_res = accuracy_score(cat_labels, cat_outs)
-    acc_res_3 = top_k_accuracy_score(cat_labels, outs, k=3, labels=range(outs.shape[1]))
-    acc_res_5 = top_k_accuracy_score(cat_labels, outs, k=5, labels=range(outs.shape[1]))
-    acc_res_10 = top_k_accuracy_score(
-        cat_labels, outs, k=10, labels=range(outs.shape[1])
-    )
-    acc_res_15 = top_k_accuracy_score(
-        cat_labels, outs, k=15, labels=range(outs.shape[1])
-    )
+    # rank the outs once and derive all the ndcg and accuracy from that ranking
+    ranking_metrics = metrics.get_ranking_metrics(outs, labels)
+    ndcg_res = ranking_metrics["ndcg"]
+    acc_res = ranking_metrics["acc"]
 
     print("\033[1;32m" + "The test ndcg is: " + "{:.5f}".format(ndcg_res) + "\033[0m")
     print(
         "\033[1;32m" + "The test accuracy is: " + "{:.5f}".format(acc_res) + "\033[0m"
     )
-    return {
-        "test_ndcg": ndcg_res,
-        "test_ndcg_3": ndcg_res_3,
-        "test_ndcg_5": ndcg_res_5,
-        "test_ndcg_10": ndcg_res_10,
-        "test_ndcg_15": ndcg_res_15,
-        "test_acc": acc_res,
-        "test_acc_3": acc_res_3,
-        "test_acc_5": acc_res_5,
-        "test_acc_10": acc_res_10,
-        "test_acc_15": acc_res_15,
-    }
+    return {"test_" + name: value for name, value in ranking_metrics.items()}
 
 
 def main(config=None):
@@ -169,19 +129,50 @@ def main(config=None):
 
         # get the labels - the original nodes features
         # labels = torch.FloatTensor(data_loader["raw_nodes_features"])
-        train_labels = data_loader["train_labels"]
+        # the sampled softmax reads the positives from the sparse labels, the dense labels are built for the cross entropy only
+        if "sampled_softmax" == config.get("loss", "cross_entropy"):
+            train_labels = data_loader["train_labels_sparse"]
+        else:
+            train_labels = data_loader["train_labels"]
         validation_labels = data_loader["validation_labels"]
         test_labels = data_loader["test_labels"]
 
-        validation_nodes_attributes = data_loader["validation_nodes_components"]
-        test_nodes_attributes = data_loader["test_nodes_components"]
+        # the known components of the validation and test nodes to filter, built once for the run
+        validation_nodes_attributes = utils.get_filter_indexes(
+            data_loader["validation_nodes_components"], device
+        )
+        test_nodes_attributes = utils.get_filter_indexes(
+            data_loader["test_nodes_components"], device
+        )
 
         # get the train,val,test nodes features
-        train_nodes_features = torch.FloatTensor(data_loader["train_nodes_features"])
-        validation_nodes_features = torch.FloatTensor(
-            data_loader["validation_nodes_features"]
-        )
-        test_nodes_features = torch.FloatTensor(data_loader["test_nodes_features"])
+        # the first layer of the models is a linear one, which also takes the features as a sparse csr tensor
+        sparse_features: bool = config.get("sparse_features", False)
+        # or the models take the components of the nodes through an embedding bag in place of the multi-hot features
+        use_component_encoder: bool = config.get("component_encoder", False)
+        if use_component_encoder:
+            (
+                train_nodes_features,
+                validation_nodes_features,
+                test_nodes_features,
+            ) = [
+                component_encoder.get_component_bags(data_loader[features_key])
+                for features_key in [
+                    "train_nodes_features_sparse",
+                    "validation_nodes_features_sparse",
+                    "test_nodes_features_sparse",
+                ]
+            ]
+        else:
+            train_nodes_features = utils.sparse_features_to_tensor(
+                data_loader["train_nodes_features_sparse"], sparse=sparse_features
+            )
+            validation_nodes_features = utils.sparse_features_to_tensor(
+                data_loader["validation_nodes_features_sparse"], sparse=sparse_features
+            )
+            test_nodes_features = utils.sparse_features_to_tensor(
+                data_loader["test_nodes_features_sparse"], sparse=sparse_features
+            )
 
         # get train, validation, test mask to track the nodes
         train_mask = data_loader["train_node_mask"]
@@ -191,21 +182,53 @@ def main(config=None):
         # get the total number of nodes of this graph
         num_of_nodes: int = data_loader["num_nodes"]
 
-        # generate the relationship between hyper edge and nodes
-        # ex. [[1,2,3,4], [3,4], [9,7,4]...] where [1,2,3,4] represent a hyper edge
-        hyper_edge_list = data_loader["edge_list"]
-
-        # the hyper graph
-        hyper_graph_train = Hypergraph(num_of_nodes, copy.deepcopy(hyper_edge_list))
-
-        # generate graph based on hyper graph
-        if config.model_name == "GCN":
-            graph_train = Graph.from_hypergraph_clique(hyper_graph_train, weighted=True)
+        # the models run against the propagation operator computed once per graph and kept in the cache of the dataset
+        precomputed_operator: bool = config.get("precomputed_operator", False)
+        num_of_hops: int = config.get("num_of_hops", 2)
+        if "SIGN" == config.model_name:
+            # the features are propagated once with the operator of the propagation model,
+            # so only an MLP head is trained on them
+            # the validation and test nodes features are the train ones, the hops are shared by the three splits
+            graph_train = propagation.get_propagated_features_in_tensor(
+                data_loader,
+                "edge_list",
+                config.get("propagation_model", "HGNN"),
+                "train_nodes_features_sparse",
+                num_of_hops,
+                sparse=sparse_features,
+            )
+        elif precomputed_operator:
+            graph_train = propagation.get_operator(
+                data_loader, "edge_list", config.model_name, device
+            )
         else:
-            graph_train = hyper_graph_train
+            # the graph of the hyper edges is built once per dataset and kept in its cache for the next runs,
+            # the clique expansion of the hyper graph for GCN
+            graph_train = graph_factory.get_graph(
+                data_loader, "edge_list", config.model_name
+            )
 
+        if "SIGN" == config.model_name:
+            # the SIGN model, on the features propagated 0 to num_of_hops hops
+            net_model = propagation.SIGN(
+                data_loader["num_features"],
+                config.emb_dim,
+                data_loader["num_features"],
+                num_of_hops=num_of_hops,
+                use_bn=True,
+                drop_rate=config.drop_out,
+            )
+        elif precomputed_operator:
+            # the GCN, HGNN or HGNNP model, given by the operator
+            net_model = propagation.OperatorGNN(
+                data_loader["num_features"],
+                config.emb_dim,
+                data_loader["num_features"],
+                use_bn=True,
+                drop_rate=config.drop_out,
+            )
         # the GCN model
-        if config.model_name == "GCN":
+        elif config.model_name == "GCN":
             net_model = GCN(
                 data_loader["num_features"],
                 config.emb_dim,
@@ -234,6 +257,9 @@ def main(config=None):
         else:
             raise Exception("Sorry, no model_name has been recognized.")
 
+        if use_component_encoder:
+            net_model = component_encoder.use_component_encoder(net_model)
+
         # set the optimizer
         optimizer = optim.Adam(
             net_model.parameters(),
@@ -254,10 +280,29 @@ def main(config=None):
         net_model = net_model.to(device)
 
         graph_train = graph_train.to(device)
+        graph_validation = graph_train
+        graph_test = graph_train
         net_model = net_model.to(device)
 
+        # the sampled softmax loss, or the cross entropy over all the components
+        if "sampled_softmax" == config.get("loss", "cross_entropy"):
+            negative_sampler = sampled_softmax.NegativeSampler(
+                data_loader["num_features"],
+                config.get("num_of_negatives", 256),
+                config.get("negative_distribution", "uniform"),
+                sampled_softmax.get_component_frequencies(
+                    data_loader["train_nodes_features_sparse"]
+                ),
+                device,
+            )
+        else:
+            negative_sampler = None
+
         print(f"{config.model_name} Baseline")
 
+        # write the arrays parsed for the keys read above into the cache once, for the next runs
+        data_loader.save_cache()
+
         # start to train
         for epoch in range(200):
             # train
@@ -270,6 +315,7 @@ def main(config=None):
                 train_mask,
                 optimizer,
                 epoch,
+                negative_sampler,
             )
             epoch_log = {
                 "loss": loss,
@@ -281,7 +327,7 @@ def main(config=None):
                         net_model,
                         validation_nodes_attributes,
                         validation_nodes_features,
-                        graph_train,
+                        graph_validation,
                         validation_labels,
                         val_mask,
                     )
@@ -289,7 +335,7 @@ def main(config=None):
                         net_model,
                         test_nodes_attributes,
                         test_nodes_features,
-                        graph_train,
+                        graph_test,
                         test_labels,
                         test_mask,
                     )
@@ -340,5 +386,13 @@ else:
         "model_name": "HGNN",
         "task": "attribute prediction dataset",
         "dataset": "Disease",
+        "sparse_features": False,
+        "precomputed_operator": False,
+        "num_of_hops": 2,
+        "propagation_model": "HGNN",
+        "component_encoder": False,
+        "loss": "cross_entropy",
+        "num_of_negatives": 256,
+        "negative_distribution": "uniform",
     }
     main(config)
@@ -1,4 +1,3 @@
-import copy
 import pprint
 import time
 import os
@@ -6,10 +5,13 @@ import os
 import torch
 import torch.nn.functional as F
 import torch.optim as optim
-from dhg import Graph, Hypergraph
+from dhg import Graph
 from dhg.models import GCN, HGNN, HGNNP
-from sklearn.metrics import accuracy_score, ndcg_score, top_k_accuracy_score
 
+import component_encoder
+import graph_factory
+import metrics
+import propagation
 import utils
 import wandb
 from data_loader import DataLoaderLink
@@ -39,28 +41,29 @@ def train(
     labels: torch.Tensor,
     optimizer: optim.Adam,
     epoch: int,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
+    model_inputs=None,
 ):
     net_model.train()
 
     st = time.time()
     optimizer.zero_grad()
 
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            train_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "train", train_hyper_edge_list, nodes_features
     )
-
-    edges_embeddings = edges_embeddings.to(net_model.device)
     # edges_embeddings = edges_embeddings[train_idx]
 
-    nodes_embeddings = net_model(nodes_features, graph)
+    # the model may take the nodes in another form than the features read out, ex. ComponentBags
+    nodes_embeddings = net_model(
+        nodes_features if model_inputs is None else model_inputs, graph
+    )
 
     nodes_embeddings = nodes_embeddings.to(net_model.device)
 
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
-    loss = F.cross_entropy(outs, labels)
+    loss = utils.cross_entropy_with_sparse_labels(outs, labels)
     loss.backward()
     optimizer.step()
     print(f"Epoch: {epoch}, Time: {time.time() - st:.5f}s, Loss: {loss.item():.5f}")
@@ -74,46 +77,29 @@ def validation(
     validation_hyper_edge_list: list[list[int]],
     graph,
     labels,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
+    filter_indexes: tuple[torch.Tensor, torch.Tensor],
+    model_inputs=None,
 ):
     net_model.eval()
 
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            validation_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "validation", validation_hyper_edge_list, nodes_features
+    )
+    nodes_embeddings = net_model(
+        nodes_features if model_inputs is None else model_inputs, graph
     )
-
-    edges_embeddings = edges_embeddings.to(net_model.device)
-    nodes_embeddings = net_model(nodes_features, graph)
 
     # torch.backends.cudnn.enabled = False
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
-    utils.filter_prediction_(outs, validation_hyper_edge_list)
-    outs = outs.cpu().numpy()
-
-    labels = labels.cpu().numpy()
+    utils.filter_prediction_(outs, filter_indexes)
     # outs = [[0.1, 0.9, 0.3, 0.9],[0.1, 0.2, 0.3, 0.9]]
     # labels = [[0, 1, 0, 1], [0, 0, 0, 1]]
-    # outs, labels = outs[validation_idx], labels[validation_idx]
-    cat_labels = labels.argmax(axis=1)
-    cat_outs = outs.argmax(axis=1)
-
-    ndcg_res = ndcg_score(labels, outs)
-    ndcg_res_3 = ndcg_score(labels, outs, k=3)
-    ndcg_res_5 = ndcg_score(labels, outs, k=5)
-    ndcg_res_10 = ndcg_score(labels, outs, k=10)
-    ndcg_res_15 = ndcg_score(labels, outs, k=15)
-
-    acc_res = accuracy_score(cat_labels, cat_outs)
-    acc_res_3 = top_k_accuracy_score(cat_labels, outs, k=3, labels=range(outs.shape[1]))
-    acc_res_5 = top_k_accuracy_score(cat_labels, outs, k=5, labels=range(outs.shape[1]))
-    acc_res_10 = top_k_accuracy_score(
-        cat_labels, outs, k=10, labels=range(outs.shape[1])
-    )
-    acc_res_15 = top_k_accuracy_score(
-        cat_labels, outs, k=15, labels=range(outs.shape[1])
-    )
+    # rank the outs once and derive all the ndcg and accuracy from that ranking
+    ranking_metrics = metrics.get_ranking_metrics(outs, labels)
+    ndcg_res = ranking_metrics["ndcg"]
+    acc_res = ranking_metrics["acc"]
 
     print(
         "\033[1;32m"
@@ -127,18 +113,7 @@ def validation(
         + "{:.5f}".format(acc_res)
         + "\033[0m"
     )
-    return {
-        "valid_ndcg": ndcg_res,
-        "valid_ndcg_3": ndcg_res_3,
-        "valid_ndcg_5": ndcg_res_5,
-        "valid_ndcg_10": ndcg_res_10,
-        "valid_ndcg_15": ndcg_res_15,
-        "valid_acc": acc_res,
-        "valid_acc_3": acc_res_3,
-        "valid_acc_5": acc_res_5,
-        "valid_acc_10": acc_res_10,
-        "valid_acc_15": acc_res_15,
-    }
+    return {"valid_" + name: value for name, value in ranking_metrics.items()}
 
 
 @torch.no_grad()
@@ -148,63 +123,35 @@ def test(
     test_hyper_edge_list: list[list[int]],
     graph,
     labels,
+    edges_embeddings_cache: utils.EdgesEmbeddingsCache,
+    filter_indexes: tuple[torch.Tensor, torch.Tensor],
+    model_inputs=None,
 ):
     net_model.eval()
     # [[1,2,3],[2,3,4,5]...]
-    edges_embeddings = (
-        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-            test_hyper_edge_list, nodes_features
-        )
+    edges_embeddings = edges_embeddings_cache.get(
+        "test", test_hyper_edge_list, nodes_features
     )
 
-    edges_embeddings = edges_embeddings.to(net_model.device)
-
-    nodes_embeddings = net_model(nodes_features, graph)
+    nodes_embeddings = net_model(
+        nodes_features if model_inputs is None else model_inputs, graph
+    )
 
     outs = torch.matmul(edges_embeddings, nodes_embeddings.t())
 
-    utils.filter_prediction_(outs, test_hyper_edge_list)
-    outs = outs.cpu().numpy()
-
-    labels = labels.cpu().numpy()
+    utils.filter_prediction_(outs, filter_indexes)
     # outs = [[0.1, 0.9, 0.3, 0.9],[0.1, 0.2, 0.3, 0.9]]
     # labels = [[0, 1, 0, 1], [0, 0, 0, 1]]
-    # outs, labels = outs[validation_idx], labels[validation_idx]
-    cat_labels = labels.argmax(axis=1)
-    cat_outs = outs.argmax(axis=1)
-
-    ndcg_res = ndcg_score(labels, outs)
-    ndcg_res_3 = ndcg_score(labels, outs, k=3)
-    ndcg_res_5 = ndcg_score(labels, outs, k=5)
-    ndcg_res_10 = ndcg_score(labels, outs, k=10)
-    ndcg_res_15 = ndcg_score(labels, outs, k=15)
-
-    acc_res = accuracy_score(cat_labels, cat_outs)
-    acc_res_3 = top_k_accuracy_score(cat_labels, outs, k=3, labels=range(outs.shape[1]))
-    acc_res_5 = top_k_accuracy_score(cat_labels, outs, k=5, labels=range(outs.shape[1]))
-    acc_res_10 = top_k_accuracy_score(
-        cat_labels, outs, k=10, labels=range(outs.shape[1])
-    )
-    acc_res_15 = top_k_accuracy_score(
-        cat_labels, outs, k=15, labels=range(outs.shape[1])
-    )
+    # rank the outs once and derive all the ndcg and accuracy from that ranking
+    ranking_metrics = metrics.get_ranking_metrics(outs, labels)
+    ndcg_res = ranking_metrics["ndcg"]
+    acc_res = ranking_metrics["acc"]
 
     print("\033[1;32m" + "The test ndcg is: " + "{:.5f}".format(ndcg_res) + "\033[0m")
     print(
         "\033[1;32m" + "The test accuracy is: " + "{:.5f}".format(acc_res) + "\033[0m"
     )
-    return {
-        "test_ndcg": ndcg_res,
-        "test_ndcg_3": ndcg_res_3,
-        "test_ndcg_5": ndcg_res_5,
-        "test_ndcg_10": ndcg_res_10,
-        "test_ndcg_15": ndcg_res_15,
-        "test_acc": acc_res,
-        "test_acc_3": acc_res_3,
-        "test_acc_5": acc_res_5,
-        "test_acc_10": acc_res_10,
-        "test_acc_15": acc_res_15,
-    }
+    return {"test_" + name: value for name, value in ranking_metrics.items()}
 
 
 def main(config=None):
@@ -226,11 +173,23 @@ def main(config=None):
         num_of_nodes: int = data_loader["num_nodes"]
 
         # get the raw, train,val,test nodes features
-        train_nodes_features = torch.FloatTensor(data_loader["train_nodes_features"])
+        train_nodes_features = utils.sparse_features_to_tensor(
+            data_loader["train_nodes_features_sparse"]
+        )
+
+        # the models take the components of the nodes through an embedding bag in place of the multi-hot features,
+        # which are still read out into the edges embeddings
+        use_component_encoder: bool = config.get("component_encoder", False)
+        model_inputs = (
+            component_encoder.get_component_bags(
+                data_loader["train_nodes_features_sparse"]
+            )
+            if use_component_encoder
+            else None
+        )
 
         # generate the relationship between hyper edge and nodes
         # ex. [[1,2,3,4], [3,4], [9,7,4]...] where [1,2,3,4] represent a hyper edge
-        train_all_hyper_edge_list = data_loader["train_edge_list"]
         train_hyper_edge_list = data_loader["train_masked_edge_list"]
         validation_hyper_edge_list = data_loader["validation_edge_list"]
         test_hyper_edge_list = data_loader["test_edge_list"]
@@ -240,46 +199,58 @@ def main(config=None):
         val_edge_mask = data_loader["val_edge_mask"]
         test_edge_mask = data_loader["test_edge_mask"]
 
-        train_labels = data_loader["train_labels"]
-        test_labels = data_loader["test_labels"]
-        validation_labels = data_loader["validation_labels"]
+        train_labels = data_loader["train_labels_sparse"]
+        test_labels = data_loader["test_labels_sparse"]
+        validation_labels = data_loader["validation_labels_sparse"]
 
         # to device
         # train_all_hyper_edge_list = train_all_hyper_edge_list.to(device)
 
-        # the train hyper graph
-        hyper_graph_train = Hypergraph(
-            num_of_nodes, copy.deepcopy(train_all_hyper_edge_list)
-        )
-
-        # the train hyper graph
-        hyper_graph_validation = Hypergraph(
-            num_of_nodes, copy.deepcopy(train_all_hyper_edge_list)
-        )
-
-        # the train hyper graph
-        hyper_graph_test = Hypergraph(
-            num_of_nodes, copy.deepcopy(train_all_hyper_edge_list)
-        )
-
-        if config.model_name == "GCN":
-            # generate train graph based on hyper graph
-            graph_train = Graph.from_hypergraph_clique(hyper_graph_train, weighted=True)
-
-            # generate train graph based on hyper graph
-            graph_validation = Graph.from_hypergraph_clique(
-                hyper_graph_validation, weighted=True
+        # the models run against the propagation operator computed once per graph and kept in the cache of the dataset
+        precomputed_operator: bool = config.get("precomputed_operator", False)
+        num_of_hops: int = config.get("num_of_hops", 2)
+        if "SIGN" == config.model_name:
+            # the features are propagated once with the operator of the propagation model,
+            # so only an MLP head is trained on them
+            graph_train = propagation.get_propagated_features_in_tensor(
+                data_loader,
+                "train_edge_list",
+                config.get("propagation_model", "HGNN"),
+                "train_nodes_features_sparse",
+                num_of_hops,
+            )
+        elif precomputed_operator:
+            graph_train = propagation.get_operator(
+                data_loader, "train_edge_list", config.model_name, device
             )
-
-            # generate train graph based on hyper graph
-            graph_test = Graph.from_hypergraph_clique(hyper_graph_test, weighted=True)
         else:
-            graph_train = hyper_graph_train
-            graph_validation = hyper_graph_validation
-            graph_test = hyper_graph_test
+            # the graph of the train hyper edges is built once and shared by the train, validation and test roles,
+            # its structure is kept in the cache of the dataset for the next runs
+            graph_train = graph_factory.get_graph(
+                data_loader, "train_edge_list", config.model_name
+            )
 
+        if "SIGN" == config.model_name:
+            # the SIGN model, on the features propagated 0 to num_of_hops hops
+            net_model = propagation.SIGN(
+                data_loader["num_features"],
+                config.emb_dim,
+                data_loader["num_features"],
+                num_of_hops=num_of_hops,
+                use_bn=True,
+                drop_rate=config.drop_out,
+            )
+        elif precomputed_operator:
+            # the GCN, HGNN or HGNNP model, given by the operator
+            net_model = propagation.OperatorGNN(
+                data_loader["num_features"],
+                config.emb_dim,
+                data_loader["num_features"],
+                use_bn=True,
+                drop_rate=config.drop_out,
+            )
         # the GCN model
-        if config.model_name == "GCN":
+        elif config.model_name == "GCN":
             net_model = GCN(
                 data_loader["num_features"],
                 config.emb_dim,
@@ -308,6 +279,9 @@ def main(config=None):
         else:
             raise Exception("Sorry, no model_name has been recognized.")
 
+        if use_component_encoder:
+            net_model = component_encoder.use_component_encoder(net_model)
+
         model_save_dir = f"../save_model_ckp/{config.model_name}_{config.dataset}_{config.task}_{config.learning_rate}.bin"
         ensureDir("../save_model_ckp")
         net_model.device = device
@@ -326,13 +300,27 @@ def main(config=None):
             validation_labels.to(device),
         )
 
+        if model_inputs is not None:
+            model_inputs = model_inputs.to(device)
         graph_train = graph_train.to(device)
-        graph_validation = graph_validation.to(device)
-        graph_test = graph_test.to(device)
+        graph_validation = graph_train
+        graph_test = graph_train
         net_model = net_model.to(device)
 
         print(f"{config.model_name} Baseline")
 
+        # the edges embeddings of the splits are read out once for the run
+        edges_embeddings_cache = utils.EdgesEmbeddingsCache(device)
+
+        # the known nodes of the validation and test edges to filter, built once for the run
+        validation_filter_indexes = utils.get_filter_indexes(
+            validation_hyper_edge_list, device
+        )
+        test_filter_indexes = utils.get_filter_indexes(test_hyper_edge_list, device)
+
+        # write the arrays parsed for the keys read above into the cache once, for the next runs
+        data_loader.save_cache()
+
         # start to train
         for epoch in range(200):
             # train
@@ -345,6 +333,8 @@ def main(config=None):
                 train_labels,
                 optimizer,
                 epoch,
+                edges_embeddings_cache,
+                model_inputs,
             )
             epoch_log = {
                 "loss": loss,
@@ -360,6 +350,9 @@ def main(config=None):
                         validation_hyper_edge_list,
                         graph_validation,
                         validation_labels,
+                        edges_embeddings_cache,
+                        validation_filter_indexes,
+                        model_inputs,
                     )
                     if best_valid_ndcg<valid_result['valid_ndcg']:
                         best_valid_ndcg = valid_result['valid_ndcg']
@@ -375,6 +368,9 @@ def main(config=None):
                         test_hyper_edge_list,
                         graph_test,
                         test_labels,
+                        edges_embeddings_cache,
+                        test_filter_indexes,
+                        model_inputs,
                     )
                     # test_ndcg, test_acc = (
                     #     test_result["test_ndcg"],
@@ -427,5 +423,9 @@ else:
         "model_name": "HGNN",
         "task": "output link prediction dataset",
         "dataset": "Disease",
+        "precomputed_operator": False,
+        "num_of_hops": 2,
+        "propagation_model": "HGNN",
+        "component_encoder": False,
     }
     main(config)
@@ -0,0 +1,138 @@
+import copy
+
+import numpy as np
+from dhg import Graph, Hypergraph
+
+from dataset_cache import compute_content_hash
+
+# the structures built in this process, the key is (pathway, task, content hash, edge list key, structure name),
+# so the train, validation and test roles of a run and the runs of a sweep agent share one structure
+structure_dict: dict[tuple, object] = dict()
+
+
+def get_incidence_arrays(
+    hyper_graph: Hypergraph,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the CSR incidence of the hyper edges of a hyper graph, the duplicated hyper edges are already merged by dhg
+    :param hyper_graph: the hyper graph
+    :return: indptr, indices and weights of the hyper edges, ex. [0, 2, 6], [351, 773, 1, 594, 595, 1849], [1., 1.]
+    """
+    hyper_edge_list, hyper_edge_weight_list = hyper_graph.e
+    indptr = np.zeros(len(hyper_edge_list) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(hyper_edge) for hyper_edge in hyper_edge_list])
+    indices = np.fromiter(
+        (node for hyper_edge in hyper_edge_list for node in hyper_edge),
+        dtype=np.int64,
+        count=int(indptr[-1]),
+    )
+    return indptr, indices, np.array(hyper_edge_weight_list, dtype=np.float64)
+
+
+def get_clique_edge_arrays(hyper_graph: Hypergraph) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Expand a hyper graph into the weighted clique graph of Graph.from_hypergraph_clique(hyper_graph, weighted=True)
+    :param hyper_graph: the hyper graph
+    :return: the edge index of shape (num of edges, 2) and the weights of the edges, ex. [[1, 594], [1, 595]], [1., 2.]
+    """
+    graph = Graph.from_hypergraph_clique(hyper_graph, weighted=True)
+    edge_list, edge_weight_list = graph.e
+    edge_index = np.array(edge_list, dtype=np.int64).reshape(-1, 2)
+    # the weights are float32 in dhg, float64 keeps them exactly
+    return edge_index, np.array(edge_weight_list, dtype=np.float64)
+
+
+def get_structure_key(data_loader, edge_list_key: str, structure_name: str) -> tuple:
+    content_hash: str = compute_content_hash(
+        [
+            data_loader.get_manifest(type_name)
+            for type_name in ["raw", "train", "validation", "test"]
+        ]
+    )
+    return (
+        data_loader.sub_dataset_name,
+        data_loader.task_name,
+        content_hash,
+        edge_list_key,
+        structure_name,
+    )
+
+
+def get_hypergraph(data_loader, edge_list_key: str) -> Hypergraph:
+    """
+    Get the hyper graph of the hyper edges of data_loader[edge_list_key], built once per (pathway, task, split).
+    The incidence is kept in the binary cache of the data loader, so the next processes only load it.
+    The hyper graph is shared, ex. by the train, validation and test roles, it should not be edited.
+    :param data_loader: ex. DataLoaderLink("Disease", "input link prediction dataset")
+    :param edge_list_key: ex. "train_edge_list", or "edge_list" for the attribute prediction
+    :return: the hyper graph
+    """
+    structure_key: tuple = get_structure_key(data_loader, edge_list_key, "hypergraph")
+    if structure_key in structure_dict:
+        return structure_dict[structure_key]
+
+    num_of_nodes: int = data_loader["num_nodes"]
+    array_prefix: str = f"graph/{edge_list_key}/incidence"
+    array_names: tuple[str, ...] = (
+        array_prefix + "_indptr",
+        array_prefix + "_indices",
+        array_prefix + "_weights",
+    )
+    hyper_graph = None
+    if not data_loader.has_cached_arrays(array_names):
+        hyper_graph = Hypergraph(
+            num_of_nodes, copy.deepcopy(data_loader[edge_list_key])
+        )
+    indptr, indices, weights = data_loader.get_cached_arrays(
+        array_names, lambda: get_incidence_arrays(hyper_graph)
+    )
+
+    if hyper_graph is None:
+        indices_list: list[int] = indices.tolist()
+        indptr_list: list[int] = indptr.tolist()
+        hyper_graph = Hypergraph(
+            num_of_nodes,
+            [
+                indices_list[start:end]
+                for start, end in zip(indptr_list[:-1], indptr_list[1:])
+            ],
+            weights.tolist(),
+        )
+
+    structure_dict[structure_key] = hyper_graph
+    return hyper_graph
+
+
+def get_clique_graph(data_loader, edge_list_key: str) -> Graph:
+    """
+    Get the weighted clique expansion of the hyper graph of get_hypergraph, built once per (pathway, task, split).
+    The edge index and the weights are kept in the binary cache of the data loader, so the next processes only load them.
+    :param data_loader: ex. DataLoaderLink("Disease", "input link prediction dataset")
+    :param edge_list_key: ex. "train_edge_list"
+    :return: the same graph as Graph.from_hypergraph_clique(hyper_graph, weighted=True)
+    """
+    structure_key: tuple = get_structure_key(data_loader, edge_list_key, "clique")
+    if structure_key in structure_dict:
+        return structure_dict[structure_key]
+
+    array_prefix: str = f"graph/{edge_list_key}/clique"
+    edge_index, weights = data_loader.get_cached_arrays(
+        (array_prefix + "_edge_index", array_prefix + "_weights"),
+        lambda: get_clique_edge_arrays(get_hypergraph(data_loader, edge_list_key)),
+    )
+
+    graph = Graph(
+        data_loader["num_nodes"], edge_index.tolist(), weights.tolist(), merge_op="sum"
+    )
+    structure_dict[structure_key] = graph
+    return graph
+
+
+def get_graph(data_loader, edge_list_key: str, model_name: str):
+    """
+    :param model_name: "GCN" takes the clique graph, "HGNN" and "HGNNP" take the hyper graph
+    :return: the graph structure the model takes
+    """
+    if "GCN" == model_name:
+        return get_clique_graph(data_loader, edge_list_key)
+    return get_hypergraph(data_loader, edge_list_key)
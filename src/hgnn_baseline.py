@@ -90,15 +90,24 @@ if __name__ == "__main__":
     validation_labels = data_loader["validation_labels"]
     test_labels = data_loader["test_labels"]
 
-    validation_nodes_attributes = data_loader["validation_nodes_components"]
-    test_nodes_attributes = data_loader["test_nodes_components"]
+    # the known components of the validation and test nodes to filter, built once for the run
+    validation_nodes_attributes = utils.get_filter_indexes(
+        data_loader["validation_nodes_components"], device
+    )
+    test_nodes_attributes = utils.get_filter_indexes(
+        data_loader["test_nodes_components"], device
+    )
 
     # get the train,val,test nodes features
-    train_nodes_features = torch.FloatTensor(data_loader["train_nodes_features"])
-    validation_nodes_features = torch.FloatTensor(
-        data_loader["validation_nodes_features"]
+    train_nodes_features = utils.sparse_features_to_tensor(
+        data_loader["train_nodes_features_sparse"]
+    )
+    validation_nodes_features = utils.sparse_features_to_tensor(
+        data_loader["validation_nodes_features_sparse"]
+    )
+    test_nodes_features = utils.sparse_features_to_tensor(
+        data_loader["test_nodes_features_sparse"]
     )
-    test_nodes_features = torch.FloatTensor(data_loader["test_nodes_features"])
 
     # get train, validation, test mask to track the nodes
     train_mask = data_loader["train_node_mask"]
@@ -139,6 +148,9 @@ if __name__ == "__main__":
 
     print("HGNN Baseline")
 
+    # write the arrays parsed for the keys read above into the cache once, for the next runs
+    data_loader.save_cache()
+
     # start to train
     for epoch in range(200):
         # train
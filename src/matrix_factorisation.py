@@ -69,6 +69,27 @@ class MF(torch.nn.Module):
             scores, _ = self.forward((entity_t, reaction_t))
         return scores
 
+    def predict_matrix(self, entity, reaction):
+        """Score every entity against every reaction with one matrix product.
+        Args:
+            entity (list of int): entity ids, the columns of the scores.
+            reaction (list of int): reaction ids, the rows of the scores.
+        Return:
+            scores (tensor): scores[i][j] is the predicted score of the pair (entity[j], reaction[i]).
+        """
+        entity_t = torch.as_tensor(entity, dtype=torch.long, device=self.device)
+        reaction_t = torch.as_tensor(reaction, dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            scores = torch.sigmoid(
+                torch.matmul(
+                    self.reaction_emb(reaction_t), self.entity_emb(entity_t).t()
+                )
+                + self.entity_bias(entity_t).t()
+                + self.reaction_bias(reaction_t)
+                + self.global_bias
+            )
+        return scores
+
 
 class MFEngine(ModelEngine):
     """MFEngine Class."""
@@ -0,0 +1,176 @@
+import numpy as np
+import scipy.sparse
+import torch
+
+# the cut-offs reported by the sweeps, ex. ndcg_3 and acc_3
+TOP_K_LIST = (3, 5, 10, 15)
+
+# the number of scores ranked at once, a larger matrix is ranked a chunk of rows at a time
+CHUNK_NUM_OF_ELEMENTS = 1 << 24
+
+
+def get_relevant_entries(
+    labels, shape: tuple[int, int], device
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Get the relevant entries of the labels, sorted by row, then by gain in descending order, then by column
+    :param labels: dense or sparse, a torch tensor, a scipy sparse matrix or a ndarray, ex. [[0, 1, 0, 1], [0, 0, 0, 1]]
+    :param shape: the shape of the scores
+    :param device: the device of the scores
+    :return: rows, columns and gains of the entries whose gain is positive, ex. [0, 0, 1], [1, 3, 3], [1., 1., 1.]
+    """
+    if isinstance(labels, torch.Tensor) and labels.layout != torch.strided:
+        labels = labels.to_sparse_coo().coalesce()
+        rows, cols = labels.indices()
+        gains = labels.values()
+    elif scipy.sparse.issparse(labels):
+        labels = scipy.sparse.coo_matrix(labels)
+        labels.sum_duplicates()
+        rows = torch.from_numpy(labels.row.astype(np.int64))
+        cols = torch.from_numpy(labels.col.astype(np.int64))
+        gains = torch.from_numpy(labels.data)
+    else:
+        labels = torch.as_tensor(labels)
+        rows, cols = torch.nonzero(labels, as_tuple=True)
+        gains = labels[rows, cols]
+
+    if tuple(labels.shape) != tuple(shape):
+        raise Exception(
+            f"The labels of shape {tuple(labels.shape)} don't match the scores of shape {tuple(shape)}"
+        )
+    if bool((gains < 0).any()):
+        raise Exception("The labels should be non-negative gains, ex. 0 or 1")
+
+    is_relevant = gains > 0
+    rows = rows[is_relevant].to(device=device, dtype=torch.int64)
+    cols = cols[is_relevant].to(device=device, dtype=torch.int64)
+    gains = gains[is_relevant].to(device=device, dtype=torch.float64)
+
+    order = torch.argsort(cols, stable=True)
+    order = order[torch.argsort(gains[order], descending=True, stable=True)]
+    order = order[torch.argsort(rows[order], stable=True)]
+    return rows[order], cols[order], gains[order]
+
+
+@torch.no_grad()
+def get_ranking_metrics(
+    scores, labels, top_k_list=TOP_K_LIST, chunk_size: int = None
+) -> dict[str, float]:
+    """
+    Rank every row of the scores once and derive all the ranking metrics from that single ranking.
+    The numbers are the same as the ones of sklearn, ties included:
+    ndcg and ndcg_k are sklearn.metrics.ndcg_score, which averages the gains of the tied scores,
+    acc is sklearn.metrics.accuracy_score of the argmax of the labels and the argmax of the scores,
+    acc_k is sklearn.metrics.top_k_accuracy_score of the argmax of the labels.
+    :param scores: the predictions, a torch tensor on any device or a ndarray, ex. [[0.1, 0.9, 0.3, 0.9], [0.1, 0.2, 0.3, 0.9]]
+    :param labels: the gains, dense or sparse, ex. [[0, 1, 0, 1], [0, 0, 0, 1]]
+    :param top_k_list: the cut-offs, ex. (3, 5, 10, 15)
+    :param chunk_size: the number of rows ranked at once, by default the chunk holds about 16M scores
+    :return: {"ndcg": , "ndcg_3": , ..., "acc": , "acc_3": , ...}
+    """
+    scores = torch.as_tensor(scores).detach()
+    num_of_rows, num_of_columns = scores.shape
+    device = scores.device
+    rows, cols, gains = get_relevant_entries(labels, scores.shape, device)
+
+    # the entries of the row i are entries[indptr[i]:indptr[i + 1]], their slot is the ideal rank of their gain
+    counts = torch.bincount(rows, minlength=num_of_rows)
+    indptr = torch.zeros(num_of_rows + 1, dtype=torch.int64, device=device)
+    indptr[1:] = torch.cumsum(counts, dim=0)
+    slots = torch.arange(len(rows), device=device) - indptr[rows]
+
+    # the category of a row is the argmax of its labels, the first column of the largest gain, 0 for an empty row
+    targets = torch.zeros(num_of_rows, dtype=torch.int64, device=device)
+    targets[counts > 0] = cols[indptr[:-1][counts > 0]]
+
+    # the same discount as sklearn, discount_cumsum[r] is the sum of the discounts of the ranks before r
+    discount = 1 / (np.log(np.arange(num_of_columns) + 2) / np.log(2))
+    discount_cumsum = torch.from_numpy(np.concatenate(([0.0], np.cumsum(discount)))).to(
+        device
+    )
+    discount = torch.from_numpy(discount).to(device)
+
+    # None is the ndcg over all the ranks
+    ndcg_k_list = [None] + list(top_k_list)
+    ideal_dcg_list = list()
+    for k in ndcg_k_list:
+        is_ranked = slots < (num_of_columns if k is None else k)
+        ideal_dcg_list.append(
+            torch.zeros(num_of_rows, dtype=torch.float64, device=device).index_add_(
+                0, rows[is_ranked], gains[is_ranked] * discount[slots[is_ranked]]
+            )
+        )
+    dcg_list = [
+        torch.zeros(num_of_rows, dtype=torch.float64, device=device)
+        for _ in ndcg_k_list
+    ]
+    num_of_hits = 0
+    num_of_top_k_hits_list = [0 for _ in top_k_list]
+
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_NUM_OF_ELEMENTS // max(1, num_of_columns))
+    column_indexes = torch.arange(num_of_columns, device=device)
+    for start in range(0, num_of_rows, chunk_size):
+        end = min(start + chunk_size, num_of_rows)
+        chunk = scores[start:end]
+        chunk_targets = targets[start:end]
+        sorted_chunk = torch.sort(chunk, dim=1).values
+
+        # the first column holds the score of the category, the others the scores of the relevant entries
+        entry_start, entry_end = int(indptr[start]), int(indptr[end])
+        entry_rows = rows[entry_start:entry_end] - start
+        entry_columns = slots[entry_start:entry_end] + 1
+        max_count = int(counts[start:end].max()) if end > start else 0
+        values = chunk.new_zeros((end - start, max_count + 1))
+        values[:, 0] = chunk[torch.arange(end - start, device=device), chunk_targets]
+        values[entry_rows, entry_columns] = chunk[
+            entry_rows, cols[entry_start:entry_end]
+        ]
+
+        # the number of scores greater than and equal to every value, the value itself included
+        num_of_less = torch.searchsorted(sorted_chunk, values)
+        num_of_less_or_equal = torch.searchsorted(sorted_chunk, values, right=True)
+        num_of_greater = num_of_columns - num_of_less_or_equal
+        num_of_equal = num_of_less_or_equal - num_of_less
+
+        # argmax takes the first of the tied scores, top_k_accuracy_score ranks the last of them first
+        target_scores = values[:, :1]
+        num_of_equal_before = (
+            (chunk == target_scores) & (column_indexes < chunk_targets[:, None])
+        ).sum(dim=1)
+        num_of_equal_after = num_of_equal[:, 0] - 1 - num_of_equal_before
+        num_of_hits += int(
+            ((0 == num_of_greater[:, 0]) & (0 == num_of_equal_before)).sum()
+        )
+        for i, k in enumerate(top_k_list):
+            num_of_top_k_hits_list[i] += int(
+                (num_of_greater[:, 0] + num_of_equal_after < k).sum()
+            )
+
+        # the tied scores share the average of their discounts, as in sklearn
+        entry_greater = num_of_greater[entry_rows, entry_columns]
+        entry_equal = num_of_equal[entry_rows, entry_columns]
+        entry_gains = gains[entry_start:entry_end] / entry_equal
+        for i, k in enumerate(ndcg_k_list):
+            last_rank = num_of_columns if k is None else k
+            discount_sums = (
+                discount_cumsum[torch.clamp(entry_greater + entry_equal, max=last_rank)]
+                - discount_cumsum[torch.clamp(entry_greater, max=last_rank)]
+            )
+            dcg_list[i][start:end].index_add_(
+                0, entry_rows, entry_gains * discount_sums
+            )
+
+    results: dict[str, float] = dict()
+    for k, dcg, ideal_dcg in zip(ndcg_k_list, dcg_list, ideal_dcg_list):
+        dcg = dcg.cpu().numpy()
+        ideal_dcg = ideal_dcg.cpu().numpy()
+        # the rows without any relevant entry count as 0
+        ndcg = np.zeros(num_of_rows)
+        is_relevant = ideal_dcg > 0
+        ndcg[is_relevant] = dcg[is_relevant] / ideal_dcg[is_relevant]
+        results["ndcg" if k is None else f"ndcg_{k}"] = float(np.average(ndcg))
+    results["acc"] = num_of_hits / num_of_rows
+    for k, num_of_top_k_hits in zip(top_k_list, num_of_top_k_hits_list):
+        results[f"acc_{k}"] = num_of_top_k_hits / num_of_rows
+    return results
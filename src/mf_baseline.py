@@ -3,11 +3,13 @@ import sys
 
 sys.path.append("../src/")
 import numpy as np
-from sklearn import metrics
+import scipy.sparse
+
+import metrics
 
 from data_loader import Database
 from matrix_factorisation import MFEngine
-from utils import instance_bpr_loader, predict_full
+from utils import instance_bpr_iterable_loader, instance_bpr_loader, predict_full
 
 
 class MF_train:
@@ -29,13 +31,24 @@ class MF_train:
     def train(self):
         """Train the model."""
 
-        train_loader = instance_bpr_loader(
-            data=self.train_set,
-            batch_size=self.config["batch_size"],
-            device=self.config["device_str"],
-            n_entity=self.n_entity,
-            n_reaction=self.n_reaction,
-        )
+        if self.config.get("resample_negative", True):
+            # sample new negative reactions on every epoch
+            train_loader = instance_bpr_iterable_loader(
+                data=self.train_set,
+                batch_size=self.config["batch_size"],
+                device=self.config["device_str"],
+                n_reaction=self.n_reaction,
+                seed=self.config.get("seed", 0),
+                prefetch=self.config.get("prefetch_negative", True),
+            )
+        else:
+            train_loader = instance_bpr_loader(
+                data=self.train_set,
+                batch_size=self.config["batch_size"],
+                device=self.config["device_str"],
+                n_entity=self.n_entity,
+                n_reaction=self.n_reaction,
+            )
 
         self.engine = MFEngine(self.config)
         self.model_save_dir = os.path.join(
@@ -77,17 +90,21 @@ class MF_train:
         predictions = predictions.reshape(
             n_samples, int(predictions.shape[0] / n_samples)
         )
-        ground_truth = np.zeros(int(predictions.shape[1]))
+        # the true entity of every sample is in the first column
         # [1,0,0,0...]
         # [1,0,0,0...]
-        ground_truth[0] = 1
-        new = []
-        for i in range(n_samples):
-            new.append(list(ground_truth))
-
-        ground_truth = np.array(new)
+        ground_truth = scipy.sparse.csr_matrix(
+            (
+                np.ones(n_samples),
+                np.zeros(n_samples, dtype=np.int64),
+                np.arange(n_samples + 1),
+            ),
+            shape=predictions.shape,
+        )
 
-        NDCG = metrics.ndcg_score(ground_truth, predictions)
+        NDCG = metrics.get_ranking_metrics(predictions, ground_truth, top_k_list=())[
+            "ndcg"
+        ]
 
         return NDCG
 
@@ -110,6 +127,9 @@ args["lr"] = 0.001
 args["run_dir"] = "runs/"
 args["save_name"] = "mf.model"
 args["max_epoch"] = 100
+# sample new negative reactions on every epoch, in a background thread
+args["resample_negative"] = True
+args["prefetch_negative"] = True
 MF_disease = MF_train(args)
 MF_disease.train()
 MF_disease.test()
@@ -7,11 +7,13 @@ import wandb
 
 sys.path.append("../src/")
 import numpy as np
-from sklearn import metrics
+import scipy.sparse
+
+import metrics
 
 from data_loader import Database
 from matrix_factorisation import MFEngine
-from utils import instance_bpr_loader, predict_full
+from utils import instance_bpr_iterable_loader, instance_bpr_loader, predict_full
 
 model_name = "MF"
 project_name = "pathway_link_predict_MF"
@@ -37,13 +39,24 @@ class MF_train:
         """Train the model."""
 
         global valid_result
-        train_loader = instance_bpr_loader(
-            data=self.train_set,
-            batch_size=self.config["batch_size"],
-            device=self.config["device_str"],
-            n_entity=self.n_entity,
-            n_reaction=self.n_reaction,
-        )
+        if self.config.get("resample_negative", True):
+            # sample new negative reactions on every epoch
+            train_loader = instance_bpr_iterable_loader(
+                data=self.train_set,
+                batch_size=self.config["batch_size"],
+                device=self.config["device_str"],
+                n_reaction=self.n_reaction,
+                seed=self.config.get("seed", 0),
+                prefetch=self.config.get("prefetch_negative", True),
+            )
+        else:
+            train_loader = instance_bpr_loader(
+                data=self.train_set,
+                batch_size=self.config["batch_size"],
+                device=self.config["device_str"],
+                n_entity=self.n_entity,
+                n_reaction=self.n_reaction,
+            )
 
         self.engine = MFEngine(self.config)
         self.model_save_dir = os.path.join(
@@ -106,58 +119,23 @@ class MF_train:
         predictions = predictions.reshape(
             n_samples, int(predictions.shape[0] / n_samples)
         )
-        ground_truth = np.zeros(int(predictions.shape[1]))
-        ground_truth[0] = 1
-        new = []
-        for i in range(n_samples):
-            new.append(list(ground_truth))
-
-        ground_truth = np.array(new)
-        cat_labels = ground_truth.argmax(axis=1)
-        cat_outs = predictions.argmax(axis=1)
-
-        ndcg_res = metrics.ndcg_score(ground_truth, predictions)
-        ndcg_res_3 = metrics.ndcg_score(ground_truth, predictions, k=3)
-        ndcg_res_5 = metrics.ndcg_score(ground_truth, predictions, k=5)
-        ndcg_res_10 = metrics.ndcg_score(ground_truth, predictions, k=10)
-        ndcg_res_15 = metrics.ndcg_score(ground_truth, predictions, k=15)
-
-        acc_res = metrics.accuracy_score(cat_labels, cat_outs)
-        acc_res_3 = metrics.top_k_accuracy_score(
-            cat_labels, predictions, k=3, labels=range(predictions.shape[1])
-        )
-        acc_res_5 = metrics.top_k_accuracy_score(
-            cat_labels, predictions, k=5, labels=range(predictions.shape[1])
-        )
-        acc_res_10 = metrics.top_k_accuracy_score(
-            cat_labels, predictions, k=10, labels=range(predictions.shape[1])
-        )
-        acc_res_15 = metrics.top_k_accuracy_score(
-            cat_labels, predictions, k=15, labels=range(predictions.shape[1])
+        # the true entity of every sample is in the first column, [1,0,0,0...]
+        ground_truth = scipy.sparse.csr_matrix(
+            (
+                np.ones(n_samples),
+                np.zeros(n_samples, dtype=np.int64),
+                np.arange(n_samples + 1),
+            ),
+            shape=predictions.shape,
         )
+        ranking_metrics = metrics.get_ranking_metrics(predictions, ground_truth)
+        ndcg_res = ranking_metrics["ndcg"]
+        acc_res = ranking_metrics["acc"]
 
         if "test" == evaluate_type:
-            ndcg: str = "test_ndcg"
-            ndcg_3: str = "test_ndcg_3"
-            ndcg_5: str = "test_ndcg_5"
-            ndcg_10: str = "test_ndcg_10"
-            ndcg_15: str = "test_ndcg_15"
-            acc: str = "test_acc"
-            acc_3: str = "test_acc_3"
-            acc_5: str = "test_acc_5"
-            acc_10: str = "test_acc_10"
-            acc_15: str = "test_acc_15"
+            prefix: str = "test_"
         elif "validation" == evaluate_type:
-            ndcg: str = "valid_ndcg"
-            ndcg_3: str = "valid_ndcg_3"
-            ndcg_5: str = "valid_ndcg_5"
-            ndcg_10: str = "valid_ndcg_10"
-            ndcg_15: str = "valid_ndcg_15"
-            acc: str = "valid_acc"
-            acc_3: str = "valid_acc_3"
-            acc_5: str = "valid_acc_5"
-            acc_10: str = "valid_acc_10"
-            acc_15: str = "valid_acc_15"
+            prefix: str = "valid_"
         else:
             raise Exception('Please choose "test" or "validation" type')
 
@@ -177,18 +155,7 @@ class MF_train:
             + "{:.5f}".format(acc_res)
             + "\033[0m"
         )
-        return {
-            ndcg: ndcg_res,
-            ndcg_3: ndcg_res_3,
-            ndcg_5: ndcg_res_5,
-            ndcg_10: ndcg_res_10,
-            ndcg_15: ndcg_res_15,
-            acc: acc_res,
-            acc_3: acc_res_3,
-            acc_5: acc_res_5,
-            acc_10: acc_res_10,
-            acc_15: acc_res_15,
-        }
+        return {prefix + name: value for name, value in ranking_metrics.items()}
 
 
 def main(config=None):
@@ -212,6 +179,9 @@ def main(config=None):
         args["optimizer"] = "adam"
         args["save_name"] = f"mf_{config.dataset}_{config.task}_{config.learning_rate}_{config.batch_size}.bin"
         args["max_epoch"] = 100
+        # sample new negative reactions on every epoch, in a background thread
+        args["resample_negative"] = config.get("resample_negative", True)
+        args["prefetch_negative"] = config.get("prefetch_negative", True)
         MF_disease = MF_train(args)
         MF_disease.train()
         MF_disease.test()
@@ -234,6 +204,8 @@ def sweep():
                 "learning_rate": {"values": [0.05, 0.01, 0.005]},
                 "emb_dim": {"values": [256]},
                 "batch_size": {"values": [64, 128, 256]},
+                "resample_negative": {"values": [True]},
+                "prefetch_negative": {"values": [True]},
                 "model_name": {"values": [model_name]},
                 "task": {"values": [task]},
                 "dataset": {"values": [dataset]},
@@ -254,6 +226,8 @@ else:
         "learning_rate": 0.05,
         "emb_dim": 128,
         "batch_size": 128,
+        "resample_negative": True,
+        "prefetch_negative": True,
         "model_name": "MF",
         "task": "output link prediction dataset",
         "dataset": "Disease",
@@ -0,0 +1,371 @@
+import csv
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+# the spans are recorded when this environment variable is set, or when a script is run through this module
+PROFILE_ENV_NAME = "PATHWAY_PROFILE"
+
+# the chrome trace keeps the first events only, the statistics keep all of them
+MAX_NUM_OF_TRACE_EVENTS = 1000000
+
+
+class NullSpan:
+    """The span of a disabled profiler, entering and leaving it does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    A named span of time, nested in the span which is open in the same thread when it starts,
+    ex. the span "readout" opened in the span "validation" is recorded as "validation/readout"
+    """
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.path = name
+        self.start_time = 0.0
+
+    def __enter__(self):
+        stack: list[str] = self.profiler.get_stack()
+        if stack:
+            self.path = stack[-1] + "/" + self.name
+        stack.append(self.path)
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_time = time.perf_counter()
+        self.profiler.get_stack().pop()
+        self.profiler.record(self.name, self.path, self.start_time, end_time)
+        return False
+
+
+class Profiler:
+    """
+    This is a lightweight recorder of nested spans and counters
+    Args:
+            enabled (bool): Whether to record anything, a disabled profiler returns a shared no-op span.
+    Return:
+            self.span(name) (context manager): Time the code in the with block.
+            self.count(name, value) (None): Add the value to the counter of the name.
+            self.get_stats() (dict): The count, total, mean, p50 and p95 of every span path.
+
+    The statistics are aggregated over the whole run, ex. across the epochs of a sweep run,
+    and are exported as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) or as csv.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.durations: dict[str, list[float]] = dict()
+        self.counters: dict[str, float] = dict()
+        self.events: list[dict] = list()
+        self.origin_time = time.perf_counter()
+
+    def reset(self):
+        with self.lock:
+            self.durations = dict()
+            self.counters = dict()
+            self.events = list()
+            self.origin_time = time.perf_counter()
+
+    def get_stack(self) -> list[str]:
+        """Get the paths of the spans open in the current thread"""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = list()
+        return stack
+
+    def span(self, name: str):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name: str, path: str, start_time: float, end_time: float):
+        with self.lock:
+            self.durations.setdefault(path, list()).append(end_time - start_time)
+            if len(self.events) < MAX_NUM_OF_TRACE_EVENTS:
+                self.events.append(
+                    {
+                        "name": name,
+                        "cat": path,
+                        "ph": "X",
+                        "ts": (start_time - self.origin_time) * 1e6,
+                        "dur": (end_time - start_time) * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            if len(self.events) < MAX_NUM_OF_TRACE_EVENTS:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "C",
+                        "ts": (time.perf_counter() - self.origin_time) * 1e6,
+                        "pid": os.getpid(),
+                        "args": {name: total},
+                    }
+                )
+
+    def profile(self, name: str = None):
+        """
+        Decorate a function to time every call of it in a span
+        :param name: the name of the span, the qualified name of the function by default
+        """
+
+        def decorator(function):
+            span_name = function.__qualname__ if name is None else name
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Span(self, span_name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        """
+        :return: {span path: {"count", "total", "mean", "p50", "p95"}}, the times are in seconds,
+        ex. {"train/forward": {"count": 200, "total": 1.2, "mean": 0.006, "p50": 0.005, "p95": 0.009}}
+        """
+        with self.lock:
+            durations = {path: list(values) for path, values in self.durations.items()}
+        stats: dict[str, dict[str, float]] = dict()
+        for path in sorted(durations):
+            values = np.array(durations[path])
+            stats[path] = {
+                "count": len(values),
+                "total": float(values.sum()),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+            }
+        return stats
+
+    def export_chrome_trace(self, file_path: str):
+        with self.lock:
+            events = list(self.events)
+        with open(file_path, "w") as file_handler:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file_handler)
+
+    def export_csv(self, file_path: str):
+        with open(file_path, "w", newline="") as file_handler:
+            writer = csv.writer(file_handler)
+            writer.writerow(
+                ["type", "name", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms"]
+            )
+            for path, stat in self.get_stats().items():
+                writer.writerow(
+                    ["span", path, stat["count"]]
+                    + [
+                        f"{stat[key] * 1000:.3f}"
+                        for key in ["total", "mean", "p50", "p95"]
+                    ]
+                )
+            for name, total in sorted(self.counters.items()):
+                writer.writerow(["counter", name, total, "", "", "", ""])
+
+    def print_summary(self):
+        print(
+            f"{'span':<60}{'count':>8}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        )
+        for path, stat in self.get_stats().items():
+            print(
+                f"{path:<60}{stat['count']:>8}{stat['total'] * 1000:>12.1f}"
+                f"{stat['mean'] * 1000:>10.2f}{stat['p50'] * 1000:>10.2f}{stat['p95'] * 1000:>10.2f}"
+            )
+        for name, total in sorted(self.counters.items()):
+            print(f"{name:<60}{total:>8}")
+
+
+# the profiler of the process
+profiler = Profiler(enabled=bool(os.environ.get(PROFILE_ENV_NAME)))
+
+
+def span(name: str):
+    return profiler.span(name)
+
+
+def count(name: str, value: float = 1):
+    profiler.count(name, value)
+
+
+def profile(name: str = None):
+    return profiler.profile(name)
+
+
+def wrap_with_span(function, name: str, counter=None):
+    """
+    :param function: the function to time
+    :param name: the name of the span
+    :param counter: (counter name, a function of the arguments of the call which returns the value to add)
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return function(*args, **kwargs)
+        if counter is not None:
+            profiler.count(counter[0], counter[1](*args, **kwargs))
+        with Span(profiler, name):
+            return function(*args, **kwargs)
+
+    wrapper.is_instrumented = True
+    return wrapper
+
+
+def patch_with_span(owner, attribute_name: str, name: str, counter=None):
+    """Replace the function owner.attribute_name by the same function timed in a span, the static and class methods included"""
+    attribute = owner.__dict__.get(attribute_name, getattr(owner, attribute_name))
+    if isinstance(attribute, (staticmethod, classmethod)):
+        function = attribute.__func__
+        if getattr(function, "is_instrumented", False):
+            return
+        setattr(
+            owner,
+            attribute_name,
+            type(attribute)(wrap_with_span(function, name, counter)),
+        )
+        return
+    if getattr(attribute, "is_instrumented", False):
+        return
+    setattr(owner, attribute_name, wrap_with_span(attribute, name, counter))
+
+
+def instrument():
+    """
+    Time the steps of the scripts without editing them, by patching the functions they call:
+    the dataset loading and parsing, the graph building, the readout of the hyper edges,
+    the forward, the loss, the backward and the optimizer step, the evaluation and the checkpoints
+    """
+    import dhg
+    import dhg.models
+    import torch
+    import torch.nn.functional as F
+
+    import data_loader
+    import dataset_cache
+    import graph_factory
+    import matrix_factorisation
+    import metrics
+    import propagation
+    import sampled_softmax
+    import utils
+
+    patch_with_span(data_loader.DataLoaderBase, "__init__", "loader init")
+    patch_with_span(
+        data_loader.DataLoaderBase, "get_value_lazily_assist", "loader value"
+    )
+    for function_name in [
+        "read_relationship_array",
+        "read_components_arrays",
+        "read_first_column_array",
+        "read_stable_id_array",
+    ]:
+        patch_with_span(
+            utils, function_name, "loader parse", ("parsed files", lambda *a, **k: 1)
+        )
+    patch_with_span(dataset_cache.DatasetCache, "save", "cache save")
+
+    patch_with_span(dhg.Hypergraph, "__init__", "hypergraph build")
+    patch_with_span(dhg.Graph, "from_hypergraph_clique", "clique graph build")
+    patch_with_span(graph_factory, "get_graph", "graph factory")
+
+    patch_with_span(
+        utils,
+        "read_out_to_generate_hyper_edges_embeddings",
+        "readout",
+        ("readout hyper edges", lambda indptr, *a, **k: len(indptr) - 1),
+    )
+    for model_class in [dhg.models.GCN, dhg.models.HGNN, dhg.models.HGNNP]:
+        patch_with_span(model_class, "forward", "forward")
+    patch_with_span(matrix_factorisation.MF, "forward", "forward")
+    patch_with_span(propagation.OperatorGNN, "forward", "forward")
+    patch_with_span(propagation.SIGN, "forward", "forward")
+    patch_with_span(propagation, "get_propagated_features", "feature propagation")
+    patch_with_span(F, "cross_entropy", "loss")
+    patch_with_span(utils, "cross_entropy_with_sparse_labels", "loss")
+    patch_with_span(utils.ModelEngine, "bpr_loss", "loss")
+    patch_with_span(sampled_softmax, "sampled_softmax_loss", "loss")
+    patch_with_span(torch.Tensor, "backward", "backward")
+    for optimizer_class in [torch.optim.Adam, torch.optim.SGD, torch.optim.RMSprop]:
+        patch_with_span(optimizer_class, "step", "optimizer step")
+
+    patch_with_span(
+        metrics,
+        "get_ranking_metrics",
+        "eval metrics",
+        ("evaluated rows", lambda scores, *a, **k: len(scores)),
+    )
+    patch_with_span(utils, "predict_full_matrix", "predict")
+    patch_with_span(torch, "save", "checkpoint")
+
+
+def main(argv: list[str]):
+    """
+    Run a script with the profiler enabled and export where the time goes, ex.
+    python profiling.py gnn_link_prediction_baseline_sweep.py
+    the Chrome trace and the csv are written to ../profile
+    """
+    if not argv:
+        raise Exception(
+            "Please give the script to profile, ex. python profiling.py gnn_link_prediction_baseline_sweep.py"
+        )
+    script_path = argv[0]
+    profiler.enabled = True
+    instrument()
+
+    output_dir = os.path.join("..", "profile")
+    output_name = (
+        os.path.splitext(os.path.basename(script_path))[0]
+        + "-"
+        + time.strftime("%Y%m%d-%H%M%S")
+    )
+    sys.argv = list(argv)
+    try:
+        with span("run"):
+            runpy.run_path(script_path, run_name="__main__")
+    finally:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        profiler.print_summary()
+        profiler.export_chrome_trace(
+            os.path.join(output_dir, output_name + ".trace.json")
+        )
+        profiler.export_csv(os.path.join(output_dir, output_name + ".csv"))
+        print("the profile is written to " + os.path.join(output_dir, output_name))
+
+
+if __name__ == "__main__":
+    # run with the profiling module the scripts import, not with a second copy of it named __main__
+    import profiling
+
+    profiling.main(sys.argv[1:])
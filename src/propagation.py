@@ -0,0 +1,374 @@
+import numpy as np
+import scipy.sparse
+import torch
+import torch.nn as nn
+
+import graph_factory
+import utils
+
+# the operator every model smooths the vertex features with, a matrix of shape (num of nodes, num of nodes)
+# GCN: the normalised clique adjacency with self loops, D^-1/2 (A + I) D^-1/2
+# HGNN: the hyper graph smoothing, Dv^-1/2 H We De^-1 H^T Dv^-1/2
+# HGNNP: the mean vertex to hyper edge to vertex message passing, Dv^-1 H We De^-1 H^T
+OPERATOR_NAME_DICT: dict[str, str] = {
+    "GCN": "gcn",
+    "HGNN": "hgnn",
+    "HGNNP": "hgnnp",
+}
+
+# the operators built in this process, the key is the key of the graph structure and the device
+operator_dict: dict[tuple, torch.Tensor] = dict()
+
+# the propagated features built in this process, the key is the key of the operator, the features and the hop
+propagated_features_dict: dict[tuple, scipy.sparse.csr_matrix] = dict()
+
+
+def sparse_tensor_to_csr_arrays(
+    sparse_tensor: torch.Tensor,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param sparse_tensor: a square torch sparse coo tensor
+    :return: indptr and indices in int32 and values in float32 of the CSR matrix
+    """
+    sparse_tensor = sparse_tensor.coalesce().cpu()
+    rows, cols = sparse_tensor.indices().numpy()
+    mat = scipy.sparse.csr_matrix(
+        (sparse_tensor.values().numpy(), (rows, cols)),
+        shape=tuple(sparse_tensor.shape),
+    )
+    mat.sum_duplicates()
+    mat.sort_indices()
+    return (
+        mat.indptr.astype(np.int32),
+        mat.indices.astype(np.int32),
+        mat.data.astype(np.float32),
+    )
+
+
+def get_operator_arrays(
+    structure, model_name: str
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the propagation operator of a model from the dhg structure, with the same normalisation as dhg
+    :param structure: the dhg.Graph of GCN or the dhg.Hypergraph of HGNN and HGNNP
+    :param model_name: "GCN", "HGNN" or "HGNNP"
+    :return: indptr, indices and values of the CSR operator
+    """
+    if "GCN" == model_name:
+        operator = structure.L_GCN
+    elif "HGNN" == model_name:
+        operator = structure.L_HGNN
+    elif "HGNNP" == model_name:
+        operator = (
+            structure.D_v_neg_1.mm(structure.H)
+            .mm(structure.W_e)
+            .mm(structure.D_e_neg_1)
+            .mm(structure.H_T)
+        )
+    else:
+        raise Exception("Sorry, no model_name has been recognized.")
+    return sparse_tensor_to_csr_arrays(operator)
+
+
+def get_operator(
+    data_loader, edge_list_key: str, model_name: str, device=torch.device("cpu")
+) -> torch.Tensor:
+    """
+    Get the propagation operator of the graph of data_loader[edge_list_key] as a torch sparse CSR tensor,
+    computed once per (pathway, task, split) and model, and shared by all the runs of the process.
+    The CSR arrays are kept in the binary cache of the data loader, so the next processes only load them.
+    :param data_loader: ex. DataLoaderLink("Disease", "input link prediction dataset")
+    :param edge_list_key: ex. "train_edge_list", or "edge_list" for the attribute prediction
+    :param model_name: "GCN", "HGNN" or "HGNNP"
+    :param device: the device of the operator
+    :return: the operator of shape (num of nodes, num of nodes), int32 indices and float32 values
+    """
+    if model_name not in OPERATOR_NAME_DICT:
+        raise Exception("Sorry, no model_name has been recognized.")
+    operator_name: str = OPERATOR_NAME_DICT[model_name]
+    operator_key: tuple = graph_factory.get_structure_key(
+        data_loader, edge_list_key, operator_name
+    ) + (str(device),)
+    if operator_key in operator_dict:
+        return operator_dict[operator_key]
+
+    array_prefix: str = f"operator/{edge_list_key}/{operator_name}"
+    indptr, indices, values = data_loader.get_cached_arrays(
+        (array_prefix + "_indptr", array_prefix + "_indices", array_prefix + "_values"),
+        lambda: get_operator_arrays(
+            graph_factory.get_graph(data_loader, edge_list_key, model_name),
+            model_name,
+        ),
+    )
+
+    num_of_nodes: int = data_loader["num_nodes"]
+    # the cached arrays are read-only views of the cache file
+    operator = torch.sparse_csr_tensor(
+        torch.tensor(indptr),
+        torch.tensor(indices),
+        torch.tensor(values),
+        size=(num_of_nodes, num_of_nodes),
+    ).to(device)
+    operator_dict[operator_key] = operator
+    return operator
+
+
+def get_csr_arrays(mat) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param mat: a scipy sparse matrix, ex. the propagated features
+    :return: indptr in int64, indices in int32 and data in float32 of the CSR matrix
+    """
+    mat = scipy.sparse.csr_matrix(mat, dtype=np.float32)
+    mat.sum_duplicates()
+    mat.sort_indices()
+    return mat.indptr.astype(np.int64), mat.indices.astype(np.int32), mat.data
+
+
+def get_propagated_features(
+    data_loader,
+    edge_list_key: str,
+    model_name: str,
+    features_key: str,
+    num_of_hops: int,
+) -> list[scipy.sparse.csr_matrix]:
+    """
+    Propagate the features 1 to num_of_hops hops with the operator of a model, computed once per graph and features.
+    Every hop is kept sparse in the binary cache of the data loader, so the next processes and the runs with more hops reuse it.
+    :param data_loader: ex. DataLoaderAttribute("Disease", "attribute prediction dataset")
+    :param edge_list_key: ex. "train_edge_list", or "edge_list" for the attribute prediction
+    :param model_name: the operator to propagate with, "GCN", "HGNN" or "HGNNP"
+    :param features_key: ex. "train_nodes_features_sparse"
+    :param num_of_hops: K, ex. 2
+    :return: [operator · X, operator^2 · X, ..., operator^K · X] in float32 csr matrices
+    """
+    operator_name: str = OPERATOR_NAME_DICT[model_name]
+    operator = None
+    hop_features = None
+    hop_features_list: list[scipy.sparse.csr_matrix] = list()
+    for hop in range(1, num_of_hops + 1):
+        hop_key: tuple = graph_factory.get_structure_key(
+            data_loader, edge_list_key, operator_name
+        ) + (features_key, hop)
+        if hop_key not in propagated_features_dict:
+            if operator is None:
+                operator = get_operator(data_loader, edge_list_key, model_name)
+                operator = scipy.sparse.csr_matrix(
+                    (
+                        operator.values().numpy(),
+                        operator.col_indices().numpy(),
+                        operator.crow_indices().numpy(),
+                    ),
+                    shape=tuple(operator.shape),
+                )
+            previous_features = (
+                scipy.sparse.csr_matrix(data_loader[features_key], dtype=np.float32)
+                if hop_features is None
+                else hop_features
+            )
+            array_prefix: str = (
+                f"propagated/{edge_list_key}/{operator_name}/{features_key}/hop_{hop}"
+            )
+            indptr, indices, data = data_loader.get_cached_arrays(
+                (
+                    array_prefix + "_indptr",
+                    array_prefix + "_indices",
+                    array_prefix + "_data",
+                ),
+                lambda: get_csr_arrays(operator @ previous_features),
+            )
+            propagated_features_dict[hop_key] = scipy.sparse.csr_matrix(
+                (data, indices, indptr), shape=previous_features.shape
+            )
+        hop_features = propagated_features_dict[hop_key]
+        hop_features_list.append(hop_features)
+    return hop_features_list
+
+
+class PropagatedFeatures:
+    """
+    This is the stand-in of the graph structure for SIGN, the features propagated 1 to K hops
+    Args:
+            hop_features (list): [operator · X, ..., operator^K · X] in tensors, dense or sparse csr.
+    Return:
+            self.to(device) (PropagatedFeatures): The features on the device, as dhg structures are moved.
+    """
+
+    def __init__(self, hop_features: list[torch.Tensor]):
+        self.hop_features = hop_features
+
+    def to(self, device):
+        return PropagatedFeatures(
+            [hop_features.to(device) for hop_features in self.hop_features]
+        )
+
+    def __iter__(self):
+        return iter(self.hop_features)
+
+    def __len__(self):
+        return len(self.hop_features)
+
+
+def get_propagated_features_in_tensor(
+    data_loader,
+    edge_list_key: str,
+    model_name: str,
+    features_key: str,
+    num_of_hops: int,
+    sparse: bool = False,
+) -> PropagatedFeatures:
+    """
+    :param sparse: keep every hop in a torch.sparse_csr_tensor instead of a dense tensor
+    :return: the features of get_propagated_features in float32 tensors, the SIGN model takes them in place of a graph
+    """
+    return PropagatedFeatures(
+        [
+            utils.sparse_features_to_tensor(hop_features, sparse=sparse)
+            for hop_features in get_propagated_features(
+                data_loader, edge_list_key, model_name, features_key, num_of_hops
+            )
+        ]
+    )
+
+
+class OperatorConv(nn.Module):
+    """
+    This is the convolution layer of GCN, HGNN and HGNNP run against a precomputed operator
+    Args:
+            in_channels (int): The number of input channels.
+            out_channels (int): The number of output channels.
+            bias (bool): Whether to learn the bias of the linear layer.
+            use_bn (bool): Whether to use batch normalization.
+            drop_rate (float): The dropout probability.
+            is_last (bool): The last layer applies neither the activation nor the dropout.
+    Return:
+            self.forward(X, operator) (tensor): The smoothed features of shape (num of nodes, out_channels).
+
+    The parameters are the ones of dhg.nn.GCNConv, HGNNConv and HGNNPConv,
+    so the state dict of a layer is loaded by the other.
+    """
+
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        bias: bool = True,
+        use_bn: bool = False,
+        drop_rate: float = 0.5,
+        is_last: bool = False,
+    ):
+        super().__init__()
+        self.is_last = is_last
+        self.bn = nn.BatchNorm1d(out_channels) if use_bn else None
+        self.act = nn.ReLU(inplace=True)
+        self.drop = nn.Dropout(drop_rate)
+        self.theta = nn.Linear(in_channels, out_channels, bias=bias)
+
+    def forward(self, X: torch.Tensor, operator: torch.Tensor) -> torch.Tensor:
+        X = self.theta(X)
+        X = torch.sparse.mm(operator, X)
+        if not self.is_last:
+            X = self.act(X)
+            if self.bn is not None:
+                X = self.bn(X)
+            X = self.drop(X)
+        return X
+
+
+class OperatorGNN(nn.Module):
+    """
+    This is the two layers model of dhg.models.GCN, HGNN and HGNNP, the model is given by the operator
+    Args:
+            in_channels (int): The number of input channels.
+            hid_channels (int): The number of hidden channels.
+            num_classes (int): The number of output channels.
+            use_bn (bool): Whether to use batch normalization.
+            drop_rate (float): The dropout probability of the first layer.
+    Return:
+            self.forward(X, operator) (tensor): The embeddings of the nodes, ex. operator = get_operator(data_loader, "train_edge_list", "HGNN").
+    """
+
+    def __init__(
+        self,
+        in_channels: int,
+        hid_channels: int,
+        num_classes: int,
+        use_bn: bool = False,
+        drop_rate: float = 0.5,
+    ):
+        super().__init__()
+        self.layers = nn.ModuleList()
+        self.layers.append(
+            OperatorConv(in_channels, hid_channels, use_bn=use_bn, drop_rate=drop_rate)
+        )
+        self.layers.append(
+            OperatorConv(hid_channels, num_classes, use_bn=use_bn, is_last=True)
+        )
+
+    def forward(self, X: torch.Tensor, operator: torch.Tensor) -> torch.Tensor:
+        for layer in self.layers:
+            X = layer(X, operator)
+        return X
+
+
+class SIGN(nn.Module):
+    """
+    This is the SIGN model, an MLP head over the features propagated 0 to K hops, which are computed once before training,
+    so an epoch costs about as much as a linear model, see https://arxiv.org/abs/2004.11198
+    Args:
+            in_channels (int): The number of input channels.
+            hid_channels (int): The number of hidden channels of every hop.
+            num_classes (int): The number of output channels.
+            num_of_hops (int): K, the number of propagated hops besides the features themselves.
+            use_bn (bool): Whether to use batch normalization.
+            drop_rate (float): The dropout probability.
+    Return:
+            self.forward(X, propagated_features) (tensor): The embeddings of the nodes,
+            ex. propagated_features = PropagatedFeatures(hop features of get_propagated_features).
+    """
+
+    def __init__(
+        self,
+        in_channels: int,
+        hid_channels: int,
+        num_classes: int,
+        num_of_hops: int = 2,
+        use_bn: bool = False,
+        drop_rate: float = 0.5,
+    ):
+        super().__init__()
+        self.hop_layers = nn.ModuleList(
+            [nn.Linear(in_channels, hid_channels) for _ in range(num_of_hops + 1)]
+        )
+        self.bn = nn.BatchNorm1d(hid_channels * (num_of_hops + 1)) if use_bn else None
+        self.act = nn.ReLU(inplace=True)
+        self.drop = nn.Dropout(drop_rate)
+        self.head = nn.Linear(hid_channels * (num_of_hops + 1), num_classes)
+
+    def forward(self, X: torch.Tensor, propagated_features) -> torch.Tensor:
+        """
+        :param X: the features, the hop 0
+        :param propagated_features: the features propagated 1 to K hops
+        """
+        return self.head(self.get_hidden(X, propagated_features))
+
+    def get_hidden(self, X: torch.Tensor, propagated_features) -> torch.Tensor:
+        """
+        :return: the input of the head, of shape (num of nodes, hid_channels * (K + 1))
+        """
+        hop_features_list: list[torch.Tensor] = [X] + list(propagated_features)
+        if len(hop_features_list) != len(self.hop_layers):
+            raise Exception(
+                f"SIGN takes {len(self.hop_layers) - 1} propagated hops, {len(hop_features_list) - 1} are given"
+            )
+        X = torch.cat(
+            [
+                hop_layer(hop_features)
+                for hop_layer, hop_features in zip(self.hop_layers, hop_features_list)
+            ],
+            dim=1,
+        )
+        X = self.act(X)
+        if self.bn is not None:
+            X = self.bn(X)
+        X = self.drop(X)
+        return X
@@ -0,0 +1,234 @@
+import numpy as np
+import torch
+import torch.nn as nn
+from dhg.nn import GCNConv, HGNNConv, HGNNPConv
+from scipy.sparse import csr_matrix
+
+import propagation
+
+# the distributions the negative components are drawn from
+NEGATIVE_DISTRIBUTION_LIST = ["uniform", "frequency"]
+
+
+def get_component_frequencies(features: csr_matrix) -> np.ndarray:
+    """
+    :param features: the multi-hot components of the nodes, ex. data_loader["train_nodes_features_sparse"] from components-mapping.txt
+    :return: the number of nodes of every component, ex. [3, 0, 12, ...]
+    """
+    return np.asarray(csr_matrix(features).sum(axis=0), dtype=np.float64).ravel()
+
+
+class NegativeSampler:
+    """
+    This is the sampler of the negative components of the sampled softmax
+    Args:
+            num_of_features (int): The number of components.
+            num_of_negatives (int): The number of negatives drawn at every step, shared by all the nodes of the step.
+            distribution (string): "uniform", or "frequency" to draw the components in proportion to
+            their number of nodes plus one, so every component can be drawn.
+            frequencies (ndarray): The number of nodes of every component, required by "frequency".
+            device (torch.device): The device of the negatives.
+    Return:
+            self.sample() (tuple): The negatives of shape (num_of_negatives,)
+            and their log expected counts log(num_of_negatives * Q(component)), the logQ correction.
+    """
+
+    def __init__(
+        self,
+        num_of_features: int,
+        num_of_negatives: int,
+        distribution: str = "uniform",
+        frequencies: np.ndarray = None,
+        device: torch.device = None,
+    ):
+        if distribution not in NEGATIVE_DISTRIBUTION_LIST:
+            raise Exception(
+                "Sorry, the negative distribution should be one of "
+                + ", ".join(NEGATIVE_DISTRIBUTION_LIST)
+            )
+        self.num_of_features = num_of_features
+        self.num_of_negatives = num_of_negatives
+        self.distribution = distribution
+        self.device = device
+
+        if "uniform" == distribution:
+            probabilities = np.full(num_of_features, 1 / num_of_features)
+        else:
+            if frequencies is None or len(frequencies) != num_of_features:
+                raise Exception(
+                    "Please give the frequencies of the components to draw the negatives by frequency"
+                )
+            probabilities = np.asarray(frequencies, dtype=np.float64) + 1
+            probabilities = probabilities / probabilities.sum()
+        self.probabilities = torch.from_numpy(probabilities).to(
+            device=device, dtype=torch.float32
+        )
+        self.log_expected_counts = torch.log(self.probabilities * num_of_negatives)
+
+    def sample(self) -> tuple[torch.Tensor, torch.Tensor]:
+        if "uniform" == self.distribution:
+            negatives = torch.randint(
+                self.num_of_features, (self.num_of_negatives,), device=self.device
+            )
+        else:
+            negatives = torch.multinomial(
+                self.probabilities, self.num_of_negatives, replacement=True
+            )
+        return negatives, self.log_expected_counts[negatives]
+
+
+def get_output_layer(net_model: nn.Module) -> nn.Linear:
+    """
+    :param net_model: dhg.models.GCN, HGNN, HGNNP, propagation.OperatorGNN or propagation.SIGN
+    :return: the linear layer which scores the components
+    """
+    if isinstance(net_model, propagation.SIGN):
+        return net_model.head
+    return net_model.layers[-1].theta
+
+
+def get_hidden_and_bias_scale(
+    net_model: nn.Module, X, graph
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Run the model up to its output layer, so the scores of any components are hidden @ weight[c] + bias_scale * bias[c].
+    The last graph layer smooths the scores, which is linear, so the hidden features are smoothed instead of the scores:
+    smoothing(X W^T + 1 b^T) = smoothing(X) W^T + smoothing(1) b^T
+    :param net_model: dhg.models.GCN, HGNN, HGNNP, propagation.OperatorGNN or propagation.SIGN
+    :param X: the input of the model
+    :param graph: the graph structure, the operator or the propagated features the model takes
+    :return: the hidden features of shape (num of nodes, hidden) and the scale of the bias of shape (num of nodes,)
+    """
+    if isinstance(net_model, propagation.SIGN):
+        hidden = net_model.get_hidden(X, graph)
+        return hidden, hidden.new_ones(len(hidden))
+
+    for layer in net_model.layers[:-1]:
+        X = layer(X, graph)
+    last_layer = net_model.layers[-1]
+    if not last_layer.is_last:
+        raise Exception("Sorry, the output layer should be the last layer.")
+    X = torch.cat([X, X.new_ones((len(X), 1))], dim=1)
+    if isinstance(last_layer, GCNConv):
+        X = graph.smoothing_with_GCN(X)
+    elif isinstance(last_layer, HGNNConv):
+        X = graph.smoothing_with_HGNN(X)
+    elif isinstance(last_layer, HGNNPConv):
+        X = graph.v2v(X, aggr="mean")
+    elif isinstance(last_layer, propagation.OperatorConv):
+        X = torch.sparse.mm(graph, X)
+    else:
+        raise Exception("Sorry, the output layer of the model has not been recognized.")
+    return X[:, :-1], X[:, -1]
+
+
+def get_positives_of_labels(
+    labels: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    :param labels: the multi-hot labels of the nodes, of shape (n, num of features),
+    in torch.sparse_csr_tensor, ex. data_loader["train_labels_sparse"], or any other sparse or dense tensor
+    :return: the node, the component and the gain of every positive, grouped by node,
+    and the number of positives of every node
+    """
+    if labels.layout != torch.sparse_csr:
+        if labels.layout == torch.strided:
+            labels = labels.to_sparse()
+        labels = labels.to_sparse_csr()
+
+    crow_indices = labels.crow_indices()
+    counts = crow_indices[1:] - crow_indices[:-1]
+    rows = torch.repeat_interleave(
+        torch.arange(len(counts), device=crow_indices.device), counts
+    )
+    cols = labels.col_indices()
+    gains = labels.values()
+
+    # the explicit zeros are no positives
+    is_positive = gains != 0
+    if not bool(is_positive.all()):
+        rows, cols, gains = rows[is_positive], cols[is_positive], gains[is_positive]
+        counts = torch.bincount(rows, minlength=len(counts))
+    return rows, cols, gains, counts
+
+
+def get_accidental_hits_mask(
+    rows: torch.Tensor, cols: torch.Tensor, num_of_nodes: int, negatives: torch.Tensor
+) -> torch.Tensor:
+    """
+    Find the negatives which are positives of the node, from the positives only, so no dense labels are indexed
+    :param rows: the node of every positive
+    :param cols: the component of every positive
+    :param num_of_nodes: n
+    :param negatives: the negative components, of shape (m,), may repeat
+    :return: the mask of the accidental hits, of shape (n, m)
+    """
+    sorted_negatives, order = torch.sort(negatives)
+    # the range of the sorted negatives equal to the component of every positive
+    lefts = torch.searchsorted(sorted_negatives, cols)
+    hit_counts = torch.searchsorted(sorted_negatives, cols, right=True) - lefts
+    positive_indexes = torch.repeat_interleave(
+        torch.arange(len(cols), device=cols.device), hit_counts
+    )
+    offsets = (
+        torch.arange(len(positive_indexes), device=cols.device)
+        - (torch.cumsum(hit_counts, dim=0) - hit_counts)[positive_indexes]
+    )
+
+    mask = torch.zeros(
+        (num_of_nodes, len(negatives)), dtype=torch.bool, device=negatives.device
+    )
+    mask[rows[positive_indexes], order[lefts[positive_indexes] + offsets]] = True
+    return mask
+
+
+def sampled_softmax_loss(
+    hidden: torch.Tensor,
+    bias_scale: torch.Tensor,
+    output_layer: nn.Linear,
+    labels: torch.Tensor,
+    negatives: torch.Tensor,
+    log_expected_counts: torch.Tensor,
+) -> torch.Tensor:
+    """
+    The sampled estimate of F.cross_entropy(scores, labels) with the multi-hot labels as targets.
+    Every node scores its own positive components and the shared negatives only. The positives are kept exactly.
+    The sum over the other components is estimated from the negatives, whose scores are corrected by -log(num_of_negatives * Q),
+    and the negatives which are positives of the node (the accidental hits) are masked.
+    :param hidden: the hidden features of the nodes of the loss, of shape (n, hidden)
+    :param bias_scale: of shape (n,)
+    :param output_layer: the linear layer which scores the components
+    :param labels: the multi-hot labels of the nodes, of shape (n, num of features), in torch.sparse_csr_tensor,
+    ex. data_loader["train_labels_sparse"], so only the positives are read. A dense tensor is accepted too
+    :param negatives: the negative components, of shape (m,)
+    :param log_expected_counts: log(m * Q(negative)), of shape (m,)
+    :return: the mean loss of the nodes
+    """
+    weight = output_layer.weight
+    bias = output_layer.bias
+    num_of_nodes = labels.shape[0]
+
+    # the positives of every node padded to the largest number of positives of a node
+    rows, cols, gains, counts = get_positives_of_labels(labels)
+    starts = torch.cumsum(counts, dim=0) - counts
+    slots = torch.arange(len(rows), device=rows.device) - starts[rows]
+    max_count = int(counts.max()) if len(rows) > 0 else 0
+
+    positive_scores = (hidden[rows] * weight[cols]).sum(dim=1)
+    if bias is not None:
+        positive_scores = positive_scores + bias_scale[rows] * bias[cols]
+    padded_positive_scores = hidden.new_full((num_of_nodes, max_count), float("-inf"))
+    padded_positive_scores[rows, slots] = positive_scores
+
+    negative_scores = torch.matmul(hidden, weight[negatives].t())
+    if bias is not None:
+        negative_scores = negative_scores + bias_scale[:, None] * bias[negatives]
+    negative_scores = negative_scores - log_expected_counts
+    negative_scores = negative_scores.masked_fill(
+        get_accidental_hits_mask(rows, cols, num_of_nodes, negatives), float("-inf")
+    )
+
+    log_normalizers = torch.logsumexp(
+        torch.cat([padded_positive_scores, negative_scores], dim=1), dim=1
+    )
+    return -(gains * (positive_scores - log_normalizers[rows])).sum() / num_of_nodes
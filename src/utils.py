@@ -1,6 +1,10 @@
+import io
 import os
 import platform
+import queue
 import random
+import re
+import threading
 import time
 from functools import wraps
 
@@ -13,31 +17,349 @@ from numpy import ndarray
 from scipy.sparse import csr_matrix
 
 # from tensorboardX import SummaryWriter
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, IterableDataset
 
+import profiling
 
-def read_file_via_lines(path: str, file_name: str) -> list[str]:
-    # root_path: str = get_root_path_of_project("PathwayGNN")
-    url: str = os.path.join(path, file_name)
-    # url: str = os.path.join(path, file_name)
-    res_list: list[str] = []
 
+def read_file_content(path: str, file_name: str) -> str:
+    """
+    Read a whole file in one call
+    :return: the content with the line endings normalised to "\n", without tabs and blank lines, "" if the file is missing
+    """
+    url: str = os.path.join(path, file_name)
     try:
-        file_handler = open(url, "r")
-        while True:
-            # Get next line from file
-            line = file_handler.readline()
-            line = line.replace("\r", "").replace("\n", "").replace("\t", "")
-
-            # If the line is empty then the end of file reached
-            if not line:
-                break
-            res_list.append(line)
+        with open(url, "rb") as file_handler:
+            content: str = file_handler.read().decode("utf-8")
     except Exception as e:
         print(e)
         print("we can't find the " + url + ", please make sure that the file exists")
-    finally:
-        return res_list
+        return ""
+
+    content = content.replace("\r\n", "\n").replace("\r", "\n").replace("\t", "")
+    # the blank lines are skipped, not taken as the end of the file
+    return re.sub(r"\n{2,}", "\n", content).strip("\n")
+
+
+def read_file_via_lines(path: str, file_name: str) -> list[str]:
+    """
+    :return: the non-blank lines of the file, ex. ["0,R-HSA-8936661", "1,R-HIV-175558", ...]
+    """
+    content: str = read_file_content(path, file_name)
+    return content.split("\n") if content else []
+
+
+def read_file_via_fields(
+    path: str, file_name: str, separator: str = ","
+) -> list[list[str]]:
+    """
+    :return: the fields of every line, ex. [["0", "R-HSA-8936661"], ["1", "R-HIV-175558"], ...]
+    """
+    return [
+        line_message.split(separator)
+        for line_message in read_file_via_lines(path, file_name)
+    ]
+
+
+def read_file_via_columns(
+    path: str, file_name: str, dtype_list: list, separator: str = ","
+) -> tuple[ndarray, ...]:
+    """
+    Parse a file with a fixed number of fields per line into typed columns, the parsing runs in the pandas C parser
+    :param dtype_list: the dtype of every column, ex. [np.int64, str] for nodes.txt of the splits
+    :return: one array per column
+    """
+    content: str = read_file_content(path, file_name)
+    if not content:
+        return tuple(np.zeros(0, dtype=dtype) for dtype in dtype_list)
+
+    data_frame = pd.read_csv(
+        io.StringIO(content),
+        sep=separator,
+        header=None,
+        dtype=dict(enumerate(dtype_list)),
+        keep_default_na=False,
+    )
+    if data_frame.shape[1] != len(dtype_list):
+        raise Exception(
+            "The lines of "
+            + os.path.join(path, file_name)
+            + " have %d fields, but %d dtypes are given"
+            % (data_frame.shape[1], len(dtype_list))
+        )
+    return tuple(
+        data_frame[column].to_numpy(dtype=dtype)
+        for column, dtype in enumerate(dtype_list)
+    )
+
+
+def read_file_via_ragged_int_arrays(
+    path: str, file_name: str, separator: str = ","
+) -> tuple[ndarray, ndarray]:
+    """
+    Parse a file of separated integers with any number of fields per line, ex. components-mapping.txt,
+    the part of a line up to the last ":" is skipped, ex. "0:" of "0:2204,2455"
+    :return: the CSR style (indptr, indices) of the integers of every line
+    """
+    content: str = read_file_content(path, file_name)
+    if not content:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    content = re.sub(r"^[^\n]*:", "", content, flags=re.MULTILINE)
+    indices: ndarray = np.array(
+        content.replace("\n", separator).split(separator)
+    ).astype(np.int64)
+
+    # the number of fields of every line is one more than its number of separators
+    characters: ndarray = np.frombuffer(content.encode("utf-8"), dtype=np.uint8)
+    num_of_separators_before: ndarray = np.cumsum(characters == ord(separator))
+    num_of_separators_by_line_end: ndarray = np.append(
+        num_of_separators_before[characters == ord("\n")],
+        num_of_separators_before[-1],
+    )
+    indptr: ndarray = np.zeros(len(num_of_separators_by_line_end) + 1, dtype=np.int64)
+    indptr[1:] = num_of_separators_by_line_end + np.arange(
+        1, len(num_of_separators_by_line_end) + 1
+    )
+    return indptr, indices
+
+
+def read_relationship_array(path: str, file_name: str = "relationship.txt") -> ndarray:
+    """
+    Read a whole relationship file in bulk
+    :param path: the directory of the file
+    :param file_name: ex. relationship.txt, relationship-mask.txt
+    :return: an int64 array of shape (number of lines, 3), the columns are node index, edge index and direction
+    """
+    url: str = os.path.join(path, file_name)
+    if not os.path.exists(url) or 0 == os.path.getsize(url):
+        print("we can't find the " + url + ", please make sure that the file exists")
+        return np.zeros((0, 3), dtype=np.int64)
+
+    relationship_array: ndarray = pd.read_csv(
+        url, names=["entity", "reaction", "type"], header=None, dtype=np.int64
+    ).to_numpy()
+    return relationship_array
+
+
+def read_stable_id_array(path: str, file_name: str) -> ndarray:
+    """
+    Read the stable ids of a file in bulk, ex. nodes.txt, edges.txt or components-all.txt
+    :return: the stable ids in the order of the lines, ex. ["R-HSA-8936661", "R-HIV-175558", ...], the i-th is the id of index i
+    """
+    url: str = os.path.join(path, file_name)
+    if not os.path.exists(url) or 0 == os.path.getsize(url):
+        print("we can't find the " + url + ", please make sure that the file exists")
+        return np.zeros(0, dtype=str)
+
+    stable_id_array: ndarray = (
+        pd.read_csv(
+            url, names=["stable_id"], header=None, dtype=str, keep_default_na=False
+        )["stable_id"]
+        .str.strip()
+        .to_numpy(dtype=str)
+    )
+    return stable_id_array
+
+
+def read_components_arrays(
+    path: str, file_name: str = "components-mapping.txt"
+) -> tuple[ndarray, ndarray]:
+    """
+    Read the components of every line of a components mapping file
+    :param file_name: components-mapping.txt, or components-mapping-mask.txt whose lines start with "node index:"
+    :return: the CSR style (indptr, indices) of the components of every line
+    """
+    return read_file_via_ragged_int_arrays(path, file_name)
+
+
+def read_first_column_array(path: str, file_name: str) -> ndarray:
+    """
+    :return: the leading index of every line, ex. 7 for the line "7,R-HSA-8951548"
+    """
+    first_column_array, _ = read_file_via_columns(path, file_name, [np.int64, str])
+    return first_column_array
+
+
+class StableIdIndex:
+    """
+    Intern the stable ids, ex. "R-HSA-8936661", into a global index space shared by several pathways
+    Args:
+            stable_ids (ndarray): The stable ids interned so far, the global index of stable_ids[i] is i.
+
+    The global indexes are given in the order the stable ids are first interned,
+    so interning the pathways one by one never renumbers the ids already given out.
+    """
+
+    def __init__(self, stable_ids: ndarray = None):
+        self.__index = pd.Index(
+            np.zeros(0, dtype=str) if stable_ids is None else stable_ids, dtype=object
+        )
+
+    def __len__(self):
+        return len(self.__index)
+
+    @property
+    def stable_ids(self) -> ndarray:
+        return self.__index.to_numpy(dtype=str)
+
+    def intern(self, stable_ids: ndarray) -> ndarray:
+        """
+        :param stable_ids: the stable ids of a file, ex. read_stable_id_array(path, "nodes.txt")
+        :return: the int64 global index of every stable id, the unseen ones are appended to the index
+        """
+        global_indexes: ndarray = self.__index.get_indexer(stable_ids)
+        unseen: ndarray = global_indexes < 0
+        if unseen.any():
+            unseen_stable_ids: ndarray = pd.unique(np.asarray(stable_ids)[unseen])
+            self.__index = self.__index.append(
+                pd.Index(unseen_stable_ids, dtype=object)
+            )
+            global_indexes[unseen] = self.__index.get_indexer(
+                np.asarray(stable_ids)[unseen]
+            )
+        return global_indexes.astype(np.int64)
+
+    def lookup(self, stable_ids) -> ndarray:
+        """
+        :return: the int64 global index of every stable id, -1 for the ids never interned
+        """
+        return self.__index.get_indexer(stable_ids).astype(np.int64)
+
+
+class HyperEdgeIncidence:
+    """
+    CSR style incidence of hyper edges and nodes
+    Args:
+            edges (ndarray): The edge indexes in the order they first appear in the relationship file.
+            indptr (ndarray): The nodes of edges[i] are indices[indptr[i]:indptr[i + 1]].
+            indices (ndarray): The node indexes, in the order they appear in the relationship file.
+            direction (ndarray): The direction of every (edge, node) pair, -1 for input and 1 for output.
+
+    The dict and list of lists views are derived on demand, ex. {0: [351, 773, 1397], 1: [...]} and [[351, 773, 1397], [...]]
+    """
+
+    def __init__(
+        self, edges: ndarray, indptr: ndarray, indices: ndarray, direction: ndarray
+    ):
+        self.edges = edges
+        self.indptr = indptr
+        self.indices = indices
+        self.direction = direction
+
+    @classmethod
+    def from_relationship_array(cls, relationship_array: ndarray):
+        """
+        :param relationship_array: rows of (node index, edge index, direction), see read_relationship_array
+        """
+        node_column: ndarray = relationship_array[:, 0]
+        edge_column: ndarray = relationship_array[:, 1]
+
+        # order the edges by their first appearance, and keep the order of the nodes inside every edge
+        unique_edges, first_appearance, edge_rank = np.unique(
+            edge_column, return_index=True, return_inverse=True
+        )
+        appearance_order: ndarray = np.argsort(first_appearance, kind="stable")
+        rank_in_appearance_order: ndarray = np.empty_like(appearance_order)
+        rank_in_appearance_order[appearance_order] = np.arange(len(appearance_order))
+        row_order: ndarray = np.argsort(
+            rank_in_appearance_order[edge_rank.reshape(-1)], kind="stable"
+        )
+
+        indptr: ndarray = np.zeros(len(unique_edges) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(
+            np.bincount(edge_rank.reshape(-1), minlength=len(unique_edges))[
+                appearance_order
+            ]
+        )
+
+        return cls(
+            unique_edges[appearance_order].astype(np.int64),
+            indptr,
+            node_column[row_order].astype(np.int64),
+            relationship_array[row_order, 2].astype(np.int64),
+        )
+
+    @classmethod
+    def from_relationship_array_by_direction(cls, relationship_array: ndarray):
+        """
+        Split the relationship into all, input and output incidences in one go
+        :return: (incidence regardless direction, incidence of input nodes, incidence of output nodes)
+        """
+        direction_column: ndarray = relationship_array[:, 2]
+        return (
+            cls.from_relationship_array(relationship_array),
+            cls.from_relationship_array(relationship_array[direction_column < 0]),
+            cls.from_relationship_array(relationship_array[direction_column > 0]),
+        )
+
+    def __len__(self):
+        return len(self.edges)
+
+    def to_list(self) -> list[list[int]]:
+        """
+        :return: the nodes of every edge, in the order of self.edges
+        """
+        return decode_arrays_to_list_of_lists(self.indptr, self.indices)
+
+    def to_dict(self) -> dict[int, list[int]]:
+        """
+        :return: {edge index: nodes of the edge}
+        """
+        return dict(zip(self.edges.tolist(), self.to_list()))
+
+    def to_csr_matrix(self, num_of_nodes: int, edge_indexes=None) -> csr_matrix:
+        """
+        Encode the nodes of the edges as a sparse multi-hot matrix, only the asked rows are materialised
+        :param num_of_nodes: the number of columns
+        :param edge_indexes: the edge index of every row, ex. the train edge mask; None for the rows in the order of self.edges
+        :return: a float32 csr_matrix of shape (number of rows, num_of_nodes), an edge without nodes gets an empty row
+        """
+        if edge_indexes is None:
+            positions: ndarray = np.arange(len(self.edges))
+        else:
+            edge_indexes = np.asarray(edge_indexes, dtype=np.int64).reshape(-1)
+            edge_order: ndarray = np.argsort(self.edges, kind="stable")
+            positions = np.searchsorted(self.edges, edge_indexes, sorter=edge_order)
+            positions = np.minimum(positions, max(len(self.edges) - 1, 0))
+            if len(self.edges) > 0:
+                positions = edge_order[positions]
+                found: ndarray = self.edges[positions] == edge_indexes
+            else:
+                found = np.zeros(len(edge_indexes), dtype=bool)
+            positions = np.where(found, positions, -1)
+
+        starts: ndarray = np.where(positions >= 0, self.indptr[:-1][positions], 0)
+        lengths: ndarray = np.where(
+            positions >= 0, np.diff(self.indptr)[positions], 0
+        )
+        row_indptr: ndarray = np.zeros(len(positions) + 1, dtype=np.int64)
+        row_indptr[1:] = np.cumsum(lengths)
+        gather: ndarray = np.repeat(starts - row_indptr[:-1], lengths) + np.arange(
+            row_indptr[-1]
+        )
+
+        edges_features = csr_matrix(
+            (
+                np.ones(int(row_indptr[-1]), dtype=np.float32),
+                self.indices[gather],
+                row_indptr,
+            ),
+            shape=(len(positions), num_of_nodes),
+        )
+        # the same node listed twice counts twice, as in encode_edges_features
+        edges_features.sum_duplicates()
+        return edges_features
+
+    def to_list_by_edge_index(self, num_of_edges: int) -> list[list[int]]:
+        """
+        :return: the i-th element is the nodes of edge i, an empty list for the edge without nodes
+        """
+        list_of_edge_of_nodes: list[list[int]] = [list() for _ in range(num_of_edges)]
+        for edge_index, list_of_nodes in zip(self.edges.tolist(), self.to_list()):
+            if edge_index < num_of_edges:
+                list_of_edge_of_nodes[edge_index] = list_of_nodes
+        return list_of_edge_of_nodes
 
 
 def get_sys_platform():
@@ -90,7 +412,7 @@ def normalize_sparse_matrix(mat):
 
     # np.diag() 应该也可以
     # 这里就是生成 对角矩阵
-    r_mat_inv = sp.diags(r_inv)
+    r_mat_inv = sp.sparse.diags(r_inv)
 
     # 点乘,得到归一化后的结果
     # 注意是 归一化矩阵 点乘 原矩阵，别搞错了!!
@@ -98,36 +420,134 @@ def normalize_sparse_matrix(mat):
     return mat
 
 
-def get_normalized_features_in_tensor(features) -> torch.Tensor:
+def get_normalized_features_in_tensor(features, sparse: bool = False) -> torch.Tensor:
+    """
+    Row-normalize the features and convert them to a float32 tensor
+    :param features: a dense or sparse matrix, ex. [[1, 0, 1], [0, 1, 0]]
+    :param sparse: return a torch.sparse_csr_tensor which only stores the non-zeros, instead of a dense tensor
+    :return: the normalized features in tensor, ex. [[0.5, 0, 0.5], [0, 1, 0]]
+    """
     features_mat: csr_matrix = csr_matrix(features, dtype=np.float32)
     features_mat: csr_matrix = normalize_sparse_matrix(features_mat)
+    if sparse:
+        return sparse_features_to_tensor(features_mat, sparse=True)
     features: torch.Tensor = torch.FloatTensor(np.array(features_mat.todense()))
     return features
 
 
+def encode_node_features_to_sparse(
+    components_mapping_list: list[list[int]],
+    num_of_nodes: int,
+    num_of_feature_dimension: int,
+) -> csr_matrix:
+    """
+    Encode the components of the nodes as a sparse multi-hot matrix
+    :param components_mapping_list: the components of every node, ex. [[2044, 2204], [2452, 2455], [6]...]
+    :param num_of_nodes: the number of rows, the nodes after components_mapping_list get no component
+    :param num_of_feature_dimension: the number of columns
+    :return: a float32 csr_matrix of shape (num_of_nodes, num_of_feature_dimension)
+    """
+    indptr, indices = encode_list_of_lists_to_arrays(
+        components_mapping_list[:num_of_nodes]
+    )
+    return encode_node_features_to_sparse_from_arrays(
+        indptr, indices, num_of_nodes, num_of_feature_dimension
+    )
+
+
+def encode_node_features_to_sparse_from_arrays(
+    indptr: ndarray,
+    indices: ndarray,
+    num_of_nodes: int,
+    num_of_feature_dimension: int,
+) -> csr_matrix:
+    """
+    The same as encode_node_features_to_sparse, but the components are given as CSR style (indptr, indices)
+    """
+    indptr = indptr[: num_of_nodes + 1]
+    full_indptr: ndarray = np.full(num_of_nodes + 1, indptr[-1], dtype=np.int64)
+    full_indptr[: len(indptr)] = indptr
+    nodes_features = csr_matrix(
+        (
+            np.ones(int(full_indptr[-1]), dtype=np.float32),
+            indices[: full_indptr[-1]],
+            full_indptr,
+        ),
+        shape=(num_of_nodes, num_of_feature_dimension),
+    )
+    # the same component listed twice counts twice, as in the dense encoding
+    nodes_features.sum_duplicates()
+    return nodes_features
+
+
 def encode_node_features(
     components_mapping_list: list[list[int]],
     num_of_nodes: int,
     num_of_feature_dimension: int,
 ) -> list[list[int]]:
-    row = []
-    column = []
-    val = []
-    for line_index in range(num_of_nodes):
-        features_of_one_entity = components_mapping_list[line_index]
-        for feature_index in features_of_one_entity:
-            row.append(line_index)
-            column.append(feature_index)
-            val.append(1)
-
-    component_csc_mat = csr_matrix(
-        (val, (row, column)), shape=(num_of_nodes, num_of_feature_dimension)
+    component_csc_mat = encode_node_features_to_sparse(
+        components_mapping_list, num_of_nodes, num_of_feature_dimension
+    )
+    nodes_features: list[list[int]] = (
+        component_csc_mat.astype(np.int64).toarray().tolist()
     )
-    nodes_features: list[list[int]] = component_csc_mat.toarray().tolist()
 
     return nodes_features
 
 
+def sparse_features_to_tensor(
+    features: csr_matrix, sparse: bool = False
+) -> torch.Tensor:
+    """
+    Convert the sparse features to a float32 tensor, without going through python lists
+    :param features: a scipy sparse matrix, ex. data_loader["train_nodes_features_sparse"]
+    :param sparse: return a torch.sparse_csr_tensor instead of a dense tensor
+    :return: the features in tensor
+    """
+    features = csr_matrix(features, dtype=np.float32)
+    if sparse:
+        return torch.sparse_csr_tensor(
+            torch.from_numpy(features.indptr.astype(np.int64)),
+            torch.from_numpy(features.indices.astype(np.int64)),
+            torch.from_numpy(features.data),
+            size=features.shape,
+        )
+    return torch.from_numpy(features.toarray())
+
+
+def encode_list_of_lists_to_arrays(
+    list_of_lists: list[list[int]],
+) -> tuple[ndarray, ndarray]:
+    """
+    Flatten a ragged list of lists into CSR style arrays
+    :param list_of_lists: ex. [[1,2,3], [4], [5,6]]
+    :return: indptr ex. [0,3,4,6] and indices ex. [1,2,3,4,5,6]
+    """
+    indptr: ndarray = np.zeros(len(list_of_lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(single_list) for single_list in list_of_lists])
+    indices: ndarray = np.fromiter(
+        (element for single_list in list_of_lists for element in single_list),
+        dtype=np.int64,
+        count=int(indptr[-1]),
+    )
+    return indptr, indices
+
+
+def decode_arrays_to_list_of_lists(indptr: ndarray, indices: ndarray) -> list[list[int]]:
+    """
+    The inverse of encode_list_of_lists_to_arrays
+    :param indptr: ex. [0,3,4,6]
+    :param indices: ex. [1,2,3,4,5,6]
+    :return: ex. [[1,2,3], [4], [5,6]]
+    """
+    indices_list: list[int] = indices.tolist()
+    indptr_list: list[int] = indptr.tolist()
+    return [
+        indices_list[indptr_list[i] : indptr_list[i + 1]]
+        for i in range(len(indptr_list) - 1)
+    ]
+
+
 def decode_node_features(node_features: list[int]):
     attributes_of_single_node: list[int] = list()
     for index, value in enumerate(node_features):
@@ -165,6 +585,27 @@ def encode_edges_features(
     return edges_features
 
 
+def cross_entropy_with_sparse_labels(
+    prediction: torch.Tensor, labels: torch.Tensor
+) -> torch.Tensor:
+    """
+    The same as F.cross_entropy(prediction, labels.to_dense()) with probability labels, without the dense labels
+    :param prediction: the scores of shape n*m
+    :param labels: a torch.sparse_csr_tensor of shape n*m, ex. data_loader["train_labels_sparse"]
+    :return: the mean over the rows of -sum(labels * log_softmax(prediction))
+    """
+    log_probabilities: torch.Tensor = F.log_softmax(prediction, dim=1)
+    crow_indices: torch.Tensor = labels.crow_indices()
+    rows: torch.Tensor = torch.repeat_interleave(
+        torch.arange(labels.shape[0], device=crow_indices.device),
+        crow_indices[1:] - crow_indices[:-1],
+    )
+    loss: torch.Tensor = -(
+        labels.values() * log_probabilities[rows, labels.col_indices()]
+    ).sum() / max(labels.shape[0], 1)
+    return loss
+
+
 def read_out_to_generate_single_hyper_edge_embedding(
     list_of_nodes_for_single_hyper_edge: list[int], nodes_features: torch.Tensor
 ) -> torch.Tensor:
@@ -185,59 +626,220 @@ def read_out_to_generate_single_hyper_edge_embedding(
     return edge_embedding
 
 
+def read_out_to_generate_hyper_edges_embeddings(
+    indptr,
+    indices,
+    nodes_features: torch.Tensor,
+    read_out_method: str = "mean",
+    attention_weight: torch.Tensor = None,
+) -> torch.Tensor:
+    """
+    Generate the embeddings of all the hyper edges at once from the CSR incidence, without a python loop over the edges.
+    The result stays on the device and in the dtype of nodes_features, and gradients flow back to nodes_features.
+    :param indptr: the nodes of edge i are indices[indptr[i]:indptr[i + 1]], ndarray or tensor, ex. HyperEdgeIncidence.indptr
+    :param indices: the node indexes, ndarray or tensor
+    :param nodes_features: all the nodes features shape n*m, n is the number of nodes, m is the dimension of attributes.
+    :param read_out_method: "mean", "sum", "max" or "attention"
+    :param attention_weight: the tensor of shape m for "attention", the nodes of an edge are weighted by
+    the softmax of nodes_features @ attention_weight over the edge
+    :return: the edges embeddings of shape (number of edges, m), an edge without nodes gets zeros
+    """
+    device = nodes_features.device
+    indptr = torch.as_tensor(indptr, dtype=torch.long, device=device)
+    indices = torch.as_tensor(indices, dtype=torch.long, device=device)
+    num_of_edges: int = len(indptr) - 1
+    num_of_nodes_of_edges: torch.Tensor = indptr[1:] - indptr[:-1]
+    edge_of_entries: torch.Tensor = torch.repeat_interleave(
+        torch.arange(num_of_edges, device=device), num_of_nodes_of_edges
+    )
+    nodes_features_of_entries: torch.Tensor = nodes_features[indices]
+    edges_embeddings: torch.Tensor = nodes_features.new_zeros(
+        (num_of_edges,) + tuple(nodes_features.shape[1:])
+    )
+
+    if "max" == read_out_method:
+        return edges_embeddings.scatter_reduce(
+            0,
+            edge_of_entries.view(-1, 1).expand_as(nodes_features_of_entries),
+            nodes_features_of_entries,
+            reduce="amax",
+            include_self=False,
+        )
+
+    if "attention" == read_out_method:
+        if attention_weight is None:
+            raise Exception('The attention_weight is needed for "attention" read out')
+        scores: torch.Tensor = nodes_features_of_entries @ attention_weight
+        max_scores: torch.Tensor = scores.new_zeros(num_of_edges).scatter_reduce(
+            0, edge_of_entries, scores, reduce="amax", include_self=False
+        )
+        # softmax over the nodes of every edge
+        exp_scores: torch.Tensor = torch.exp(scores - max_scores[edge_of_entries])
+        sum_exp_scores: torch.Tensor = scores.new_zeros(num_of_edges).index_add(
+            0, edge_of_entries, exp_scores
+        )
+        nodes_features_of_entries = nodes_features_of_entries * (
+            exp_scores / sum_exp_scores[edge_of_entries]
+        ).unsqueeze(1)
+
+    elif read_out_method not in ["mean", "sum"]:
+        raise Exception(
+            'The read_out_method should be "mean", "sum", "max" or "attention"'
+        )
+
+    edges_embeddings = edges_embeddings.index_add(
+        0, edge_of_entries, nodes_features_of_entries
+    )
+
+    if "mean" == read_out_method:
+        edges_embeddings = edges_embeddings / num_of_nodes_of_edges.clamp(min=1).to(
+            edges_embeddings.dtype
+        ).unsqueeze(1)
+
+    return edges_embeddings
+
+
 def read_out_to_generate_multi_hyper_edges_embeddings_from_edge_dict(
-    edge_to_nodes_dict: dict[int, list[int]], nodes_features: torch.Tensor
+    edge_to_nodes_dict: dict[int, list[int]],
+    nodes_features: torch.Tensor,
+    read_out_method: str = "mean",
 ):
     """
     :param edge_to_nodes_dict: the key is the index of the edge and the value is a list of surrounding nodes. ex. {0:[1,2,3], 1:[2,4,5]}
     :param nodes_features: all the nodes features shape n*m, n is the number of nodes, m is the dimension of attributes.
     :return: after readout(mean method), we get multi edges embeddings.
     """
-    multi_hyper_edges_embeddings_list: list[list[float]] = list()
-    for edge, list_of_nodes in edge_to_nodes_dict.items():
-        edge_embedding = read_out_to_generate_single_hyper_edge_embedding(
-            list_of_nodes, nodes_features
-        )
-        multi_hyper_edges_embeddings_list.append(edge_embedding.tolist())
-
-    multi_hyper_edges_embeddings_tensor = torch.Tensor(
-        multi_hyper_edges_embeddings_list
+    return read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
+        list(edge_to_nodes_dict.values()), nodes_features, read_out_method
     )
 
-    return multi_hyper_edges_embeddings_tensor
-
 
 def read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
-    edge_to_nodes_list: list[list[int]], nodes_features: torch.Tensor
+    edge_to_nodes_list: list[list[int]],
+    nodes_features: torch.Tensor,
+    read_out_method: str = "mean",
 ):
     """
     :param edge_to_nodes_list: a list of surrounding nodes of multi edges. ex. [[1,2,3], [2,4,5].....]
     :param nodes_features: all the nodes features shape n*m, n is the number of nodes, m is the dimension of attributes.
     :return: after readout(mean method), we get multi edges embeddings.
     """
-    multi_hyper_edges_embeddings_list: list[list[float]] = list()
-    for list_of_nodes in edge_to_nodes_list:
-        edge_embedding = read_out_to_generate_single_hyper_edge_embedding(
-            list_of_nodes, nodes_features
-        )
-        multi_hyper_edges_embeddings_list.append(edge_embedding.tolist())
-
-    multi_hyper_edges_embeddings_tensor = torch.Tensor(
-        multi_hyper_edges_embeddings_list
+    indptr, indices = encode_list_of_lists_to_arrays(edge_to_nodes_list)
+    return read_out_to_generate_hyper_edges_embeddings(
+        indptr, indices, nodes_features, read_out_method
     )
 
-    return multi_hyper_edges_embeddings_tensor
 
+class EdgesEmbeddingsCache:
+    """
+    Memoize the edges embeddings of the splits during a run, they only depend on the fixed nodes features
+    Args:
+            device (torch.device): The device to keep the edges embeddings on.
+    Return:
+            self.get(name, edge_to_nodes_list, nodes_features) (Tensor): The edges embeddings of the split on the device.
 
-def filter_prediction_(prediction: torch.Tensor, filter_indexes_list: list[list[int]]):
-    if prediction.shape[0] != len(filter_indexes_list):
-        raise Exception(
-            "Error! The prediction and filter_indexes_list not match in dimension"
+    The edges embeddings of a split are read out again only if its edge list or the nodes features change,
+    i.e. another list or tensor, an in-place update of the tensor (tracked by its version counter) or another read out method,
+    or if the nodes features require grad, as the read out is part of the autograd graph then.
+    """
+
+    def __init__(self, device: torch.device):
+        self.device = device
+        self.__cache_dict: dict[str, tuple] = dict()
+
+    def get(
+        self,
+        name: str,
+        edge_to_nodes_list: list[list[int]],
+        nodes_features: torch.Tensor,
+        read_out_method: str = "mean",
+    ) -> torch.Tensor:
+        """
+        :param name: the name of the split, ex. "train", "validation" or "test"
+        :param edge_to_nodes_list: a list of surrounding nodes of multi edges. ex. [[1,2,3], [2,4,5].....]
+        :param nodes_features: all the nodes features shape n*m
+        :return: the edges embeddings on self.device
+        """
+        features_key: tuple = (
+            len(edge_to_nodes_list),
+            nodes_features._version,
+            tuple(nodes_features.shape),
+            read_out_method,
         )
+        cached = self.__cache_dict.get(name)
+        # the edge list and the nodes features are kept with the embeddings and compared by identity,
+        # an id or a data pointer could be reused by another object once the first one is freed
+        if (
+            cached is not None
+            and cached[0] is edge_to_nodes_list
+            and cached[1] is nodes_features
+            and cached[2] == features_key
+        ):
+            return cached[3]
+
+        edges_embeddings: torch.Tensor = (
+            read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
+                edge_to_nodes_list, nodes_features, read_out_method
+            ).to(self.device)
+        )
+        if not nodes_features.requires_grad:
+            self.__cache_dict[name] = (
+                edge_to_nodes_list,
+                nodes_features,
+                features_key,
+                edges_embeddings,
+            )
+        return edges_embeddings
+
 
-    for i in range(prediction.shape[0]):
-        filter_indexes = filter_indexes_list[i]
-        prediction[i][filter_indexes] = 0
+def get_filter_indexes(
+    filter_indexes_list: list[list[int]], device: torch.device = None
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Flatten the indexes to filter of every row, build it once per split and reuse it every epoch
+    :param filter_indexes_list: the columns to filter of every row, ex. [[1,2,3], [2,4,5].....]
+    :param device: the device of the prediction
+    :return: the row indexes and the column indexes, ex. [0,0,0,1,1,1...] and [1,2,3,2,4,5...]
+    """
+    indptr, indices = encode_list_of_lists_to_arrays(filter_indexes_list)
+    rows: torch.Tensor = torch.repeat_interleave(
+        torch.arange(len(filter_indexes_list)), torch.from_numpy(np.diff(indptr))
+    )
+    return rows.to(device), torch.from_numpy(indices).to(device)
+
+
+def filter_prediction_(
+    prediction: torch.Tensor, filter_indexes_list, value: float = 0
+) -> torch.Tensor:
+    """
+    Set the known members of every row of the prediction to value in place, in one index_put_
+    :param prediction: the scores of shape n*m
+    :param filter_indexes_list: the columns to filter of every row ex. [[1,2,3], [2,4,5].....],
+    or the (rows, cols) built by get_filter_indexes, or a torch sparse mask of shape n*m
+    :param value: 0 as before, or float("-inf") so the filtered members never outrank the others
+    :return: the prediction
+    """
+    if isinstance(filter_indexes_list, torch.Tensor):
+        if tuple(filter_indexes_list.shape) != tuple(prediction.shape):
+            raise Exception(
+                "Error! The prediction and filter_indexes_list not match in dimension"
+            )
+        mask = filter_indexes_list.to_sparse_coo().coalesce()
+        rows, cols = mask.indices().to(prediction.device)
+    elif isinstance(filter_indexes_list, tuple):
+        rows, cols = filter_indexes_list
+    else:
+        if prediction.shape[0] != len(filter_indexes_list):
+            raise Exception(
+                "Error! The prediction and filter_indexes_list not match in dimension"
+            )
+        rows, cols = get_filter_indexes(filter_indexes_list, prediction.device)
+
+    prediction.index_put_(
+        (rows, cols),
+        torch.tensor(value, dtype=prediction.dtype, device=prediction.device),
+    )
+    return prediction
 
 
 class ModelEngine(object):
@@ -362,7 +964,9 @@ def timeit(method):
     @wraps(method)
     def wrapper(*args, **kw):
         ts = time.time()
-        result = method(*args, **kw)
+        # the call is also a span of the profiler, the spans of the functions it calls are nested in it
+        with profiling.span(method.__qualname__):
+            result = method(*args, **kw)
         te = time.time()
         if "log_time" in kw:
             name = kw.get("log_name", method.__name__.upper())
@@ -378,6 +982,43 @@ def timeit(method):
     return wrapper
 
 
+class TensorBatchLoader:
+    """
+    Serve the batches of a dataset which stores its samples as tensors, ex. RatingDataset or PairwiseNegativeDataset.
+    A batch is a slice or an index gather of every stored tensor,
+    unlike DataLoader which calls __getitem__ once per sample and stacks the samples afterwards.
+    Args:
+            dataset (Dataset): A dataset with a tensors property, the tensors share their first dimension.
+            batch_size (int): The number of samples of a batch, the last batch may be smaller.
+            shuffle (bool): Whether to draw a new permutation of the samples on every epoch.
+    Return:
+            iter(self): The batches of an epoch, each one a tuple of tensors in the order of dataset.tensors.
+    """
+
+    def __init__(self, dataset, batch_size: int, shuffle: bool = False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __iter__(self):
+        tensors: tuple[torch.Tensor, ...] = self.dataset.tensors
+        num_of_samples: int = len(self.dataset)
+        if self.shuffle:
+            permutation = torch.randperm(num_of_samples).to(tensors[0].device)
+        for start in range(0, num_of_samples, self.batch_size):
+            if self.shuffle:
+                indexes = permutation[start : start + self.batch_size]
+                yield tuple(tensor[indexes] for tensor in tensors)
+            else:
+                yield tuple(
+                    tensor[start : start + self.batch_size] for tensor in tensors
+                )
+
+    def __len__(self):
+        """Get the number of batches of an epoch."""
+        return -(-len(self.dataset) // self.batch_size)
+
+
 class RatingDataset(Dataset):
     """Wrapper, convert <user, item, rating> Tensor into Pytorch Dataset."""
 
@@ -402,6 +1043,11 @@ class RatingDataset(Dataset):
         """Get the size of the dataset."""
         return self.entity_tensor.size(0)
 
+    @property
+    def tensors(self) -> tuple[torch.Tensor, ...]:
+        """Get the stored tensors, in the order of __getitem__."""
+        return self.entity_tensor, self.reaction_tensor, self.type_tensor
+
 
 def instance_bce_loader(data, batch_size, device, num_negative):
     """Instance a train DataLoader that have rating."""
@@ -444,7 +1090,7 @@ def instance_bce_loader(data, batch_size, device, num_negative):
         type_tensor=torch.FloatTensor(type).to(device),
     )
     print(f"Making RatingDataset of length {len(dataset)}")
-    return DataLoader(dataset, batch_size=batch_size, shuffle=True)
+    return TensorBatchLoader(dataset, batch_size=batch_size, shuffle=True)
 
 
 class PairwiseNegativeDataset(Dataset):
@@ -471,6 +1117,75 @@ class PairwiseNegativeDataset(Dataset):
         """Get the size of the dataset."""
         return self.user_tensor.size(0)
 
+    @property
+    def tensors(self) -> tuple[torch.Tensor, ...]:
+        """Get the stored tensors, in the order of __getitem__."""
+        return self.user_tensor, self.pos_item_tensor, self.neg_item_tensor
+
+
+def get_sorted_interaction_keys(
+    entity_ids: ndarray, reaction_ids: ndarray, n_reaction: int
+) -> ndarray:
+    """
+    Encode the interactions as sorted int64 keys, the reactions of an entity are a contiguous run of the keys as in a CSR matrix
+    :param entity_ids: ex. [0, 0, 1]
+    :param reaction_ids: ex. [3, 1, 1]
+    :param n_reaction: the number of reactions, every reaction id is less than it, ex. 4
+    :return: the unique keys entity_id * n_reaction + reaction_id in ascending order, ex. [1, 3, 5]
+    An Exception is raised if an entity interacts with all the reactions.
+    """
+    entity_ids = np.asarray(entity_ids, dtype=np.int64)
+    reaction_ids = np.asarray(reaction_ids, dtype=np.int64)
+    if len(reaction_ids) > 0 and (
+        reaction_ids.min() < 0 or reaction_ids.max() >= n_reaction
+    ):
+        raise Exception(f"The reaction ids should be in the range [0, {n_reaction})")
+    interaction_keys: ndarray = np.unique(entity_ids * n_reaction + reaction_ids)
+
+    # an entity interacting with all the reactions has no negative reaction, the rejection would never end
+    num_of_interactions = np.bincount(interaction_keys // n_reaction)
+    saturated_entity_ids = np.flatnonzero(num_of_interactions >= n_reaction)
+    if len(saturated_entity_ids) > 0:
+        raise Exception(
+            f"The entities {saturated_entity_ids.tolist()} interact with all the {n_reaction} reactions, "
+            f"no negative reaction can be sampled for them"
+        )
+    return interaction_keys
+
+
+def sample_negative_reactions(
+    entity_ids: ndarray,
+    interaction_keys: ndarray,
+    n_reaction: int,
+    rng: np.random.Generator = None,
+) -> ndarray:
+    """
+    Draw one reaction that the entity doesn't interact with for every entity id, uniformly.
+    The candidates are drawn in bulk, the few of them which collide with an interaction are drawn again.
+    :param entity_ids: ex. [0, 0, 1]
+    :param interaction_keys: the output of get_sorted_interaction_keys, which guarantees every entity has a negative reaction
+    :param n_reaction: the number of reactions
+    :param rng: the random generator, a new unseeded one by default
+    :return: the negative reaction ids, ex. [2, 0, 3]
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    entity_ids = np.asarray(entity_ids, dtype=np.int64)
+    negative_reaction_ids = rng.integers(0, n_reaction, size=len(entity_ids))
+    pending_indexes = np.arange(len(entity_ids))
+    while len(pending_indexes) > 0 and len(interaction_keys) > 0:
+        candidate_keys = (
+            entity_ids[pending_indexes] * n_reaction
+            + negative_reaction_ids[pending_indexes]
+        )
+        positions = np.searchsorted(interaction_keys, candidate_keys)
+        positions[positions == len(interaction_keys)] = 0
+        pending_indexes = pending_indexes[interaction_keys[positions] == candidate_keys]
+        negative_reaction_ids[pending_indexes] = rng.integers(
+            0, n_reaction, size=len(pending_indexes)
+        )
+    return negative_reaction_ids
+
 
 def instance_bpr_loader(data, batch_size, device, n_entity, n_reaction):
     """Instance a pairwise Data_loader for training.
@@ -478,88 +1193,293 @@ def instance_bpr_loader(data, batch_size, device, n_entity, n_reaction):
     A batch of data in this DataLoader is suitable for a binary cross-entropy loss.
     # todo implement the item popularity-biased sampling
     """
-    entity, pos_reaction, neg_reaction = [], [], []
-    entity_id_pool = [i for i in range(n_entity)]
-    reaction_id_pool = [i for i in range(n_reaction)]
+    entity = data["entity"].to_numpy(dtype=np.int64, copy=True)
+    pos_reaction = data["reaction"].to_numpy(dtype=np.int64, copy=True)
+    interaction_keys = get_sorted_interaction_keys(entity, pos_reaction, n_reaction)
+    neg_reaction = sample_negative_reactions(entity, interaction_keys, n_reaction)
 
-    interact_status = (
-        data.groupby("entity")["reaction"]
-        .apply(set)
-        .reset_index()
-        .rename(columns={"reaction": "observed_reaction"})
-    )
-    interact_status["unobserved_reaction"] = interact_status["observed_reaction"].apply(
-        lambda x: set(reaction_id_pool) - x
-    )
-    train_ratings = pd.merge(
-        data,
-        interact_status[["entity", "unobserved_reaction"]],
-        on="entity",
+    dataset = PairwiseNegativeDataset(
+        user_tensor=torch.from_numpy(entity).to(device),
+        pos_item_tensor=torch.from_numpy(pos_reaction).to(device),
+        neg_item_tensor=torch.from_numpy(neg_reaction).to(device),
     )
-    train_ratings["unobserved_reaction"] = train_ratings["unobserved_reaction"].apply(
-        lambda x: random.sample(list(x), 1)[0]
+    print(f"Making PairwiseNegativeDataset of length {len(dataset)}")
+    return TensorBatchLoader(dataset, batch_size=batch_size, shuffle=True)
+
+
+class NegativeIterableDataset(IterableDataset):
+    """
+    The base of the datasets which stream shuffled batches of the interactions with new negative reactions on every epoch.
+    Args:
+            entity_ids (ndarray): The entity of every interaction.
+            reaction_ids (ndarray): The positive reaction of every interaction.
+            n_reaction (int): The number of reactions.
+            batch_size (int): The number of interactions of a batch.
+            device: The device of the batches.
+            seed (int): The epoch e is shuffled and sampled with the seed (seed, e), so a run can be replayed.
+            prefetch (bool): Whether to prepare the next batches in a background thread while the current one is trained.
+    Return:
+            iter(self): The batches of the next epoch, see generate_batches of the subclasses.
+    """
+
+    def __init__(
+        self,
+        entity_ids: ndarray,
+        reaction_ids: ndarray,
+        n_reaction: int,
+        batch_size: int,
+        device,
+        seed: int = 0,
+        prefetch: bool = False,
+    ):
+        self.entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        self.reaction_ids = np.asarray(reaction_ids, dtype=np.int64)
+        self.n_reaction = n_reaction
+        self.interaction_keys = get_sorted_interaction_keys(
+            self.entity_ids, self.reaction_ids, n_reaction
+        )
+        self.batch_size = batch_size
+        self.device = device
+        self.seed = seed
+        self.prefetch = prefetch
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """Set the epoch of the next iteration, every iteration moves to the next epoch by itself."""
+        self.epoch = epoch
+
+    def generate_interaction_batches(self, epoch: int):
+        """
+        :return: the random generator of the epoch and the indexes of the interactions of every batch
+        """
+        rng = np.random.default_rng([self.seed, epoch])
+        order = rng.permutation(len(self.entity_ids))
+        for start in range(0, len(order), self.batch_size):
+            yield rng, order[start : start + self.batch_size]
+
+    def generate_batches(self, epoch: int):
+        raise NotImplementedError
+
+    def generate_batches_in_background(self, epoch: int):
+        batch_queue = queue.Queue(maxsize=2)
+        stop_event = threading.Event()
+
+        def put(item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    batch_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.generate_batches(epoch):
+                    if not put(batch):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batch_queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # stop the producer when the epoch is left early
+            stop_event.set()
+            thread.join()
+
+    def __iter__(self):
+        epoch = self.epoch
+        self.epoch += 1
+        if self.prefetch:
+            return self.generate_batches_in_background(epoch)
+        return self.generate_batches(epoch)
+
+    def __len__(self):
+        """Get the number of batches of an epoch."""
+        return -(-len(self.entity_ids) // self.batch_size)
+
+
+class PairwiseNegativeIterableDataset(NegativeIterableDataset):
+    """
+    Stream shuffled <user, pos_item, neg_item> batches, the negative items are sampled again for every batch of every epoch.
+    Args:
+            see NegativeIterableDataset.
+    Return:
+            iter(self): The batches of the next epoch, each one a tuple of LongTensor (entity, pos_reaction, neg_reaction).
+    """
+
+    def generate_batches(self, epoch: int):
+        for rng, indexes in self.generate_interaction_batches(epoch):
+            entity = self.entity_ids[indexes]
+            neg_reaction = sample_negative_reactions(
+                entity, self.interaction_keys, self.n_reaction, rng
+            )
+            yield (
+                torch.from_numpy(entity).to(self.device),
+                torch.from_numpy(self.reaction_ids[indexes]).to(self.device),
+                torch.from_numpy(neg_reaction).to(self.device),
+            )
+
+
+class RatingIterableDataset(NegativeIterableDataset):
+    """
+    Stream shuffled <user, item, rating> batches, every interaction comes with num_negative negative items rated 0,
+    which are sampled again for every batch of every epoch.
+    Args:
+            type_values (ndarray): The rating of every interaction.
+            num_negative (int): The number of negative items of an interaction.
+            see NegativeIterableDataset for the others, a batch holds batch_size interactions and their negative items.
+    Return:
+            iter(self): The batches of the next epoch, each one a tuple (LongTensor entity, LongTensor reaction, FloatTensor type),
+            the negative items of an interaction follow its positive item.
+    """
+
+    def __init__(
+        self,
+        entity_ids: ndarray,
+        reaction_ids: ndarray,
+        type_values: ndarray,
+        n_reaction: int,
+        num_negative: int,
+        batch_size: int,
+        device,
+        seed: int = 0,
+        prefetch: bool = False,
+    ):
+        super().__init__(
+            entity_ids, reaction_ids, n_reaction, batch_size, device, seed, prefetch
+        )
+        self.type_values = np.asarray(type_values, dtype=np.float32)
+        self.num_negative = num_negative
+
+    def generate_batches(self, epoch: int):
+        for rng, indexes in self.generate_interaction_batches(epoch):
+            entity = np.repeat(self.entity_ids[indexes], 1 + self.num_negative)
+            reaction = np.empty((len(indexes), 1 + self.num_negative), dtype=np.int64)
+            reaction[:, 0] = self.reaction_ids[indexes]
+            reaction[:, 1:] = sample_negative_reactions(
+                np.repeat(self.entity_ids[indexes], self.num_negative),
+                self.interaction_keys,
+                self.n_reaction,
+                rng,
+            ).reshape(len(indexes), self.num_negative)
+            rating = np.zeros((len(indexes), 1 + self.num_negative), dtype=np.float32)
+            rating[:, 0] = self.type_values[indexes]
+            yield (
+                torch.from_numpy(entity).to(self.device),
+                torch.from_numpy(reaction.ravel()).to(self.device),
+                torch.from_numpy(rating.ravel()).to(self.device),
+            )
+
+
+def instance_bce_iterable_loader(
+    data, batch_size, device, n_reaction, num_negative, seed=0, prefetch=False
+):
+    """Instance a train Data_loader that have rating, which samples num_negative new negative items for each user-item pair on every epoch.
+    Nothing but the interactions is stored, unlike instance_bce_loader which stores num_negative negative copies of every interaction.
+    The negative items of an interaction are drawn with replacement.
+    """
+    dataset = RatingIterableDataset(
+        entity_ids=data["entity"].to_numpy(dtype=np.int64),
+        reaction_ids=data["reaction"].to_numpy(dtype=np.int64),
+        type_values=data["type"].to_numpy(dtype=np.float32),
+        n_reaction=n_reaction,
+        num_negative=num_negative,
+        batch_size=batch_size,
+        device=device,
+        seed=seed,
+        prefetch=prefetch,
     )
-    for _, row in train_ratings.iterrows():
-        entity.append(row["entity"])
-        pos_reaction.append(row["reaction"])
-        neg_reaction.append(row["unobserved_reaction"])
+    print(f"Making RatingIterableDataset of {len(dataset)} batches")
+    # the dataset yields whole batches
+    return DataLoader(dataset, batch_size=None)
 
-    dataset = PairwiseNegativeDataset(
-        user_tensor=torch.LongTensor(entity).to(device),
-        pos_item_tensor=torch.LongTensor(pos_reaction).to(device),
-        neg_item_tensor=torch.LongTensor(neg_reaction).to(device),
+
+def instance_bpr_iterable_loader(
+    data, batch_size, device, n_reaction, seed=0, prefetch=False
+):
+    """Instance a pairwise Data_loader for training, which samples ONE new negative item for each user-item pair on every epoch.
+    Nothing but the interactions is stored, unlike instance_bpr_loader whose negative items are fixed for the whole training.
+    """
+    dataset = PairwiseNegativeIterableDataset(
+        entity_ids=data["entity"].to_numpy(dtype=np.int64),
+        reaction_ids=data["reaction"].to_numpy(dtype=np.int64),
+        n_reaction=n_reaction,
+        batch_size=batch_size,
+        device=device,
+        seed=seed,
+        prefetch=prefetch,
     )
-    print(f"Making PairwiseNegativeDataset of length {len(dataset)}")
-    return DataLoader(dataset, batch_size=batch_size, shuffle=True)
+    print(f"Making PairwiseNegativeIterableDataset of {len(dataset)} batches")
+    # the dataset yields whole batches
+    return DataLoader(dataset, batch_size=None)
 
 
-def predict_full(data_df, engine, batch_eval=True):
-    """Make prediction for a trained model.
+def predict_full_matrix(data_df, engine, batch_eval=True):
+    """Score every row of a dataset against all the entities of the dataset.
     Args:
         data_df (DataFrame): A dataset to be evaluated.
         model: A trained model.
-        batch_eval (Boolean): A signal to indicate if the model is evaluated in batches.
+        batch_eval (Boolean): A signal to indicate if the model is evaluated in batches of rows.
     Returns:
-        array: predicted scores.
-    """
-    entity_ids = data_df["entity"].to_numpy()
-    entity_set = set(entity_ids)
-    reaction_ids = data_df["reaction"].to_numpy()
-    reaction_set = set(reaction_ids)
-    full_entity = []
-    full_reac = []
-    for i in range(len(entity_ids)):
-        full_entity.append(entity_ids[i])
-        full_reac.append(reaction_ids[i])
-        full_entity.extend(list(entity_set - set([entity_ids[i]])))
-        full_reac.extend([reaction_ids[i]] * (len(entity_set) - 1))
-
-    entity_ids = np.array(full_entity)
-    reaction_ids = np.array(full_reac)
-    batch_size = 50
-    if batch_eval:
-        n_batch = len(entity_ids) // batch_size + 1
-        predictions = np.array([])
-        for idx in range(n_batch):
-            start_idx = idx * batch_size
-            end_idx = min((idx + 1) * batch_size, len(entity_ids))
-            sub_entity_ids = entity_ids[start_idx:end_idx]
-            sub_reaction_ids = reaction_ids[start_idx:end_idx]
-            sub_predictions = np.array(
-                engine.model.predict(sub_entity_ids, sub_reaction_ids)
-                .flatten()
-                .to(torch.device("cpu"))
-                .detach()
-                .numpy()
+        array: predicted scores of shape (number of rows, number of entities),
+        the column 0 of a row holds its own entity and the others hold the remaining entities in ascending order.
+    """
+    entity_ids = data_df["entity"].to_numpy(dtype=np.int64)
+    reaction_ids = data_df["reaction"].to_numpy(dtype=np.int64)
+    candidate_ids = np.unique(entity_ids)
+    n_rows, n_candidates = len(entity_ids), len(candidate_ids)
+
+    # the column j > 0 of a row skips the position of its own entity
+    positions = np.searchsorted(candidate_ids, entity_ids)
+    other_columns = np.arange(n_candidates - 1)
+    order = np.empty((n_rows, n_candidates), dtype=np.int64)
+    order[:, 0] = positions
+    order[:, 1:] = other_columns + (other_columns >= positions[:, None])
+
+    batch_size = 1024 if batch_eval else max(1, n_rows)
+    predictions = np.empty((n_rows, n_candidates), dtype=np.float64)
+    for start_idx in range(0, n_rows, batch_size):
+        end_idx = min(start_idx + batch_size, n_rows)
+        sub_order = order[start_idx:end_idx]
+        if hasattr(engine.model, "predict_matrix"):
+            sub_scores = engine.model.predict_matrix(
+                candidate_ids, reaction_ids[start_idx:end_idx]
             )
-            predictions = np.append(predictions, sub_predictions)
-    else:
-        predictions = np.array(
-            engine.model.predict(entity_ids, reaction_ids)
-            .flatten()
+            sub_scores = torch.gather(
+                sub_scores, 1, torch.from_numpy(sub_order).to(sub_scores.device)
+            )
+        else:
+            sub_scores = engine.model.predict(
+                candidate_ids[sub_order].ravel(),
+                np.repeat(reaction_ids[start_idx:end_idx], n_candidates),
+            )
+        predictions[start_idx:end_idx] = (
+            sub_scores.reshape(end_idx - start_idx, n_candidates)
             .to(torch.device("cpu"))
             .detach()
             .numpy()
         )
-
     return predictions
+
+
+def predict_full(data_df, engine, batch_eval=True):
+    """Make prediction for a trained model.
+    Args:
+        data_df (DataFrame): A dataset to be evaluated.
+        model: A trained model.
+        batch_eval (Boolean): A signal to indicate if the model is evaluated in batches.
+    Returns:
+        array: predicted scores, the rows of predict_full_matrix one after another.
+    """
+    return predict_full_matrix(data_df, engine, batch_eval).ravel()
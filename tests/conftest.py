@@ -0,0 +1,11 @@
+import os
+import sys
+
+# the modules of the repository are flat modules under src, imported as the scripts import them
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+DATA_DIR = os.path.join(os.path.dirname(SRC_DIR), "data")
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from dataset_cache import BUNDLE_ALIGNMENT, load_bundle, save_bundle
+
+
+def get_arrays() -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(0)
+    return {
+        "empty": np.zeros(0, dtype=np.int64),
+        "empty_rows": np.zeros((0, 3), dtype=np.int64),
+        "empty_columns": np.zeros((4, 0), dtype=np.float32),
+        "int8": np.array([-3, 0, 7], dtype=np.int8),
+        "int32": rng.integers(-(2**31), 2**31 - 1, size=17, dtype=np.int32),
+        "int64": rng.integers(0, 2**62, size=(5, 3), dtype=np.int64),
+        "uint8": np.arange(5, dtype=np.uint8),
+        "float32": rng.random((3, 5)).astype(np.float32),
+        "float64": rng.random(BUNDLE_ALIGNMENT + 1),
+        "bool": np.array([True, False, True]),
+        "scalar": np.array(2.5),
+        "big_endian": np.arange(4, dtype=">i4"),
+        "strings": np.array(["R-HSA-8936661", "R-HIV-175558"]),
+        # written in C order
+        "transposed": np.arange(12, dtype=np.int64).reshape(3, 4).T,
+    }
+
+
+def test_bundle_round_trip(tmp_path):
+    file_path = os.path.join(tmp_path, "arrays.bundle")
+    arrays = get_arrays()
+
+    save_bundle(file_path, arrays, {"key": "0123456789abcdef", "manifests": {}})
+    loaded_arrays, metadata = load_bundle(file_path)
+
+    assert metadata == {"key": "0123456789abcdef", "manifests": {}}
+    assert list(loaded_arrays) == list(arrays)
+    for name, array in arrays.items():
+        loaded_array = loaded_arrays[name]
+        assert loaded_array.dtype == array.dtype, name
+        assert loaded_array.shape == array.shape, name
+        np.testing.assert_array_equal(loaded_array, array, err_msg=name)
+    # nothing is left besides the bundle
+    assert os.listdir(tmp_path) == ["arrays.bundle"]
+
+
+def test_bundle_of_empty_arrays_only(tmp_path):
+    file_path = os.path.join(tmp_path, "empty.bundle")
+
+    save_bundle(file_path, {"a": np.zeros(0), "b": np.zeros((0, 2), dtype=np.int32)})
+    loaded_arrays, metadata = load_bundle(file_path)
+
+    assert metadata == {}
+    assert loaded_arrays["a"].shape == (0,)
+    assert loaded_arrays["b"].shape == (0, 2)
+    assert loaded_arrays["b"].dtype == np.int32
+
+
+def test_bundle_without_arrays(tmp_path):
+    file_path = os.path.join(tmp_path, "nothing.bundle")
+
+    save_bundle(file_path, {})
+
+    assert load_bundle(file_path) == ({}, {})
+
+
+def test_loaded_arrays_are_read_only(tmp_path):
+    file_path = os.path.join(tmp_path, "arrays.bundle")
+    save_bundle(file_path, {"int64": np.arange(3, dtype=np.int64)})
+
+    loaded_arrays, _ = load_bundle(file_path)
+
+    with pytest.raises(ValueError):
+        loaded_arrays["int64"][0] = 1
+
+
+def test_save_bundle_replaces_an_existing_bundle(tmp_path):
+    file_path = os.path.join(tmp_path, "arrays.bundle")
+    save_bundle(file_path, {"old": np.arange(100)})
+
+    save_bundle(file_path, {"new": np.arange(3)})
+    loaded_arrays, _ = load_bundle(file_path)
+
+    assert list(loaded_arrays) == ["new"]
+    np.testing.assert_array_equal(loaded_arrays["new"], np.arange(3))
+
+
+def test_load_bundle_rejects_other_files(tmp_path):
+    file_path = os.path.join(tmp_path, "arrays.npz")
+    np.savez(file_path, a=np.arange(3))
+
+    with pytest.raises(Exception):
+        load_bundle(file_path)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import scipy.sparse
+import torch
+from sklearn.metrics import accuracy_score, ndcg_score, top_k_accuracy_score
+
+import metrics
+
+TOP_K_LIST = (1, 3, 5)
+
+
+def get_scores_and_labels(graded: bool = False, num_of_rows=37, num_of_columns=11):
+    rng = np.random.default_rng(0)
+    # a few distinct values only, so most rows have tied scores
+    scores = rng.integers(0, 4, size=(num_of_rows, num_of_columns)).astype(np.float32)
+    scores[1] = 0.5
+    labels = (rng.random((num_of_rows, num_of_columns)) < 0.25).astype(np.float32)
+    if graded:
+        labels *= rng.integers(1, 4, size=labels.shape)
+    # the rows without any relevant entry
+    labels[::6] = 0
+    return scores, labels
+
+
+def get_sklearn_metrics(scores: np.ndarray, labels: np.ndarray) -> dict[str, float]:
+    cat_labels = labels.argmax(axis=1)
+    results = {"ndcg": ndcg_score(labels, scores)}
+    for k in TOP_K_LIST:
+        results[f"ndcg_{k}"] = ndcg_score(labels, scores, k=k)
+    results["acc"] = accuracy_score(cat_labels, scores.argmax(axis=1))
+    for k in TOP_K_LIST:
+        results[f"acc_{k}"] = top_k_accuracy_score(
+            cat_labels, scores, k=k, labels=range(scores.shape[1])
+        )
+    return results
+
+
+LABEL_FORMATS = {
+    "ndarray": lambda labels: labels,
+    "tensor": lambda labels: torch.from_numpy(labels),
+    "csr_matrix": lambda labels: scipy.sparse.csr_matrix(labels),
+    "sparse_csr_tensor": lambda labels: torch.from_numpy(labels).to_sparse_csr(),
+    "sparse_coo_tensor": lambda labels: torch.from_numpy(labels).to_sparse(),
+}
+
+
+@pytest.mark.parametrize("label_format", LABEL_FORMATS)
+@pytest.mark.parametrize("chunk_size", [None, 1, 4])
+@pytest.mark.parametrize("graded", [False, True])
+def test_get_ranking_metrics_matches_sklearn(label_format, chunk_size, graded):
+    scores, labels = get_scores_and_labels(graded)
+    expected = get_sklearn_metrics(scores, labels)
+
+    results = metrics.get_ranking_metrics(
+        torch.from_numpy(scores),
+        LABEL_FORMATS[label_format](labels),
+        top_k_list=TOP_K_LIST,
+        chunk_size=chunk_size,
+    )
+
+    assert results.keys() == expected.keys()
+    for name, value in expected.items():
+        assert results[name] == pytest.approx(value, abs=1e-9), name
+
+
+def test_get_ranking_metrics_all_tied_and_all_empty():
+    scores = np.zeros((5, 4), dtype=np.float32)
+    labels = np.zeros((5, 4), dtype=np.float32)
+    labels[2, 3] = 1
+    labels[4, [0, 2]] = 1
+
+    results = metrics.get_ranking_metrics(scores, labels, top_k_list=TOP_K_LIST)
+
+    expected = get_sklearn_metrics(scores, labels)
+    for name, value in expected.items():
+        assert results[name] == pytest.approx(value, abs=1e-9), name
+
+
+def test_get_ranking_metrics_rejects_labels_of_another_shape():
+    with pytest.raises(Exception):
+        metrics.get_ranking_metrics(np.zeros((3, 4)), np.zeros((3, 5)))
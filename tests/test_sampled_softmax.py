@@ -0,0 +1,127 @@
+import pytest
+import torch
+import torch.nn as nn
+
+import sampled_softmax
+
+
+def get_reference_loss(
+    hidden, bias_scale, output_layer, labels, negatives, log_expected_counts
+):
+    """
+    The sampled softmax over the dense labels, every node scores all its positives and the masked negatives
+    """
+    losses = []
+    for node_index in range(len(labels)):
+        positives = torch.nonzero(labels[node_index]).ravel()
+        scores = hidden[node_index] @ output_layer.weight.t()
+        scores = scores + bias_scale[node_index] * output_layer.bias
+        negative_scores = scores[negatives] - log_expected_counts
+        negative_scores = negative_scores.masked_fill(
+            labels[node_index, negatives] > 0, float("-inf")
+        )
+        log_normalizer = torch.logsumexp(
+            torch.cat([scores[positives], negative_scores]), dim=0
+        )
+        losses.append(
+            -(
+                labels[node_index, positives] * (scores[positives] - log_normalizer)
+            ).sum()
+        )
+    return torch.stack(losses).sum() / len(labels)
+
+
+def get_inputs(graded: bool):
+    torch.manual_seed(0)
+    num_of_nodes, num_of_features, hidden_size = 9, 13, 5
+    hidden = torch.randn(num_of_nodes, hidden_size, requires_grad=True)
+    bias_scale = torch.rand(num_of_nodes)
+    output_layer = nn.Linear(hidden_size, num_of_features)
+
+    labels = (torch.rand(num_of_nodes, num_of_features) < 0.3).float()
+    if graded:
+        labels = labels * torch.randint(1, 4, labels.shape)
+    # a node without any positive, and a node with all the components
+    labels[2] = 0
+    labels[5] = 1
+    # the repeated negatives, most of them are accidental hits
+    negatives = torch.tensor([0, 3, 3, 7, 12, 0, 5, 3])
+    log_expected_counts = torch.log(torch.full((len(negatives),), 8 / num_of_features))
+    return hidden, bias_scale, output_layer, labels, negatives, log_expected_counts
+
+
+LABEL_FORMATS = {
+    "dense": lambda labels: labels,
+    "sparse_csr_tensor": lambda labels: labels.to_sparse_csr(),
+    "sparse_coo_tensor": lambda labels: labels.to_sparse(),
+}
+
+
+@pytest.mark.parametrize("label_format", LABEL_FORMATS)
+@pytest.mark.parametrize("graded", [False, True])
+def test_sampled_softmax_loss_of_sparse_and_dense_labels(label_format, graded):
+    hidden, bias_scale, output_layer, labels, negatives, log_expected_counts = (
+        get_inputs(graded)
+    )
+
+    expected = get_reference_loss(
+        hidden, bias_scale, output_layer, labels, negatives, log_expected_counts
+    )
+    expected_gradients = torch.autograd.grad(
+        expected, [hidden, output_layer.weight, output_layer.bias]
+    )
+    loss = sampled_softmax.sampled_softmax_loss(
+        hidden,
+        bias_scale,
+        output_layer,
+        LABEL_FORMATS[label_format](labels),
+        negatives,
+        log_expected_counts,
+    )
+    gradients = torch.autograd.grad(
+        loss, [hidden, output_layer.weight, output_layer.bias]
+    )
+
+    torch.testing.assert_close(loss, expected)
+    for gradient, expected_gradient in zip(gradients, expected_gradients):
+        torch.testing.assert_close(gradient, expected_gradient)
+
+
+def test_sparse_labels_with_explicit_zeros():
+    hidden, bias_scale, output_layer, labels, negatives, log_expected_counts = (
+        get_inputs(False)
+    )
+    dense_labels = labels.clone()
+    dense_labels[0, 0] = 1
+    sparse_labels = dense_labels.to_sparse_csr()
+    # an explicitly stored zero is no positive, so no accidental hit either
+    sparse_labels.values()[0] = 0
+    dense_labels[0, 0] = 0
+
+    loss = sampled_softmax.sampled_softmax_loss(
+        hidden, bias_scale, output_layer, sparse_labels, negatives, log_expected_counts
+    )
+
+    torch.testing.assert_close(
+        loss,
+        get_reference_loss(
+            hidden,
+            bias_scale,
+            output_layer,
+            dense_labels,
+            negatives,
+            log_expected_counts,
+        ),
+    )
+
+
+def test_accidental_hits_mask_of_repeated_negatives():
+    rows = torch.tensor([0, 0, 1, 3])
+    cols = torch.tensor([3, 5, 0, 3])
+    negatives = torch.tensor([3, 1, 3, 0, 5])
+
+    mask = sampled_softmax.get_accidental_hits_mask(rows, cols, 4, negatives)
+
+    labels = torch.zeros(4, 6)
+    labels[rows, cols] = 1
+    torch.testing.assert_close(mask, labels[:, negatives] > 0)
@@ -0,0 +1,267 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import torch
+
+import utils
+from conftest import DATA_DIR
+
+
+def get_interactions(seed: int = 0, n_entity: int = 30, n_reaction: int = 12):
+    rng = np.random.default_rng(seed)
+    entity_ids = rng.integers(0, n_entity, size=200)
+    reaction_ids = rng.integers(0, n_reaction, size=200)
+    # an entity with all the reactions but one, most of its candidates collide
+    entity_ids = np.concatenate([entity_ids, np.full(n_reaction - 1, n_entity)])
+    reaction_ids = np.concatenate([reaction_ids, np.arange(1, n_reaction)])
+    return entity_ids, reaction_ids, n_reaction
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sample_negative_reactions_never_returns_a_positive(seed):
+    entity_ids, reaction_ids, n_reaction = get_interactions(seed)
+    interaction_keys = utils.get_sorted_interaction_keys(
+        entity_ids, reaction_ids, n_reaction
+    )
+    positive_pairs = set(zip(entity_ids.tolist(), reaction_ids.tolist()))
+
+    negative_reaction_ids = utils.sample_negative_reactions(
+        entity_ids, interaction_keys, n_reaction, np.random.default_rng(seed)
+    )
+
+    assert negative_reaction_ids.shape == entity_ids.shape
+    assert negative_reaction_ids.min() >= 0
+    assert negative_reaction_ids.max() < n_reaction
+    for entity_id, negative_reaction_id in zip(
+        entity_ids.tolist(), negative_reaction_ids.tolist()
+    ):
+        assert (entity_id, negative_reaction_id) not in positive_pairs
+    # the only negative of the saturated entity
+    assert set(negative_reaction_ids[entity_ids == entity_ids.max()].tolist()) == {0}
+
+
+def test_sample_negative_reactions_without_entities():
+    interaction_keys = utils.get_sorted_interaction_keys([0], [1], 3)
+
+    negative_reaction_ids = utils.sample_negative_reactions(
+        np.zeros(0, dtype=np.int64), interaction_keys, 3
+    )
+
+    assert negative_reaction_ids.shape == (0,)
+
+
+def test_get_sorted_interaction_keys_rejects_a_saturated_entity():
+    with pytest.raises(Exception):
+        utils.get_sorted_interaction_keys([0, 0, 0], [0, 1, 2], 3)
+
+
+def get_batches(dataset) -> list[tuple[np.ndarray, ...]]:
+    return [tuple(tensor.numpy() for tensor in batch) for batch in dataset]
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_pairwise_negative_iterable_dataset_resamples_every_epoch(prefetch):
+    entity_ids, reaction_ids, n_reaction = get_interactions()
+    positive_pairs = set(zip(entity_ids.tolist(), reaction_ids.tolist()))
+    dataset = utils.PairwiseNegativeIterableDataset(
+        entity_ids, reaction_ids, n_reaction, 16, "cpu", seed=3, prefetch=prefetch
+    )
+
+    first_epoch = get_batches(dataset)
+    second_epoch = get_batches(dataset)
+    dataset.set_epoch(0)
+    replayed_epoch = get_batches(dataset)
+
+    assert len(first_epoch) == len(dataset)
+    for epoch in [first_epoch, second_epoch]:
+        entity, pos_reaction, neg_reaction = map(np.concatenate, zip(*epoch))
+        # every interaction once per epoch
+        assert sorted(zip(entity.tolist(), pos_reaction.tolist())) == sorted(
+            zip(entity_ids.tolist(), reaction_ids.tolist())
+        )
+        for pair in zip(entity.tolist(), neg_reaction.tolist()):
+            assert pair not in positive_pairs
+    assert not all(
+        np.array_equal(first, second)
+        for first_batch, second_batch in zip(first_epoch, second_epoch)
+        for first, second in zip(first_batch, second_batch)
+    )
+    for first_batch, replayed_batch in zip(first_epoch, replayed_epoch):
+        for first, replayed in zip(first_batch, replayed_batch):
+            np.testing.assert_array_equal(first, replayed)
+
+
+def test_rating_iterable_dataset_rates_the_negatives_0():
+    entity_ids, reaction_ids, n_reaction = get_interactions()
+    # a repeated interaction keeps its rating
+    type_values = np.where((entity_ids + reaction_ids) % 2 == 0, 1.0, -1.0)
+    positive_ratings = dict(
+        zip(zip(entity_ids.tolist(), reaction_ids.tolist()), type_values.tolist())
+    )
+    num_negative = 3
+    dataset = utils.RatingIterableDataset(
+        entity_ids, reaction_ids, type_values, n_reaction, num_negative, 16, "cpu"
+    )
+
+    num_of_positives = 0
+    for entity, reaction, rating in get_batches(dataset):
+        assert len(entity) == len(reaction) == len(rating)
+        assert len(entity) % (1 + num_negative) == 0
+        for row, pair in enumerate(zip(entity.tolist(), reaction.tolist())):
+            if 0 == row % (1 + num_negative):
+                assert rating[row] == positive_ratings[pair]
+                num_of_positives += 1
+            else:
+                assert rating[row] == 0
+                assert pair not in positive_ratings
+    assert num_of_positives == len(entity_ids)
+
+
+def get_edge_to_list_of_nodes_dict(relationship_line_message_list: list[str]):
+    """
+    The dicts of the hyper edges as DataLoaderBase.get_edge_to_list_of_nodes_dict_assist built them line by line
+    """
+    edge_to_list_of_nodes_dict: dict[int, list[int]] = dict()
+    edge_to_list_of_input_nodes_dict: dict[int, list[int]] = dict()
+    edge_to_list_of_output_nodes_dict: dict[int, list[int]] = dict()
+
+    for relationship_line_message in relationship_line_message_list:
+        elements: list[str] = relationship_line_message.split(",")
+        node_index: int = int(elements[0])
+        edge_index: int = int(elements[1])
+        direction: int = int(elements[2])
+
+        if edge_index not in edge_to_list_of_nodes_dict.keys():
+            edge_to_list_of_nodes_dict[edge_index] = list()
+        edge_to_list_of_nodes_dict[edge_index].append(node_index)
+
+        if direction < 0:
+            if edge_index not in edge_to_list_of_input_nodes_dict.keys():
+                edge_to_list_of_input_nodes_dict[edge_index] = list()
+            edge_to_list_of_input_nodes_dict[edge_index].append(node_index)
+
+        elif direction > 0:
+            if edge_index not in edge_to_list_of_output_nodes_dict.keys():
+                edge_to_list_of_output_nodes_dict[edge_index] = list()
+            edge_to_list_of_output_nodes_dict[edge_index].append(node_index)
+
+    return (
+        edge_to_list_of_nodes_dict,
+        edge_to_list_of_input_nodes_dict,
+        edge_to_list_of_output_nodes_dict,
+    )
+
+
+def assert_incidences_match(
+    relationship_line_message_list: list[str], relationship_array: np.ndarray = None
+):
+    if relationship_array is None:
+        relationship_array = np.array(
+            [
+                [int(element) for element in line_message.split(",")]
+                for line_message in relationship_line_message_list
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+
+    incidences = utils.HyperEdgeIncidence.from_relationship_array_by_direction(
+        relationship_array
+    )
+    expected_dicts = get_edge_to_list_of_nodes_dict(relationship_line_message_list)
+
+    for incidence, expected_dict in zip(incidences, expected_dicts):
+        edge_to_list_of_nodes_dict = incidence.to_dict()
+        # the edges in the order of their first appearance, the nodes in the order of the file
+        assert list(edge_to_list_of_nodes_dict.items()) == list(expected_dict.items())
+        assert incidence.to_list() == list(expected_dict.values())
+        assert len(incidence) == len(expected_dict)
+
+
+def test_hyper_edge_incidence_matches_the_line_by_line_dicts():
+    assert_incidences_match(
+        [
+            "351,7,-1",
+            "773,7,1",
+            "2,3,1",
+            "1397,7,-1",
+            "5,3,-1",
+            "5,3,1",
+            "9,0,0",
+            "8,11,1",
+            "2,3,1",
+        ]
+    )
+
+
+def test_hyper_edge_incidence_of_an_empty_relationship():
+    assert_incidences_match([])
+
+
+@pytest.mark.parametrize(
+    "relationship_file_path",
+    sorted(
+        glob.glob(
+            os.path.join(glob.escape(DATA_DIR), "Disease", "**", "relationship.txt"),
+            recursive=True,
+        )
+        + glob.glob(
+            os.path.join(
+                glob.escape(DATA_DIR), "Disease", "**", "relationship-mask.txt"
+            ),
+            recursive=True,
+        )
+    ),
+)
+def test_hyper_edge_incidence_matches_the_dataset_files(relationship_file_path):
+    with open(relationship_file_path, "r") as file_handler:
+        relationship_line_message_list = [
+            line_message.strip()
+            for line_message in file_handler
+            if line_message.strip()
+        ]
+
+    assert_incidences_match(
+        relationship_line_message_list,
+        utils.read_relationship_array(
+            os.path.dirname(relationship_file_path),
+            os.path.basename(relationship_file_path),
+        ),
+    )
+
+
+def test_edges_embeddings_cache_is_keyed_by_the_edge_list_itself():
+    edges_embeddings_cache = utils.EdgesEmbeddingsCache(torch.device("cpu"))
+    nodes_features = torch.arange(12, dtype=torch.float32).reshape(4, 3)
+
+    edge_to_nodes_list = [[0, 1], [2, 3]]
+    edges_embeddings = edges_embeddings_cache.get(
+        "validation", edge_to_nodes_list, nodes_features
+    )
+    assert (
+        edges_embeddings_cache.get("validation", edge_to_nodes_list, nodes_features)
+        is edges_embeddings
+    )
+
+    # another list of the same length, even at the address of a freed list
+    other_edges_embeddings = edges_embeddings_cache.get(
+        "validation", [[0, 3], [1, 2]], nodes_features
+    )
+    torch.testing.assert_close(
+        other_edges_embeddings,
+        utils.read_out_to_generate_multi_hyper_edges_embeddings_from_edge_list(
+            [[0, 3], [1, 2]], nodes_features
+        ),
+    )
+
+    # an in-place update of the nodes features
+    edge_to_nodes_list = [[0, 1], [2, 3]]
+    edges_embeddings = edges_embeddings_cache.get(
+        "test", edge_to_nodes_list, nodes_features
+    )
+    nodes_features.mul_(2)
+    torch.testing.assert_close(
+        edges_embeddings_cache.get("test", edge_to_nodes_list, nodes_features),
+        edges_embeddings * 2,
+    )